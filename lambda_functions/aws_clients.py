@@ -0,0 +1,163 @@
+"""
+Shared Module: AWS Clients
+Tuned boto3 clients and resources, created once per warm Lambda container
+
+Used by lambda_email_sender and lambda_campaign_manager. Package this file in the
+same deployment zip as the Lambda that imports it.
+
+boto3's defaults (10 pooled connections, legacy retries, 60s timeouts) are made
+for one request at a time. Clients built here get a connection pool sized for
+the caller's concurrency, TCP keep-alive, the 'standard' retry mode and shorter
+timeouts, and are cached so every invocation of a warm container reuses the same
+pooled connections. Each client also records per-operation call latency.
+
+Environment Variables (optional):
+- AWS_MAX_POOL_CONNECTIONS: default connection pool size per client (default 25)
+- AWS_CONNECT_TIMEOUT: seconds to establish a connection (default 5)
+- AWS_READ_TIMEOUT: seconds to wait for a response (default 30)
+- AWS_RETRY_MODE: botocore retry mode (default standard)
+- AWS_MAX_ATTEMPTS: attempts per call including the first (default 3)
+"""
+
+import logging
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger()
+
+AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '25'))
+AWS_CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '5'))
+AWS_READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '30'))
+AWS_RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'standard')
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '3'))
+
+# One session for the container; clients are thread-safe, session setup is not
+_session = boto3.session.Session()
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class LatencyStats:
+    """Per service/operation call counts and latency, fed by botocore event hooks"""
+
+    def __init__(self):
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def _before_call(self, model, context, **kwargs):
+        context['latency_operation'] = (model.service_model.service_name, model.name)
+        context['latency_started_at'] = time.monotonic()
+
+    def _after_call(self, context, http_response=None, **kwargs):
+        # Error responses (throttling, validation...) arrive here too, as non-2xx
+        self._record(context, error=http_response is not None and http_response.status_code >= 300)
+
+    def _after_call_error(self, context, **kwargs):
+        # Connection failures and timeouts, where no response came back
+        self._record(context, error=True)
+
+    def _record(self, context, error):
+        started = context.get('latency_started_at')
+        if started is None:
+            return
+        elapsed = time.monotonic() - started
+        key = context['latency_operation']
+        with self._lock:
+            entry = self._operations.setdefault(key, {'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            entry['calls'] += 1
+            entry['total_seconds'] += elapsed
+            entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+            if error:
+                entry['errors'] += 1
+
+    def attach(self, client):
+        """Register the latency hooks on a client"""
+        events = client.meta.events
+        events.register('before-call', self._before_call)
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+
+    def summary(self):
+        """Return {service: {operation: {calls, errors, avg_ms, max_ms}}}"""
+        with self._lock:
+            operations = {key: dict(entry) for key, entry in self._operations.items()}
+
+        summary = {}
+        for (service, operation), entry in sorted(operations.items()):
+            summary.setdefault(service, {})[operation] = {
+                'calls': entry['calls'],
+                'errors': entry['errors'],
+                'avg_ms': round(entry['total_seconds'] / entry['calls'] * 1000, 1),
+                'max_ms': round(entry['max_seconds'] * 1000, 1)
+            }
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._operations = {}
+
+
+latency_stats = LatencyStats()
+
+
+def build_config(max_pool_connections=None, max_attempts=None, signature_version=None):
+    """botocore Config with the shared pool, keep-alive, retry and timeout settings"""
+    config = Config(
+        max_pool_connections=max_pool_connections or AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+        retries={'mode': AWS_RETRY_MODE, 'total_max_attempts': max_attempts or AWS_MAX_ATTEMPTS},
+        tcp_keepalive=True
+    )
+    if signature_version:
+        config = config.merge(Config(signature_version=signature_version))
+    return config
+
+
+def get_client(service_name, max_pool_connections=None, max_attempts=None, endpoint_url=None, region_name=None,
+               signature_version=None):
+    """
+    Return the cached client for a service and settings, creating it on first use
+
+    Args:
+        max_pool_connections: pool size; use at least the number of threads sharing the client
+        max_attempts: attempts per call (1 = no botocore retries, for callers that retry themselves)
+        endpoint_url: optional endpoint override (e.g. a local stand-in)
+        signature_version: e.g. 's3v4' for S3 presigned URLs
+    """
+    region_name = region_name or AWS_REGION
+    key = ('client', service_name, region_name, endpoint_url, max_pool_connections, max_attempts, signature_version)
+    with _cache_lock:
+        client = _cache.get(key)
+        if client is None:
+            client = _session.client(
+                service_name,
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=build_config(max_pool_connections, max_attempts, signature_version)
+            )
+            latency_stats.attach(client)
+            _cache[key] = client
+        return client
+
+
+def get_resource(service_name, max_pool_connections=None, max_attempts=None, region_name=None):
+    """Return the cached boto3 resource for a service, creating it on first use"""
+    region_name = region_name or AWS_REGION
+    key = ('resource', service_name, region_name, max_pool_connections, max_attempts)
+    with _cache_lock:
+        resource = _cache.get(key)
+        if resource is None:
+            resource = _session.resource(
+                service_name,
+                region_name=region_name,
+                config=build_config(max_pool_connections, max_attempts)
+            )
+            latency_stats.attach(resource.meta.client)
+            _cache[key] = resource
+        return resource
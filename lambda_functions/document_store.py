@@ -0,0 +1,148 @@
+"""
+Shared Module: Document Store
+Compressed, content-addressed storage for pre-rendered email documents
+
+Used by lambda_email_sender. Package this file in the same deployment zip as the
+Lambda that imports it.
+
+A pre-render pass renders each distinct per-school document once and stores it
+gzipped under the SHA-256 of its content, so identical documents are stored once
+no matter how many batches produce them. A per-batch manifest maps each school
+fragment to its document, and send workers only fetch, add the greeting and send.
+
+Locations:
+- s3://bucket/prefix   -> S3DocumentStore
+- /path or file:///path -> LocalDocumentStore (tests and local runs)
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+
+class LocalDocumentStore:
+    """Stores objects as files under a directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, *name.split('/'))
+
+    def put(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def get(self, name):
+        """Return the object's bytes, or None if it doesn't exist"""
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+
+class S3DocumentStore:
+    """Stores objects in an S3 bucket under a key prefix"""
+
+    def __init__(self, bucket, prefix='', client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        if client is None:
+            import boto3
+            client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+        self.client = client
+
+    def _key(self, name):
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def put(self, name, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=data)
+
+    def get(self, name):
+        """Return the object's bytes, or None if it doesn't exist"""
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(name))
+            return response['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+
+    def exists(self, name):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404', 'NotFound'):
+                return False
+            raise
+
+
+def get_document_store(location, s3_client=None):
+    """Return a store for an s3:// URL or a local directory, or None if location is empty"""
+    if not location:
+        return None
+    if location.startswith('s3://'):
+        bucket, _, prefix = location[len('s3://'):].partition('/')
+        return S3DocumentStore(bucket, prefix, client=s3_client)
+    if location.startswith('file://'):
+        location = location[len('file://'):]
+    return LocalDocumentStore(location)
+
+
+def content_hash(value):
+    """SHA-256 of a JSON-serializable value (keys sorted, so equal values hash equally)"""
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def put_document(store, document):
+    """Store a JSON-serializable document gzipped under its content hash; returns the hash"""
+    document_hash = content_hash(document)
+    name = f"documents/{document_hash}.json.gz"
+    if not store.exists(name):
+        payload = json.dumps(document, sort_keys=True, separators=(',', ':'), default=str)
+        store.put(name, gzip.compress(payload.encode('utf-8')))
+    return document_hash
+
+
+def get_document(store, document_hash):
+    """Load a document stored by put_document, or None if it's missing"""
+    data = store.get(f"documents/{document_hash}.json.gz")
+    if data is None:
+        return None
+    return json.loads(gzip.decompress(data).decode('utf-8'))
+
+
+def manifest_name(campaign_id, batch_number):
+    return f"manifests/{campaign_id}/batch-{int(batch_number)}.json"
+
+
+def put_manifest(store, campaign_id, batch_number, manifest):
+    """Store a batch manifest; returns its name"""
+    name = manifest_name(campaign_id, batch_number)
+    store.put(name, json.dumps(manifest, default=str).encode('utf-8'))
+    return name
+
+
+def get_manifest(store, name):
+    """Load a manifest by name, or None if it's missing"""
+    data = store.get(name)
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
@@ -0,0 +1,133 @@
+"""
+Shared Module: DynamoDB Scan
+Fully paginated, optionally parallel table scans that stream items
+
+Used by lambda_email_sender, lambda_campaign_manager, school_directory and the
+scripts. Package this file in the same deployment zip as the Lambda that imports it.
+
+A single Table.scan() call returns at most 1MB; anything after that is only reachable
+through LastEvaluatedKey. scan_items() follows it to the end of the table and yields
+items as pages arrive, so callers never see a silently truncated table. With
+segments > 1 the table is split into that many segments (Segment/TotalSegments)
+scanned in parallel threads. Items come back as plain Python values (Decimal for
+numbers), exactly like Table.scan().
+
+Scans go through the table's client (table.meta.client), which is thread-safe, rather
+than the Table resource itself. That client converts attribute values both ways like
+the resource does, so arguments and items here are plain Python values too.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+
+_SEGMENT_DONE = object()
+
+
+def build_scan_kwargs(table, projection=None, condition=None, page_size=None):
+    """
+    scan() arguments for a Table resource's client
+
+    Args:
+        projection: attribute names to return (default: whole items)
+        condition: boto3 condition (e.g. Attr('active').eq(True)) applied as a FilterExpression
+        page_size: items evaluated per request (Limit); the scan still runs to the end
+    """
+    scan_kwargs = {'TableName': table.name}
+    attribute_names = {}
+
+    if projection:
+        projection_names = {f'#p{i}': field for i, field in enumerate(projection)}
+        attribute_names.update(projection_names)
+        scan_kwargs['ProjectionExpression'] = ', '.join(projection_names)
+
+    if condition is not None:
+        expression = ConditionExpressionBuilder().build_expression(condition)
+        scan_kwargs['FilterExpression'] = expression.condition_expression
+        attribute_names.update(expression.attribute_name_placeholders)
+        if expression.attribute_value_placeholders:
+            scan_kwargs['ExpressionAttributeValues'] = expression.attribute_value_placeholders
+
+    if attribute_names:
+        scan_kwargs['ExpressionAttributeNames'] = attribute_names
+    if page_size:
+        scan_kwargs['Limit'] = page_size
+    return scan_kwargs
+
+
+def _scan_pages(client, scan_kwargs, segment=None, segments=None):
+    """Yield each page's items for one segment (or the whole table), following LastEvaluatedKey"""
+    scan_kwargs = dict(scan_kwargs)
+    if segments:
+        scan_kwargs.update(Segment=segment, TotalSegments=segments)
+    while True:
+        response = client.scan(**scan_kwargs)
+        yield response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+
+def _parallel_pages(client, scan_kwargs, segments):
+    """Yield pages from `segments` parallel segment scans, in arrival order"""
+    pages = queue.Queue(maxsize=segments * 2)  # Bounds how far the scanners run ahead of the consumer
+    stopped = threading.Event()
+
+    def deliver(page):
+        while not stopped.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment):
+        try:
+            for page in _scan_pages(client, scan_kwargs, segment, segments):
+                if not deliver(page):
+                    return
+        except Exception as e:
+            deliver(e)
+        finally:
+            deliver(_SEGMENT_DONE)
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        for segment in range(segments):
+            executor.submit(scan_segment, segment)
+        try:
+            remaining = segments
+            while remaining:
+                page = pages.get()
+                if page is _SEGMENT_DONE:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield page
+        finally:
+            # Consumer finished early or failed: let the scanners stop instead of blocking
+            stopped.set()
+
+
+def scan_items(table, projection=None, condition=None, segments=1, page_size=None):
+    """
+    Yield every item in a table, following LastEvaluatedKey to the end
+
+    Args:
+        table: a boto3 Table resource (only its name and client are used)
+        projection: attribute names to return (default: whole items)
+        condition: boto3 condition applied as a FilterExpression
+        segments: scan this many segments in parallel threads (1 = sequential,
+            items in table order; otherwise pages are yielded as they arrive)
+        page_size: items evaluated per request (Limit)
+    """
+    client = table.meta.client
+    scan_kwargs = build_scan_kwargs(table, projection, condition, page_size)
+
+    pages = _scan_pages(client, scan_kwargs) if segments <= 1 else _parallel_pages(client, scan_kwargs, segments)
+    for page in pages:
+        yield from page
@@ -14,7 +14,6 @@ Environment Variables Required:
 
 Dependencies (add as Lambda layers):
 - boto3
-- pandas
 
 AI Model: OpenAI GPT-4 (via REST API)
 Template System: Pre-built HTML components from template_components table
@@ -23,19 +22,35 @@ Template System: Pre-built HTML components from template_components table
 import json
 import boto3
 from boto3.dynamodb.conditions import Key, Attr
-import pandas as pd
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED, FIRST_COMPLETED
+import math
+import random
 import re
 import logging
+import threading
+import time
 import uuid
 from datetime import datetime
 from decimal import Decimal
 from collections import defaultdict
 import base64
+import csv
+import hashlib
 import os
 from io import StringIO
 from urllib import request, error
 from urllib.parse import urlencode
 
+from aws_clients import get_client, get_resource
+from dynamo_scan import scan_items
+from product_catalog import (
+    PRODUCT_COLUMNS, dump_catalog, group_products_by_school, isna, iter_text_lines, load_catalog,
+    read_csv_header, read_product_csv
+)
+from school_directory import get_school_directory
+
 # Helper function to convert Decimal to int/float for JSON serialization
 def decimal_default(obj):
     if isinstance(obj, Decimal):
@@ -52,7 +67,7 @@ def convert_to_dynamodb_safe(data):
         return result
     elif isinstance(data, list):
         return [convert_to_dynamodb_safe(item) for item in data]
-    elif pd.isna(data):  # Check for NaN/None values
+    elif data is None or (isinstance(data, float) and math.isnan(data)):  # Check for NaN/None values
         return ''  # Convert NaN/None to empty string
     elif isinstance(data, float):
         return str(data)  # Convert float to string
@@ -74,14 +89,59 @@ OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')  # ADD YOUR OPENAI API KEY
 
 # Batch configuration - EASILY CONFIGURABLE
 EMAILS_PER_BATCH = 2000  # Change this value to adjust batch size
-EMAILS_PER_SECOND = 14   # AWS SES rate limit
+EMAILS_PER_SECOND = float(os.environ.get('SES_MAX_SEND_RATE', '14'))  # AWS SES rate limit (as lambda_email_sender)
+
+# How lambda_email_sender delivers a campaign: 'rendered' (one SendEmail per recipient)
+# or 'ses_template' (registered SES template, SendBulkTemplatedEmail in groups of 50)
+EMAIL_DELIVERY_MODES = ['rendered', 'ses_template']
+
+# Customer loading for process_campaign (college_email_campaign is read once per run)
+CUSTOMER_SCAN_SEGMENTS = int(os.environ.get('CUSTOMER_SCAN_SEGMENTS', '4'))  # Parallel scan segments
+CUSTOMER_SCHOOL_INDEX = os.environ.get('CUSTOMER_SCHOOL_INDEX', '')  # Optional GSI with partition key school_code
+CUSTOMER_QUERY_WORKERS = 8  # Concurrent per-school queries when CUSTOMER_SCHOOL_INDEX is set
+CUSTOMER_FIELDS = ['customer_email', 'customer_name', 'school_code', 'source']
+
+# campaign_data writes for process_campaign
+CAMPAIGN_WRITE_WORKERS = int(os.environ.get('CAMPAIGN_WRITE_WORKERS', '4'))  # Concurrent BatchWriteItem requests
+DYNAMODB_BATCH_WRITE_SIZE = 25  # BatchWriteItem maximum
+WRITE_MAX_ATTEMPTS = 8  # Per chunk, for unprocessed items and throttling
+WRITE_RETRY_BASE_SECONDS = 0.05
+WRITE_RETRY_MAX_SECONDS = 5.0
+WRITE_THROTTLING_ERROR_CODES = {'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded'}
+MAX_PRODUCTS_PER_EMAIL = 4
+
+# Fields a campaign_data record is generated from; reprocessing rewrites a stored record only if one changed
+RECORD_CONTENT_FIELDS = CUSTOMER_FIELDS + [
+    f'product_{field}_{i}' for i in range(1, MAX_PRODUCTS_PER_EMAIL + 1) for field in ('link', 'image', 'price', 'name')
+] + ['school_page', 'school_logo']
+RECORD_DELIVERY_FIELDS = ['email_sent', 'sent_at', 'created_at']  # Kept when a stored record is rewritten
+
+# Product file uploads (POST /api/campaigns/{id}/upload-url and /upload-complete)
+PRODUCT_FILE_REQUIRED_COLUMNS = [
+    'Variant SKU', 'Handle', 'Title', 'Option1 Name',
+    'Option1 Value', 'Variant Price', 'Image Src'
+]
+UPLOAD_PART_SIZE = 8 * 1024 * 1024  # Bytes per presigned part (S3 minimum is 5MB for all but the last)
+UPLOAD_MAX_PARTS = 10000  # S3 multipart limit
+UPLOAD_URL_EXPIRES_SECONDS = 3600
+UPLOAD_HEADER_BYTES = 64 * 1024  # The header check reads only this much of the file
+S3_READ_CHUNK_BYTES = 1024 * 1024  # Read size when streaming a product file from S3
+
+# Processing jobs (POST /api/campaigns/{id}/process)
+PROCESS_JOB_MODE = os.environ.get('PROCESS_JOB_MODE', 'async')  # 'async' (job id + progress polling) or 'sync'
+PROCESS_PROGRESS_INTERVAL_SECONDS = 2  # Minimum time between progress writes while records are written
+PROCESS_JOB_STALE_SECONDS = 960  # A job not updated for this long (past the 15 minute Lambda limit) is abandoned
 
 # Base URL for products (same as in the script)
 PRODUCT_BASE_URL = 'https://www.rrinconline.com/products/'
 
-# Initialize AWS services
-dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-s3 = boto3.client('s3', region_name=AWS_REGION)
+# Initialize AWS services (pooled clients, reused across warm invocations)
+# The S3 client is only needed by the upload/process routes, so it is created on
+# first use with get_client('s3') rather than on every cold start
+dynamodb = get_resource('dynamodb')
+# For calls written with typed attribute values ({'S': ...}); the resource's own
+# client (dynamodb.meta.client) converts plain Python values and would re-wrap them
+dynamodb_client = get_client('dynamodb')
 
 def call_openai_api(messages, max_tokens=2000, temperature=0.7):
     """
@@ -296,6 +356,10 @@ def lambda_handler(event, context):
     try:
         logger.info(f"Event: {json.dumps(event)}")
         
+        # Asynchronous self-invocation: a processing job started by POST .../process
+        if event.get('action') == 'process_campaign':
+            return run_processing_job(event['campaign_id'], event['job_id'], event.get('mode', 'diff'), event.get('delete_sent', False))
+        
         # Handle both API Gateway and Function URL formats
         if 'requestContext' in event and 'http' in event['requestContext']:
             # Lambda Function URL format
@@ -331,8 +395,18 @@ def lambda_handler(event, context):
             return delete_campaign(event)
         elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/upload'):
             return upload_products_file(event)
+        elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/upload-url'):
+            return create_products_upload(event)
+        elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/upload-complete'):
+            return complete_products_upload(event)
+        elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/upload-abort'):
+            return abort_products_upload(event)
         elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/process'):
             return process_campaign(event)
+        elif method == 'GET' and path.startswith('/api/campaigns/') and path.endswith('/process-status'):
+            return get_processing_status(event)
+        elif method == 'GET' and path.startswith('/api/campaigns/') and path.endswith('/plan'):
+            return plan_campaign(event)
         elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/upload-hero-image'):
             return upload_hero_image(event)
         elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/upload-image'):
@@ -399,6 +473,10 @@ def create_campaign(event):
             if field not in body:
                 return cors_response(400, {'error': f'Missing required field: {field}'})
         
+        delivery_mode = body.get('delivery_mode', 'rendered')
+        if delivery_mode not in EMAIL_DELIVERY_MODES:
+            return cors_response(400, {'error': f'delivery_mode must be one of: {", ".join(EMAIL_DELIVERY_MODES)}'})
+
         # Generate campaign ID
         campaign_id = str(uuid.uuid4())
         
@@ -430,6 +508,7 @@ def create_campaign(event):
             'emails_sent': 0,
             'batch_count': 0,
             'campaign_type': body.get('campaign_type', 'product_collection'),
+            'delivery_mode': delivery_mode,
             'file_processed': False,
             'template_instance_created': False,  # NEW: Track template instance status
             'ai_enabled': True  # NEW: Enable AI template editing
@@ -638,9 +717,7 @@ def get_campaigns(event):
     try:
         # Query the correct campaigns table (email_campaigns, not college_email_campaign)
         campaigns_table = dynamodb.Table('email_campaigns')
-        response = campaigns_table.scan()
-        
-        raw_campaigns = response.get('Items', [])
+        raw_campaigns = scan_items(campaigns_table)
         
         # Transform campaigns to match frontend expectations and convert Decimals
         campaigns = []
@@ -759,6 +836,13 @@ def update_campaign(event):
             update_parts.append('product_type = :ptype')
             expression_values[':ptype'] = body['product_type']
 
+        # Update delivery mode if provided
+        if 'delivery_mode' in body:
+            if body['delivery_mode'] not in EMAIL_DELIVERY_MODES:
+                return cors_response(400, {'error': f'delivery_mode must be one of: {", ".join(EMAIL_DELIVERY_MODES)}'})
+            update_parts.append('delivery_mode = :mode')
+            expression_values[':mode'] = body['delivery_mode']
+
         if not update_parts:
             return cors_response(400, {'error': 'No fields to update'})
 
@@ -788,7 +872,7 @@ def update_campaign(event):
         return cors_response(500, {'error': str(e)})
 
 def upload_products_file(event):
-    """Upload and process products CSV file"""
+    """Upload and process products CSV file (base64 in the JSON body; see create_products_upload for large files)"""
     try:
         # Extract campaign_id from path
         if 'rawPath' in event:
@@ -815,26 +899,20 @@ def upload_products_file(event):
         except Exception as e:
             return cors_response(400, {'error': 'Invalid file content'})
         
-        # Parse CSV
+        # Parse only the catalog columns; the table is saved as the campaign's catalog artifact
         try:
-            df = pd.read_csv(StringIO(csv_content))
+            products_table = read_product_csv(csv_content)
         except Exception as e:
             return cors_response(400, {'error': f'Error parsing CSV: {str(e)}'})
         
-        # This is a product CSV file, not a customer list
-        # Required columns for product processing (same as the script)
-        required_columns = [
-            'Variant SKU', 'Handle', 'Title', 'Option1 Name', 
-            'Option1 Value', 'Variant Price', 'Image Src'
-        ]
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = missing_product_columns(products_table.header)
         if missing_columns:
             return cors_response(400, {'error': f'Missing required columns: {missing_columns}. This should be a Shopify product export file with all required columns.'})
         
         # Save file to S3
         s3_key = f"campaigns/{campaign_id}/{filename}"
         try:
-            s3.put_object(
+            put_response = get_client('s3').put_object(
                 Bucket=S3_BUCKET,
                 Key=s3_key,
                 Body=csv_content,
@@ -844,49 +922,234 @@ def upload_products_file(event):
             logger.error(f"Error uploading to S3: {e}")
             return cors_response(500, {'error': 'Failed to save file'})
         
-        # Update campaign with file info
-        campaigns_table = dynamodb.Table('email_campaigns')
-        campaigns_table.update_item(
-            Key={'campaign_id': campaign_id},
-            UpdateExpression='SET file_s3_key = :key, total_emails = :total, last_updated = :updated',
-            ExpressionAttributeValues={
-                ':key': s3_key,
-                ':total': len(df),
-                ':updated': datetime.now().isoformat()
-            }
-        )
+        save_catalog_artifact(s3_key, put_response['ETag'], products_table)
+        return cors_response(200, save_products_file_info(campaign_id, s3_key, products_table))
+        
+    except Exception as e:
+        logger.error(f"Error uploading file: {e}")
+        return cors_response(500, {'error': str(e)})
 
-        # ANALYZE PRODUCTS WITH AI to generate campaign content
-        try:
-            logger.info(f"Analyzing products with AI for campaign {campaign_id}...")
+def missing_product_columns(header):
+    """Required product export columns that aren't in a CSV header"""
+    # This is a product CSV file, not a customer list
+    # Required columns for product processing (same as the script)
+    return [col for col in PRODUCT_FILE_REQUIRED_COLUMNS if col not in header]
+
+def save_products_file_info(campaign_id, s3_key, products_table):
+    """Point the campaign at its uploaded product file and analyze sample products with AI"""
+    row_count = len(products_table)
+    
+    # Update campaign with file info
+    campaigns_table = dynamodb.Table('email_campaigns')
+    campaigns_table.update_item(
+        Key={'campaign_id': campaign_id},
+        UpdateExpression='SET file_s3_key = :key, total_emails = :total, last_updated = :updated',
+        ExpressionAttributeValues={
+            ':key': s3_key,
+            ':total': row_count,
+            ':updated': datetime.now().isoformat()
+        }
+    )
 
-            # Sample first 10 products for analysis
-            sample_products = df.head(10)
-            product_titles = sample_products['Title'].dropna().tolist()[:10]
+    # ANALYZE PRODUCTS WITH AI to generate campaign content
+    try:
+        logger.info(f"Analyzing products with AI for campaign {campaign_id}...")
 
-            # Generate campaign content with AI
-            ai_content = generate_campaign_content_from_products(product_titles, campaign_id)
+        # Titles of the first 10 products
+        product_titles = [title for title in products_table.head(10)['Title'] if not isna(title)]
 
-            if ai_content:
-                logger.info(f"AI generated campaign content successfully")
-            else:
-                logger.warning("AI content generation returned empty results")
+        # Generate campaign content with AI
+        ai_content = generate_campaign_content_from_products(product_titles, campaign_id)
 
-        except Exception as e:
-            logger.error(f"Error in AI product analysis: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            # Don't fail the upload if AI fails - just log the error
+        if ai_content:
+            logger.info(f"AI generated campaign content successfully")
+        else:
+            logger.warning("AI content generation returned empty results")
 
+    except Exception as e:
+        logger.error(f"Error in AI product analysis: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        # Don't fail the upload if AI fails - just log the error
+
+    return {
+        'message': 'File uploaded successfully',
+        'records_count': row_count,
+        's3_key': s3_key,
+        'ai_analyzed': True
+    }
+
+def create_products_upload(event):
+    """
+    Start a direct-to-S3 upload of a product CSV
+
+    The browser PUTs each part of the file to its presigned URL (in order, part_size
+    bytes each, the last one shorter), keeps the ETag header of every response and
+    finishes with complete_products_upload. The file never passes through the Lambda.
+
+    Body: {"file_name": "products.csv", "file_size": 12345678}
+    """
+    try:
+        # Extract campaign_id from path
+        if 'rawPath' in event:
+            path = event['rawPath']
+        else:
+            path = event.get('path', '')
+            
+        path_parts = path.split('/')
+        campaign_id = path_parts[3]  # /api/campaigns/{campaign_id}/upload-url
+        
+        body = event.get('body', {})
+        if isinstance(body, str):
+            body = json.loads(body)
+        
+        filename = os.path.basename(body.get('file_name', body.get('filename', 'upload.csv'))) or 'upload.csv'
+        try:
+            file_size = int(body.get('file_size', 0))
+        except (TypeError, ValueError):
+            file_size = 0
+        if file_size <= 0:
+            return cors_response(400, {'error': 'file_size must be a positive number of bytes'})
+        
+        part_count = max(1, math.ceil(file_size / UPLOAD_PART_SIZE))
+        if part_count > UPLOAD_MAX_PARTS:
+            return cors_response(400, {'error': f'File is too large ({file_size} bytes)'})
+        
+        campaigns_table = dynamodb.Table('email_campaigns')
+        if 'Item' not in campaigns_table.get_item(Key={'campaign_id': campaign_id}):
+            return cors_response(404, {'error': 'Campaign not found'})
+        
+        s3_key = f"campaigns/{campaign_id}/{filename}"
+        s3 = get_client('s3', signature_version='s3v4')  # Presigned URLs must be SigV4
+        upload = s3.create_multipart_upload(Bucket=S3_BUCKET, Key=s3_key, ContentType='text/csv')
+        upload_id = upload['UploadId']
+        
+        # Signing is local; no request per part
+        parts = [
+            {
+                'part_number': part_number,
+                'url': s3.generate_presigned_url(
+                    'upload_part',
+                    Params={'Bucket': S3_BUCKET, 'Key': s3_key, 'UploadId': upload_id, 'PartNumber': part_number},
+                    ExpiresIn=UPLOAD_URL_EXPIRES_SECONDS
+                )
+            }
+            for part_number in range(1, part_count + 1)
+        ]
+        
+        logger.info(f"Started upload {upload_id} of {s3_key} ({file_size} bytes, {part_count} parts)")
+        
         return cors_response(200, {
-            'message': 'File uploaded successfully',
-            'records_count': len(df),
+            'upload_id': upload_id,
             's3_key': s3_key,
-            'ai_analyzed': True
+            'part_size': UPLOAD_PART_SIZE,
+            'parts': parts,
+            'expires_in': UPLOAD_URL_EXPIRES_SECONDS
         })
         
     except Exception as e:
-        logger.error(f"Error uploading file: {e}")
+        logger.error(f"Error starting upload: {e}")
+        return cors_response(500, {'error': str(e)})
+
+def complete_products_upload(event):
+    """
+    Finish a direct-to-S3 upload and validate the file where it lies
+
+    The header is checked from the first UPLOAD_HEADER_BYTES of the object, so a wrong
+    file is rejected (and deleted) without reading the rest. A valid file is then streamed
+    once, keeping only the catalog columns, and saved as the campaign's catalog artifact.
+
+    Body: {"upload_id": "...", "s3_key": "...", "parts": [{"part_number": 1, "etag": "..."}]}
+    """
+    try:
+        # Extract campaign_id from path
+        if 'rawPath' in event:
+            path = event['rawPath']
+        else:
+            path = event.get('path', '')
+            
+        path_parts = path.split('/')
+        campaign_id = path_parts[3]  # /api/campaigns/{campaign_id}/upload-complete
+        
+        body = event.get('body', {})
+        if isinstance(body, str):
+            body = json.loads(body)
+        
+        upload_id = body.get('upload_id')
+        s3_key = body.get('s3_key', '')
+        uploaded_parts = body.get('parts') or []
+        
+        if not upload_id or not uploaded_parts:
+            return cors_response(400, {'error': 'upload_id and parts are required'})
+        if not s3_key.startswith(f"campaigns/{campaign_id}/"):
+            return cors_response(400, {'error': 'Invalid s3_key for this campaign'})
+        
+        s3 = get_client('s3')
+        try:
+            completed = s3.complete_multipart_upload(
+                Bucket=S3_BUCKET,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': sorted(
+                    ({'PartNumber': int(part['part_number']), 'ETag': part['etag']} for part in uploaded_parts),
+                    key=lambda part: part['PartNumber']
+                )}
+            )
+        except ClientError as e:
+            logger.error(f"Error completing upload {upload_id}: {e}")
+            return cors_response(400, {'error': f"Upload could not be completed: {e.response['Error'].get('Message', str(e))}"})
+        
+        # Header check from the start of the file only
+        head = s3.get_object(Bucket=S3_BUCKET, Key=s3_key, Range=f'bytes=0-{UPLOAD_HEADER_BYTES - 1}')['Body'].read()
+        header = read_csv_header(csv.reader(StringIO(head.decode('utf-8', errors='ignore'))))
+        missing_columns = missing_product_columns(header)
+        if missing_columns:
+            s3.delete_object(Bucket=S3_BUCKET, Key=s3_key)
+            return cors_response(400, {'error': f'Missing required columns: {missing_columns}. This should be a Shopify product export file with all required columns.'})
+        
+        # Stream the file once: row count, AI sample and the catalog artifact
+        try:
+            products_table = read_s3_product_csv(s3_key)
+        except UnicodeDecodeError:
+            s3.delete_object(Bucket=S3_BUCKET, Key=s3_key)
+            return cors_response(400, {'error': 'Invalid file content'})
+        except csv.Error as e:
+            s3.delete_object(Bucket=S3_BUCKET, Key=s3_key)
+            return cors_response(400, {'error': f'Error parsing CSV: {str(e)}'})
+        
+        save_catalog_artifact(s3_key, completed['ETag'], products_table)
+        return cors_response(200, save_products_file_info(campaign_id, s3_key, products_table))
+        
+    except Exception as e:
+        logger.error(f"Error completing upload: {e}")
+        return cors_response(500, {'error': str(e)})
+
+def abort_products_upload(event):
+    """Cancel a direct-to-S3 upload so S3 discards the parts already uploaded"""
+    try:
+        # Extract campaign_id from path
+        if 'rawPath' in event:
+            path = event['rawPath']
+        else:
+            path = event.get('path', '')
+            
+        path_parts = path.split('/')
+        campaign_id = path_parts[3]  # /api/campaigns/{campaign_id}/upload-abort
+        
+        body = event.get('body', {})
+        if isinstance(body, str):
+            body = json.loads(body)
+        
+        upload_id = body.get('upload_id')
+        s3_key = body.get('s3_key', '')
+        if not upload_id or not s3_key.startswith(f"campaigns/{campaign_id}/"):
+            return cors_response(400, {'error': 'upload_id and a valid s3_key are required'})
+        
+        get_client('s3').abort_multipart_upload(Bucket=S3_BUCKET, Key=s3_key, UploadId=upload_id)
+        return cors_response(200, {'message': 'Upload aborted'})
+        
+    except Exception as e:
+        logger.error(f"Error aborting upload: {e}")
         return cors_response(500, {'error': str(e)})
 
 def upload_campaign_image(event):
@@ -921,7 +1184,7 @@ def upload_campaign_image(event):
         # Save image to S3 WITHOUT ACL (this was causing the error)
         s3_key = f"campaigns/{campaign_id}/images/{filename}"
         try:
-            s3.put_object(
+            get_client('s3').put_object(
                 Bucket=S3_BUCKET,
                 Key=s3_key,
                 Body=image_data,
@@ -988,7 +1251,7 @@ def upload_hero_image(event):
         # Upload to S3 (layout-tool-randr bucket)
         s3_key = f"campaigns/{campaign_id}/hero/{filename}"
         try:
-            s3.put_object(
+            get_client('s3').put_object(
                 Bucket=S3_BUCKET,  # layout-tool-randr
                 Key=s3_key,
                 Body=image_data,
@@ -1058,8 +1321,678 @@ def upload_hero_image(event):
         logger.error(traceback.format_exc())
         return cors_response(500, {'error': str(e)})
 
+def _customer_projection():
+    """ProjectionExpression and names for CUSTOMER_FIELDS ('source' is a reserved word)"""
+    attribute_names = {f'#f{i}': field for i, field in enumerate(CUSTOMER_FIELDS)}
+    return ', '.join(attribute_names), attribute_names
+
+def scan_customers_by_school(school_codes, segments=CUSTOMER_SCAN_SEGMENTS):
+    """
+    Read college_email_campaign once and index the customers of `school_codes` by school_code
+
+    The table is scanned in `segments` parallel segments, each following
+    LastEvaluatedKey to the end, so reads are one pass over the table no matter how
+    many schools the campaign covers. Segments finish in any order, so each school's
+    customers are sorted by email to keep batches reproducible.
+
+    Returns:
+        {school_code: [customer item, ...]} with an entry (possibly empty) per school code
+    """
+    customers_by_school = {school_code: [] for school_code in school_codes}
+    email_table = dynamodb.Table(EMAIL_CAMPAIGN_TABLE)
+    for customer in scan_items(email_table, projection=CUSTOMER_FIELDS, segments=segments):
+        customers = customers_by_school.get(customer.get('school_code'))
+        if customers is not None:
+            customers.append(customer)
+
+    for customers in customers_by_school.values():
+        customers.sort(key=lambda customer: customer.get('customer_email', ''))
+    return customers_by_school
+
+def query_customers_by_school(school_codes, index_name=CUSTOMER_SCHOOL_INDEX):
+    """
+    Like scan_customers_by_school, but reads only the matching customers through a GSI
+    on school_code (one fully paginated query per school, several at a time)
+    """
+    client = dynamodb_client
+    deserializer = TypeDeserializer()
+    projection, attribute_names = _customer_projection()
+    attribute_names['#code'] = 'school_code'
+
+    def query_school(school_code):
+        customers = []
+        query_kwargs = {
+            'TableName': EMAIL_CAMPAIGN_TABLE,
+            'IndexName': index_name,
+            'KeyConditionExpression': '#code = :code',
+            'ProjectionExpression': projection,
+            'ExpressionAttributeNames': attribute_names,
+            'ExpressionAttributeValues': {':code': {'S': school_code}}
+        }
+        while True:
+            response = client.query(**query_kwargs)
+            customers.extend({key: deserializer.deserialize(value) for key, value in item.items()} for item in response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return customers
+            query_kwargs['ExclusiveStartKey'] = last_key
+
+    with ThreadPoolExecutor(max_workers=CUSTOMER_QUERY_WORKERS) as executor:
+        return dict(zip(school_codes, executor.map(query_school, school_codes)))
+
+def load_customers_by_school(school_codes):
+    """Customers per school code, from the school_code GSI if configured, else one parallel scan"""
+    school_codes = list(school_codes)
+    if not school_codes:
+        return {}
+    if CUSTOMER_SCHOOL_INDEX:
+        try:
+            return query_customers_by_school(school_codes, CUSTOMER_SCHOOL_INDEX)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ValidationException':
+                raise
+            logger.warning(f"Index {CUSTOMER_SCHOOL_INDEX} unavailable ({e}), scanning {EMAIL_CAMPAIGN_TABLE} instead")
+    return scan_customers_by_school(school_codes)
+
+def count_customers_by_school(school_codes):
+    """
+    Number of customers per school code, without reading the customers themselves
+
+    With CUSTOMER_SCHOOL_INDEX each school is a Select=COUNT query on the index;
+    otherwise one parallel scan projecting only school_code.
+    """
+    school_codes = list(school_codes)
+    if not school_codes:
+        return {}
+    if CUSTOMER_SCHOOL_INDEX:
+        client = dynamodb_client
+
+        def count_school(school_code):
+            count = 0
+            query_kwargs = {
+                'TableName': EMAIL_CAMPAIGN_TABLE,
+                'IndexName': CUSTOMER_SCHOOL_INDEX,
+                'KeyConditionExpression': '#code = :code',
+                'ExpressionAttributeNames': {'#code': 'school_code'},
+                'ExpressionAttributeValues': {':code': {'S': school_code}},
+                'Select': 'COUNT'
+            }
+            while True:
+                response = client.query(**query_kwargs)
+                count += response.get('Count', 0)
+                last_key = response.get('LastEvaluatedKey')
+                if not last_key:
+                    return count
+                query_kwargs['ExclusiveStartKey'] = last_key
+
+        try:
+            with ThreadPoolExecutor(max_workers=CUSTOMER_QUERY_WORKERS) as executor:
+                return dict(zip(school_codes, executor.map(count_school, school_codes)))
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ValidationException':
+                raise
+            logger.warning(f"Index {CUSTOMER_SCHOOL_INDEX} unavailable ({e}), scanning {EMAIL_CAMPAIGN_TABLE} instead")
+
+    counts = dict.fromkeys(school_codes, 0)
+    email_table = dynamodb.Table(EMAIL_CAMPAIGN_TABLE)
+    for customer in scan_items(email_table, projection=['school_code'], segments=CUSTOMER_SCAN_SEGMENTS):
+        school_code = customer.get('school_code')
+        if school_code in counts:
+            counts[school_code] += 1
+    return counts
+
+def build_school_record_fields(products):
+    """Product and school columns shared by every campaign_data record of one school"""
+    fields = {}
+
+    # Up to 4 products using exact same format as email sender expects
+    for i in range(1, MAX_PRODUCTS_PER_EMAIL + 1):
+        fields[f'product_link_{i}'] = ''
+        fields[f'product_image_{i}'] = ''  # Changed from image_link to match email sender
+        fields[f'product_price_{i}'] = ''
+        fields[f'product_name_{i}'] = ''  # Changed from title to match email sender
+
+    # School page and logo (same for all products of same school)
+    fields['school_page'] = ''
+    fields['school_logo'] = ''
+
+    for i, product in enumerate(products[:MAX_PRODUCTS_PER_EMAIL], start=1):
+        fields[f'product_link_{i}'] = f"{PRODUCT_BASE_URL}{product['handle']}"
+        fields[f'product_image_{i}'] = product['image']
+        fields[f'product_price_{i}'] = product['price']
+        fields[f'product_name_{i}'] = product['title']
+
+    # School page and logo from first product
+    if products:
+        fields['school_page'] = products[0]['school_page']
+        fields['school_logo'] = products[0]['school_logo']
+
+    return convert_to_dynamodb_safe(fields)
+
+def normalize_email(customer_email):
+    """Email as recipients are matched across runs (case and surrounding whitespace ignored)"""
+    return str(customer_email).strip().lower()
+
+def campaign_record_id(campaign_id, customer_email):
+    """Stable campaign_data record_id for a recipient: the same on every (re)processing run"""
+    email_hash = hashlib.sha256(normalize_email(customer_email).encode('utf-8')).hexdigest()[:20]
+    return f"{campaign_id}_{email_hash}"
+
+def record_fingerprint(record):
+    """Hash of the fields a record is generated from (missing fields count as '')"""
+    values = ['' if record.get(field) is None else str(record.get(field)) for field in RECORD_CONTENT_FIELDS]
+    return hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()
+
+def iter_campaign_records(campaign_id, products_by_school, customers_by_school):
+    """
+    Yield DynamoDB-safe campaign_data records school by school (batch numbers are
+    assigned by CampaignRecordDiff)
+
+    The product columns are identical for every customer of a school, so they are
+    built and converted once per school; only the customer fields are converted per record.
+    """
+    for school_code, products in products_by_school.items():
+        customers = customers_by_school.get(school_code, [])
+        logger.info(f"Found {len(customers)} customers for school {school_code}")
+
+        school_fields = build_school_record_fields(products)
+        for customer in customers:
+            customer_email = convert_to_dynamodb_safe(customer.get('customer_email', ''))
+            record = {
+                'campaign_id': campaign_id,
+                'record_id': campaign_record_id(campaign_id, customer_email),
+                'customer_email': customer_email,
+                'customer_name': convert_to_dynamodb_safe(customer.get('customer_name', '')),
+                'school_code': school_code,
+                'source': convert_to_dynamodb_safe(customer.get('source', '')),  # Include source from customer data
+                'email_sent': False,
+                'created_at': datetime.now().isoformat()
+            }
+            record.update(school_fields)
+            yield record
+
+def load_stored_records(campaign_id):
+    """
+    What is already stored for a campaign, for CampaignRecordDiff
+
+    Returns:
+        {record_id: {'batch_number', 'email', 'fingerprint', 'delivery'}} where email is
+        normalized and delivery holds the RECORD_DELIVERY_FIELDS the record has
+    """
+    fields = ['record_id', 'batch_number'] + RECORD_CONTENT_FIELDS + RECORD_DELIVERY_FIELDS
+    projection_names = {f'#p{i}': field for i, field in enumerate(fields)}
+    query_kwargs = {
+        'KeyConditionExpression': Key('campaign_id').eq(campaign_id),
+        'ProjectionExpression': ', '.join(projection_names),
+        'ExpressionAttributeNames': projection_names
+    }
+
+    campaign_data_table = dynamodb.Table('campaign_data')
+    stored = {}
+    while True:
+        response = campaign_data_table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            stored[item['record_id']] = {
+                'batch_number': int(item.get('batch_number', 0)),
+                'email': normalize_email(item.get('customer_email', '')),
+                'fingerprint': record_fingerprint(item),
+                'delivery': {field: item[field] for field in RECORD_DELIVERY_FIELDS if field in item}
+            }
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logger.info(f"Found {len(stored)} stored records for campaign {campaign_id}")
+    return stored
+
+class CampaignRecordDiff:
+    """
+    Works out which campaign_data writes bring a campaign's stored records up to date
+
+    Recipients already stored keep their record and batch, and are rewritten only when a
+    field they were generated from changed (or always, with rewrite_all); their delivery
+    status is carried over. Stored records are matched by record_id, or by customer email
+    for records with another id (those written before record ids were derived from the
+    email, {campaign_id}_{counter}), which then keep their id. New recipients are numbered
+    into batches after the last stored one.
+
+    Stored records that are no longer generated are deleted, except those already sent:
+    they stay in their batch, so a recipient who drops out and comes back later is not
+    sent the campaign again. delete_sent deletes them too. On a first run nothing is
+    stored, so every record is new and batches are numbered from 1.
+    """
+
+    def __init__(self, stored, rewrite_all=False, delete_sent=False):
+        self.stored = stored
+        self.rewrite_all = rewrite_all
+        self.delete_sent = delete_sent
+        self.first_new_batch = max((info['batch_number'] for info in stored.values()), default=0) + 1
+        self.batch_sizes = {}  # batch_number -> records once the writes are applied
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'duplicates': 0, 'matched_by_email': 0, 'kept_sent': 0}
+        self._seen = set()
+        self._by_email = {}
+        for record_id, info in stored.items():
+            if info.get('email'):
+                self._by_email.setdefault(info['email'], record_id)
+
+    def records_to_write(self, records):
+        """Yield the new and changed records, each with its batch_number"""
+        for record in records:
+            record_id = record['record_id']
+            if record_id in self._seen:
+                self.counts['duplicates'] += 1  # Same email listed twice
+                continue
+            self._seen.add(record_id)
+
+            info = self.stored.get(record_id)
+            if info is None:
+                stored_id = self._by_email.get(normalize_email(record.get('customer_email', '')))
+                if stored_id is not None and stored_id not in self._seen:
+                    # Stored under an older id: keep that record instead of adding a second one
+                    self._seen.add(stored_id)
+                    self.counts['matched_by_email'] += 1
+                    record['record_id'] = stored_id
+                    info = self.stored[stored_id]
+
+            if info is None:
+                batch_number = self.first_new_batch + self.counts['new'] // EMAILS_PER_BATCH
+                self.counts['new'] += 1
+            else:
+                batch_number = info['batch_number']
+            self.batch_sizes[batch_number] = self.batch_sizes.get(batch_number, 0) + 1
+            record['batch_number'] = batch_number
+
+            if info is not None:
+                if not self.rewrite_all and info['fingerprint'] == record_fingerprint(record):
+                    self.counts['unchanged'] += 1
+                    continue
+                self.counts['changed'] += 1
+                record.update(info['delivery'])
+            yield record
+
+    def removed_record_ids(self):
+        """Yield stored records records_to_write() didn't produce; iterate it afterwards"""
+        for record_id, info in self.stored.items():
+            if record_id in self._seen:
+                continue
+            if info['delivery'].get('email_sent') and not self.delete_sent:
+                self.counts['kept_sent'] += 1
+                self.batch_sizes[info['batch_number']] = self.batch_sizes.get(info['batch_number'], 0) + 1
+                continue
+            self.counts['removed'] += 1
+            yield record_id
+
+    def stored_batch_sizes(self):
+        sizes = {}
+        for info in self.stored.values():
+            sizes[info['batch_number']] = sizes.get(info['batch_number'], 0) + 1
+        return sizes
+
+def update_campaign_batches(campaign_id, stored_batch_sizes, batch_sizes):
+    """
+    Bring campaign_batches rows in line after an incremental update: new batches get a
+    'ready' row, emptied batches lose theirs and other batches get their new total_emails
+    """
+    batches_table = dynamodb.Table('campaign_batches')
+    for batch_number in sorted(set(stored_batch_sizes) | set(batch_sizes)):
+        size = batch_sizes.get(batch_number, 0)
+        if batch_number not in stored_batch_sizes:
+            batches_table.put_item(Item={
+                'campaign_id': campaign_id,
+                'batch_number': batch_number,
+                'status': 'ready',
+                'total_emails': size,
+                'emails_sent': 0,
+                'created_at': datetime.now().isoformat()
+            })
+        elif size == 0:
+            batches_table.delete_item(Key={'campaign_id': campaign_id, 'batch_number': batch_number})
+        elif size != stored_batch_sizes[batch_number]:
+            batches_table.update_item(
+                Key={'campaign_id': campaign_id, 'batch_number': batch_number},
+                UpdateExpression='SET total_emails = :total',
+                ExpressionAttributeValues={':total': size}
+            )
+
+class CampaignRecordWriter:
+    """
+    Writes a stream of campaign_data records with concurrent BatchWriteItem requests
+
+    Records are cut into 25-item chunks (never spanning two batches) and written by
+    `workers` threads through the thread-safe low-level client. At most two chunks per
+    worker are queued, so the writer's own memory stays flat however large the campaign
+    is. Unprocessed items and throttled requests are retried with exponential backoff
+    and full jitter.
+
+    With create_batches, records arrive in batch order and a batch's campaign_batches row
+    (status 'ready') is written as soon as the record stream has moved past the batch and
+    all of its chunks are stored, so the sender never picks up a partially written batch.
+    """
+
+    def __init__(self, campaign_id, workers=CAMPAIGN_WRITE_WORKERS, sleep=time.sleep, on_progress=None, create_batches=True):
+        self.campaign_id = campaign_id
+        self.create_batches = create_batches
+        self.workers = workers
+        self.sleep = sleep
+        self.on_progress = on_progress  # callback(progress dict), called on this thread as chunks finish
+        self.client = dynamodb_client
+        self.batches_table = dynamodb.Table('campaign_batches')
+        self.serializer = TypeSerializer()
+        self.batch_sizes = {}
+        self.records = 0
+        self.deleted = 0
+        self.records_written = 0
+        self.batches_ready = 0
+        self.retries = 0
+        self._started = None
+        self._executor = None
+        self._in_flight = {}  # future -> (batch_number, chunk size)
+        self._pending_chunks = {}  # batch_number -> chunks not yet written
+        self._closed_batches = set()
+        self._chunk = []
+        self._batch_number = None
+
+    def _write_chunk(self, requests):
+        """Write one chunk, retrying unprocessed items; returns the number of retries"""
+        request_items = {'campaign_data': requests}
+        for attempt in range(WRITE_MAX_ATTEMPTS):
+            try:
+                response = self.client.batch_write_item(RequestItems=request_items)
+                request_items = response.get('UnprocessedItems') or {}
+            except ClientError as e:
+                if e.response['Error']['Code'] not in WRITE_THROTTLING_ERROR_CODES:
+                    raise
+            if not request_items:
+                return attempt
+            backoff = min(WRITE_RETRY_MAX_SECONDS, WRITE_RETRY_BASE_SECONDS * (2 ** attempt))
+            self.sleep(random.uniform(0, backoff))
+        unprocessed = len(request_items.get('campaign_data', []))
+        raise Exception(f"{unprocessed} campaign_data items still unprocessed after {WRITE_MAX_ATTEMPTS} attempts")
+
+    def _submit_chunk(self):
+        if not self._chunk:
+            return
+        while len(self._in_flight) >= self.workers * 2:
+            self._collect(FIRST_COMPLETED)
+        future = self._executor.submit(self._write_chunk, self._chunk)
+        self._in_flight[future] = (self._batch_number, len(self._chunk))
+        self._pending_chunks[self._batch_number] = self._pending_chunks.get(self._batch_number, 0) + 1
+        self._chunk = []
+
+    def _collect(self, return_when):
+        """Wait for in-flight chunks (raising if one failed) and mark finished batches ready"""
+        done, _ = wait(list(self._in_flight), return_when=return_when)
+        for future in done:
+            batch_number, size = self._in_flight.pop(future)
+            self.retries += future.result()
+            self.records_written += size
+            self._pending_chunks[batch_number] -= 1
+        self._mark_ready_batches()
+        if self.on_progress and done:
+            self.on_progress(self.progress())
+
+    def _close_batch(self):
+        """The record stream has moved past the current batch"""
+        self._submit_chunk()
+        if self._batch_number is not None:
+            self._closed_batches.add(self._batch_number)
+            self._mark_ready_batches()
+
+    def _mark_ready_batches(self):
+        for batch_number in sorted(self._closed_batches):
+            if self._pending_chunks.get(batch_number, 0) == 0:
+                self._closed_batches.discard(batch_number)
+                self.batches_ready += 1
+                self.batches_table.put_item(Item={
+                    'campaign_id': self.campaign_id,
+                    'batch_number': batch_number,
+                    'status': 'ready',
+                    'total_emails': self.batch_sizes[batch_number],
+                    'emails_sent': 0,
+                    'created_at': datetime.now().isoformat()
+                })
+
+    def _queue(self, request, batch_number):
+        if batch_number != self._batch_number:
+            self._close_batch()
+            self._batch_number = batch_number
+        self._chunk.append(request)
+        if len(self._chunk) >= DYNAMODB_BATCH_WRITE_SIZE:
+            self._submit_chunk()
+
+    def add(self, record):
+        batch_number = record['batch_number']
+        self.batch_sizes[batch_number] = self.batch_sizes.get(batch_number, 0) + 1
+        self.records += 1
+        item = {key: self.serializer.serialize(value) for key, value in record.items()}
+        self._queue({'PutRequest': {'Item': item}}, batch_number if self.create_batches else None)
+
+    def delete(self, record_id):
+        self.deleted += 1
+        key = {'campaign_id': {'S': self.campaign_id}, 'record_id': {'S': record_id}}
+        self._queue({'DeleteRequest': {'Key': key}}, None)
+
+    def progress(self):
+        """Records and batches stored so far, and the write rate"""
+        seconds = time.monotonic() - self._started if self._started else 0
+        return {
+            'records_written': self.records_written,
+            'batches_ready': self.batches_ready,
+            'items_per_second': round(self.records_written / seconds, 1) if seconds > 0 else 0
+        }
+
+    def write(self, records, deleted_record_ids=()):
+        """
+        Write every record from an iterable, then delete the records in deleted_record_ids
+        (both iterated lazily, in that order)
+
+        Returns:
+            {records, deleted, batches, retries, seconds, items_per_second}
+        """
+        started = self._started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            self._executor = executor
+            try:
+                for record in records:
+                    self.add(record)
+                for record_id in deleted_record_ids:
+                    self.delete(record_id)
+                self._close_batch()
+                self._collect(ALL_COMPLETED)
+            except BaseException:
+                for future in self._in_flight:
+                    future.cancel()
+                raise
+
+        seconds = time.monotonic() - started
+        return {
+            'records': self.records,
+            'deleted': self.deleted,
+            'batches': len(self.batch_sizes),
+            'retries': self.retries,
+            'seconds': round(seconds, 2),
+            'items_per_second': round((self.records + self.deleted) / seconds, 1) if seconds > 0 else 0
+        }
+
+class ProcessingProgress:
+    """
+    Progress of one processing job, kept on the campaign as its processing_job attribute
+
+    Updates only apply while the campaign's processing_job still has this job_id, so a
+    replaced job can't overwrite its successor. Record counts are written at most every
+    PROCESS_PROGRESS_INTERVAL_SECONDS. With job_id=None (synchronous processing) nothing
+    is stored.
+    """
+
+    def __init__(self, campaign_id, job_id=None):
+        self.campaign_id = campaign_id
+        self.job_id = job_id
+        self.started = time.monotonic()
+        self._last_written = 0.0
+
+    def _update(self, values):
+        if self.job_id is None:
+            return
+        values = dict(values, updated_at=datetime.now().isoformat(), elapsed_seconds=round(time.monotonic() - self.started, 1))
+        # Floats (items_per_second, stats) become Decimals for DynamoDB
+        values = json.loads(json.dumps(values, default=decimal_default), parse_float=Decimal)
+
+        names = {'#job': 'processing_job'}
+        attribute_values = {':job_id': self.job_id}
+        assignments = []
+        for i, (field, value) in enumerate(values.items()):
+            names[f'#f{i}'] = field
+            attribute_values[f':v{i}'] = value
+            assignments.append(f'#job.#f{i} = :v{i}')
+
+        try:
+            dynamodb.Table('email_campaigns').update_item(
+                Key={'campaign_id': self.campaign_id},
+                UpdateExpression='SET ' + ', '.join(assignments),
+                ConditionExpression='#job.job_id = :job_id',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=attribute_values
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                logger.warning(f"Processing job {self.job_id} was replaced; progress not recorded")
+            else:
+                logger.error(f"Error recording progress of job {self.job_id}: {e}")
+        except Exception as e:
+            logger.error(f"Error recording progress of job {self.job_id}: {e}")
+
+    def stage(self, stage):
+        logger.info(f"Campaign {self.campaign_id}: {stage}")
+        self._update({'status': 'running', 'stage': stage})
+
+    def records_written(self, write_progress):
+        """CampaignRecordWriter callback"""
+        now = time.monotonic()
+        if now - self._last_written < PROCESS_PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_written = now
+        self._update(write_progress)
+
+    def completed(self, result):
+        write_stats = result.get('write_stats', {})
+        self._update({
+            'status': 'completed',
+            'stage': 'completed',
+            'records_written': write_stats.get('records', 0) + write_stats.get('deleted', 0),
+            'batches_ready': result.get('total_batches', 0),
+            'items_per_second': write_stats.get('items_per_second', 0),
+            'result': result
+        })
+
+    def failed(self, error):
+        self._update({'status': 'failed', 'error': str(error)})
+
+def invoke_self_async(payload):
+    """Invoke this function asynchronously with an action payload. Returns True if scheduled."""
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+    if not function_name:
+        return False
+
+    try:
+        get_client('lambda').invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps(payload).encode('utf-8')
+        )
+        return True
+
+    except Exception as e:
+        logger.error(f"Error invoking {payload.get('action')}: {e}")
+        return False
+
+def start_processing_job(campaign_id, mode='diff', delete_sent=False):
+    """
+    Record a new processing job on the campaign and start it in the background
+
+    In Lambda the job runs in an asynchronous invocation of this function; elsewhere
+    (local runs, tests) it runs on an in-process worker thread.
+
+    Returns:
+        (job, None) once started, or (None, running job) if one is already in progress
+    """
+    campaigns_table = dynamodb.Table('email_campaigns')
+    now = datetime.now()
+    job = {
+        'job_id': str(uuid.uuid4()),
+        'mode': mode,
+        'delete_sent': delete_sent,
+        'status': 'queued',
+        'stage': 'queued',
+        'records_written': 0,
+        'batches_ready': 0,
+        'items_per_second': 0,
+        'started_at': now.isoformat(),
+        'updated_at': now.isoformat()
+    }
+
+    # One job per campaign at a time; a job that stopped reporting (timed out) can be replaced
+    try:
+        campaigns_table.update_item(
+            Key={'campaign_id': campaign_id},
+            UpdateExpression='SET processing_job = :job',
+            ConditionExpression='attribute_not_exists(processing_job) OR NOT (processing_job.#status IN (:queued, :running)) OR processing_job.updated_at < :stale',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':job': job,
+                ':queued': 'queued',
+                ':running': 'running',
+                ':stale': datetime.fromtimestamp(now.timestamp() - PROCESS_JOB_STALE_SECONDS).isoformat()
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            current = campaigns_table.get_item(Key={'campaign_id': campaign_id}).get('Item', {})
+            return None, current.get('processing_job')
+        raise
+
+    if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+        payload = {'action': 'process_campaign', 'campaign_id': campaign_id, 'job_id': job['job_id'], 'mode': mode, 'delete_sent': delete_sent}
+        if not invoke_self_async(payload):
+            ProcessingProgress(campaign_id, job['job_id']).failed('Could not start the processing job')
+            raise Exception('Could not start the processing job')
+    else:
+        worker = threading.Thread(target=run_processing_job, args=(campaign_id, job['job_id'], mode, delete_sent), daemon=True)
+        worker.start()
+
+    logger.info(f"Started processing job {job['job_id']} for campaign {campaign_id}")
+    return job, None
+
+def run_processing_job(campaign_id, job_id, mode='diff', delete_sent=False):
+    """Run a processing job started by start_processing_job, recording its progress and outcome"""
+    progress = ProcessingProgress(campaign_id, job_id)
+    try:
+        campaign = dynamodb.Table('email_campaigns').get_item(Key={'campaign_id': campaign_id}).get('Item')
+        if not campaign:
+            raise Exception('Campaign not found')
+
+        result = run_campaign_processing(campaign_id, campaign, progress, rewrite_all=mode == 'full', delete_sent=delete_sent)
+        progress.completed(result)
+        logger.info(f"Processing job {job_id} for campaign {campaign_id} completed")
+        return cors_response(200, result)
+
+    except Exception as e:
+        logger.error(f"Error processing campaign: {e}")
+        progress.failed(e)
+        return cors_response(500, {'error': str(e)})
+
 def process_campaign(event):
-    """Process campaign data: extract products, match with customers, create batches"""
+    """
+    Process campaign data: extract products, match with customers, create batches
+
+    By default this starts a processing job and returns 202 with its job_id right away;
+    poll GET /api/campaigns/{campaign_id}/process-status for progress. With
+    PROCESS_JOB_MODE=sync, or {"sync": true} in the body, the campaign is processed
+    within the request and the result returned.
+
+    Reprocessing only rewrites recipients whose products, school or customer details
+    changed; send {"mode": "full"} to rewrite every record. Recipients that were already
+    sent are kept even if they drop out, unless the body has {"delete_sent": true}.
+    """
     try:
         # Extract campaign_id from path
         if 'rawPath' in event:
@@ -1078,304 +2011,301 @@ def process_campaign(event):
             return cors_response(404, {'error': 'Campaign not found'})
         
         campaign = campaign_response['Item']
-        s3_key = campaign.get('file_s3_key')
         
-        if not s3_key:
+        if not campaign.get('file_s3_key'):
             return cors_response(400, {'error': 'No file uploaded for this campaign'})
         
-        # Download product file from S3
-        try:
-            response = s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
-            csv_content = response['Body'].read().decode('utf-8')
-        except Exception as e:
-            logger.error(f"Error downloading from S3: {e}")
-            return cors_response(500, {'error': 'Failed to retrieve file'})
-        
-        # Parse product CSV
-        products_df = pd.read_csv(StringIO(csv_content))
-        logger.info(f"Loaded {len(products_df)} product records")
+        body = event.get('body') if isinstance(event.get('body'), dict) else {}
+        mode = body.get('mode', 'diff')
+        if mode not in ('diff', 'full'):
+            return cors_response(400, {'error': "mode must be 'diff' or 'full'"})
+        delete_sent = body.get('delete_sent', False) is True
+        
+        if PROCESS_JOB_MODE == 'sync' or body.get('sync'):
+            result = run_campaign_processing(campaign_id, campaign, ProcessingProgress(campaign_id), rewrite_all=mode == 'full', delete_sent=delete_sent)
+            return cors_response(200, result)
+        
+        job, running_job = start_processing_job(campaign_id, mode, delete_sent)
+        if job is None:
+            return cors_response(409, {
+                'error': 'This campaign is already being processed',
+                'job': running_job
+            })
         
-        # Get college data for school code matching
-        colleges_table = dynamodb.Table(COLLEGE_TABLE)
-        colleges_response = colleges_table.scan()
-        colleges_dict = {item['school_code']: item for item in colleges_response.get('Items', [])}
-        school_codes = list(colleges_dict.keys())
-        logger.info(f"Found {len(school_codes)} school codes: {school_codes}")
-        
-        def extract_school_code(sku):
-            """Extract school code from SKU using the exact same logic as the script."""
-            if pd.isna(sku) or not sku:
-                return ''
-            
-            sku = str(sku).strip()
-            
-            # Pattern 1: C-CUST-{CODE}{NUMBER}
-            match = re.search(r'C-CUST-([A-Za-z]+)(?=\d)', sku)
-            if match:
-                return match.group(1).strip()
-            
-            # Pattern 2: -C-{CODE}{NUMBER}
-            match = re.search(r'-C-([A-Za-z]+)(?=\d)', sku)
-            if match:
-                return match.group(1).strip()
-            
-            # Pattern 3: -C-{CODE} (no number follows)
-            match = re.search(r'-C-([A-Za-z]+)', sku)
-            if match:
-                return match.group(1).strip()
-            
-            return ''
+        return cors_response(202, {
+            'message': 'Campaign processing started',
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'progress_path': f"/api/campaigns/{campaign_id}/process-status"
+        })
         
-        def process_handle_groups(df):
-            """Process products grouped by Handle with INCH pattern logic - simplified version"""
-            logger.info("Processing handle groups...")
-            
-            has_option2 = 'Option2 Name' in df.columns and 'Option2 Value' in df.columns
-            handle_groups = df.groupby('Handle')
-            rows_to_keep = []
-            
-            for handle, group in handle_groups:
-                group = group.copy()
-                
-                # Check for INCH patterns
-                has_inch_option1 = any('inch' in str(val).lower() for val in group['Option1 Value'].dropna())
-                has_inch_option2 = False
-                if has_option2:
-                    has_inch_option2 = any('inch' in str(val).lower() for val in group['Option2 Value'].dropna())
-                
-                # Get base title
-                title_rows = group[group['Title'].notna() & (group['Title'] != '')]
-                if len(title_rows) == 0:
-                    rows_to_keep.extend(group.to_dict('records'))
-                    continue
-                
-                base_title = title_rows.iloc[0]['Title']
-                
-                if has_inch_option1 or has_inch_option2:
-                    # Has INCH - keep lowest price variant
-                    group['price_numeric'] = pd.to_numeric(group['Variant Price'], errors='coerce')
-                    min_price_idx = group['price_numeric'].idxmin()
-                    min_price_row = group.loc[min_price_idx].copy()
-                    
-                    # Build title with options
-                    option1_val = str(min_price_row['Option1 Value']) if pd.notna(min_price_row['Option1 Value']) else ''
-                    option2_val = str(min_price_row['Option2 Value']) if pd.notna(min_price_row['Option2 Value']) and has_option2 else ''
-                    
-                    title_parts = [base_title]
-                    if option1_val:
-                        title_parts.append(option1_val)
-                    if option2_val:
-                        title_parts.append(option2_val)
-                    
-                    min_price_row['Title'] = ' '.join(title_parts)
-                    min_price_row = min_price_row.drop('price_numeric')
-                    rows_to_keep.append(min_price_row.to_dict())
-                else:
-                    # No INCH pattern - keep all variants
-                    for idx, row in group.iterrows():
-                        row_dict = row.to_dict()
-                        
-                        if pd.isna(row_dict['Title']) or row_dict['Title'] == '':
-                            option1_val = str(row['Option1 Value']) if pd.notna(row['Option1 Value']) else ''
-                            option2_val = str(row['Option2 Value']) if pd.notna(row['Option2 Value']) and has_option2 else ''
-                            
-                            title_parts = [base_title]
-                            if option1_val:
-                                title_parts.append(option1_val)
-                            if option2_val:
-                                title_parts.append(option2_val)
-                            
-                            row_dict['Title'] = ' '.join(title_parts)
-                        
-                        rows_to_keep.append(row_dict)
+    except Exception as e:
+        logger.error(f"Error processing campaign: {e}")
+        return cors_response(500, {'error': str(e)})
+
+def read_s3_product_csv(s3_key, columns=PRODUCT_COLUMNS, limit=None):
+    """
+    Stream a product export from S3 into a ProductTable
+
+    The object is decoded and parsed as it downloads, keeping only `columns`; with `limit`
+    the download stops after that many rows.
+    """
+    body = get_client('s3').get_object(Bucket=S3_BUCKET, Key=s3_key)['Body']
+    try:
+        return read_product_csv(iter_text_lines(body.iter_chunks(S3_READ_CHUNK_BYTES)), columns=columns, limit=limit)
+    finally:
+        body.close()  # Drops the connection if the file wasn't read to the end
+
+def catalog_artifact_key(s3_key, etag):
+    """Where the catalog artifact of one version (ETag) of a product file is kept"""
+    version = etag.strip('"')
+    return f"{s3_key}.catalog-{version}.json.gz"
+
+def save_catalog_artifact(s3_key, etag, products_table):
+    """Save a parsed product file as its catalog artifact (a failure only costs a re-parse later)"""
+    try:
+        get_client('s3').put_object(
+            Bucket=S3_BUCKET,
+            Key=catalog_artifact_key(s3_key, etag),
+            Body=dump_catalog(products_table),
+            ContentType='application/gzip'
+        )
+    except Exception as e:
+        logger.error(f"Error saving catalog artifact for {s3_key}: {e}")
+
+def load_product_catalog(s3_key, head=None, save_artifact=True):
+    """
+    The parsed product table of a campaign's product file
+
+    Loaded from the catalog artifact saved at upload when it matches the file's current
+    ETag. Otherwise the file is streamed and parsed, and the artifact saved for next time
+    (unless save_artifact is False); with `head`, only that many rows are read and
+    nothing is saved.
+    """
+    s3 = get_client('s3')
+    etag = s3.head_object(Bucket=S3_BUCKET, Key=s3_key)['ETag']
+    artifact_key = catalog_artifact_key(s3_key, etag)
+    try:
+        products_table = load_catalog(s3.get_object(Bucket=S3_BUCKET, Key=artifact_key)['Body'].read())
+        logger.info(f"Loaded catalog artifact {artifact_key}")
+        return products_table.head(head) if head is not None else products_table
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            logger.error(f"Error loading catalog artifact {artifact_key}: {e}")
+    except ValueError as e:
+        logger.warning(f"Ignoring catalog artifact {artifact_key}: {e}")
+
+    if head is not None:
+        return read_s3_product_csv(s3_key, limit=head)
+
+    products_table = read_s3_product_csv(s3_key)
+    if save_artifact:
+        save_catalog_artifact(s3_key, etag, products_table)
+    return products_table
+
+def extract_campaign_products(s3_key, save_artifact=True):
+    """
+    Products per school for a campaign's product file: school codes from SKUs, handle
+    groups reduced (INCH logic), and only products with a known school and an image
+
+    Returns:
+        {school_code: [product info, ...]}, in the order schools first appear
+    """
+    # The parsed catalog saved at upload, or the product file streamed from S3 keeping only
+    # the columns we need (no pandas; see product_catalog)
+    try:
+        products_table = load_product_catalog(s3_key, save_artifact=save_artifact)
+    except (ClientError, BotoCoreError) as e:
+        logger.error(f"Error downloading from S3: {e}")
+        raise Exception('Failed to retrieve file')
+    logger.info(f"Loaded {len(products_table)} product records")
+    
+    # Get college data for school code matching (shared, fully paginated directory)
+    colleges_dict = get_school_directory(dynamodb, COLLEGE_TABLE).schools_by_code()
+    logger.info(f"Found {len(colleges_dict)} school codes: {list(colleges_dict.keys())}")
+    
+    products_by_school, product_stats = group_products_by_school(products_table, colleges_dict)
+    logger.info(f"Extracted {product_stats['school_codes_extracted']} school codes from SKUs")
+    logger.info(f"After filtering: {product_stats['products_matched']} products with school matches and images")
+    
+    logger.info(f"Extracted products for {len(products_by_school)} schools: {list(products_by_school.keys())}")
+    return products_by_school
+
+def run_campaign_processing(campaign_id, campaign, progress, rewrite_all=False, delete_sent=False):
+    """
+    The processing pipeline behind process_campaign
+
+    Records are built and written as a stream, but memory is still bounded by the
+    campaign's customers, not constant: the customer index from load_customers_by_school
+    (every matched customer's CUSTOMER_FIELDS) and the summaries from load_stored_records
+    (one per stored record) are held for the whole run.
+
+    Args:
+        campaign: the email_campaigns item (its file_s3_key is read)
+        progress: ProcessingProgress told about each stage and the records written
+        rewrite_all: rewrite every stored record, not just those whose content changed
+        delete_sent: also delete already-sent records of recipients that dropped out
+
+    Returns:
+        dict: totals for the response, including write_stats
+    """
+    s3_key = campaign.get('file_s3_key')
+    if not s3_key:
+        raise Exception('No file uploaded for this campaign')
+    
+    # Products per school, from the catalog artifact or the streamed product file
+    progress.stage('reading_products')
+    products_by_school = extract_campaign_products(s3_key)
+    
+    # Get customer emails for matched school codes (one read of the customer table)
+    progress.stage('loading_customers')
+    customers_by_school = load_customers_by_school(products_by_school.keys())
+    
+    # Compare with what a previous run stored: only new and changed recipients are written
+    progress.stage('comparing')
+    diff = CampaignRecordDiff(load_stored_records(campaign_id), rewrite_all=rewrite_all, delete_sent=delete_sent)
+    stored_batch_sizes = diff.stored_batch_sizes()
+    
+    # Build records lazily and stream them to campaign_data. On a first run batch rows are
+    # created as batches fill; otherwise they are brought up to date afterwards.
+    progress.stage('writing')
+    records = iter_campaign_records(campaign_id, products_by_school, customers_by_school)
+    writer = CampaignRecordWriter(campaign_id, on_progress=progress.records_written, create_batches=not diff.stored)
+    write_stats = writer.write(diff.records_to_write(records), diff.removed_record_ids())
+    if diff.stored:
+        update_campaign_batches(campaign_id, stored_batch_sizes, diff.batch_sizes)
+    logger.info(f"Wrote campaign data: {json.dumps(write_stats)}, changes: {json.dumps(diff.counts)}")
+    
+    total_records = sum(diff.batch_sizes.values())
+    total_batches = len(diff.batch_sizes)
+    
+    # Update campaign status
+    progress.stage('finalizing')
+    dynamodb.Table('email_campaigns').update_item(
+        Key={'campaign_id': campaign_id},
+        UpdateExpression='SET #status = :status, batch_count = :batches, total_emails = :total, last_updated = :updated, file_processed = :processed',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={
+            ':status': 'ready',
+            ':batches': total_batches,
+            ':total': total_records,
+            ':updated': datetime.now().isoformat(),
+            ':processed': True
+        }
+    )
+    
+    return {
+        'message': 'Campaign processed successfully',
+        'total_batches': total_batches,
+        'total_records': total_records,
+        'schools_processed': len(products_by_school),
+        'products_found': sum(len(products) for products in products_by_school.values()),
+        'write_stats': write_stats,
+        'changes': diff.counts
+    }
+
+def get_processing_status(event):
+    """Progress of the campaign's latest processing job"""
+    try:
+        # Extract campaign_id from path
+        if 'rawPath' in event:
+            path = event['rawPath']
+        else:
+            path = event.get('path', '')
             
-            return pd.DataFrame(rows_to_keep)
-        
-        # Extract school codes using the exact same logic
-        products_df['school_code'] = products_df['Variant SKU'].apply(extract_school_code)
-        logger.info(f"Extracted {(products_df['school_code'] != '').sum()} school codes from SKUs")
-        
-        # Process handle groups (simplified version for lambda)
-        products_df = process_handle_groups(products_df)
-        
-        # Enrich with college data
-        for idx, row in products_df.iterrows():
-            school_code = str(row['school_code']).strip() if pd.notna(row['school_code']) else ''
-            if school_code and school_code in colleges_dict:
-                college_info = colleges_dict[school_code]
-                products_df.at[idx, 'school_name'] = college_info.get('school_name', '')
-                products_df.at[idx, 'school_page'] = college_info.get('school_page', '')
-                products_df.at[idx, 'school_logo'] = college_info.get('school_logo', '')
-                products_df.at[idx, 'has_match'] = True
-            else:
-                products_df.at[idx, 'has_match'] = False
-        
-        # Filter to only products with school matches and images
-        products_df = products_df[products_df['has_match']].copy()
-        products_df = products_df[products_df['Image Src'].notna() & (products_df['Image Src'] != '')].copy()
-        
-        logger.info(f"After filtering: {len(products_df)} products with school matches and images")
-        
-        # Group products by school code
-        products_by_school = {}
-        for idx, row in products_df.iterrows():
-            school_code = str(row['school_code']).strip()
-            if school_code:
-                if school_code not in products_by_school:
-                    products_by_school[school_code] = []
-                
-                # Extract product info using exact same format as the script
-                # Convert price to string to avoid DynamoDB Decimal issues
-                price = row.get('Variant Price', '')
-                if isinstance(price, (int, float)):
-                    price = str(price)
-                
-                product_info = {
-                    'handle': row.get('Handle', ''),
-                    'title': row.get('Title', ''),
-                    'price': price,
-                    'image': row.get('Image Src', ''),
-                    'school_page': row.get('school_page', ''),
-                    'school_logo': row.get('school_logo', '')
-                }
-                products_by_school[school_code].append(product_info)
+        path_parts = path.split('/')
+        campaign_id = path_parts[3]  # /api/campaigns/{campaign_id}/process-status
         
-        logger.info(f"Extracted products for {len(products_by_school)} schools: {list(products_by_school.keys())}")
+        campaigns_table = dynamodb.Table('email_campaigns')
+        response = campaigns_table.get_item(Key={'campaign_id': campaign_id})
         
-        # Get customer emails for matched school codes
-        email_table = dynamodb.Table(EMAIL_CAMPAIGN_TABLE)
+        if 'Item' not in response:
+            return cors_response(404, {'error': 'Campaign not found'})
         
-        campaign_data_table = dynamodb.Table('campaign_data')
-        batches_table = dynamodb.Table('campaign_batches')
+        job = response['Item'].get('processing_job')
+        if not job:
+            return cors_response(200, {'campaign_id': campaign_id, 'status': 'none'})
         
-        batch_number = 1
-        batch_records = []
-        total_records = 0
+        # A job that stopped reporting was cut off (e.g. by the Lambda timeout)
+        stale_before = datetime.fromtimestamp(time.time() - PROCESS_JOB_STALE_SECONDS).isoformat()
+        job['stale'] = job.get('status') in ('queued', 'running') and job.get('updated_at', '') < stale_before
         
-        for school_code, products in products_by_school.items():
-            # Get customers for this school
-            try:
-                response = email_table.scan(
-                    FilterExpression=Attr('school_code').eq(school_code)
-                )
-                customers = response.get('Items', [])
-                logger.info(f"Found {len(customers)} customers for school {school_code}")
-                
-                # Create email records for each customer with products (matching the script's enrichment logic)
-                for customer in customers:
-                    record_id = f"{campaign_id}_{total_records}"
-                    total_records += 1
-                    
-                    # Get college info
-                    college_info = colleges_dict.get(school_code, {})
-                    
-                    # Prepare record data using exact same structure as the script
-                    record_data = {
-                        'campaign_id': campaign_id,
-                        'record_id': record_id,
-                        'batch_number': batch_number,
-                        'customer_email': customer.get('customer_email', ''),
-                        'customer_name': customer.get('customer_name', ''),
-                        'school_code': school_code,
-                        'source': customer.get('source', ''),  # Include source from customer data
-                        'email_sent': False,
-                        'created_at': datetime.now().isoformat()
-                    }
-                    
-                    # Add up to 4 products using exact same format as email sender expects
-                    max_products = 4
-                    for i in range(1, max_products + 1):
-                        record_data[f'product_link_{i}'] = ''
-                        record_data[f'product_image_{i}'] = ''  # Changed from image_link to match email sender
-                        record_data[f'product_price_{i}'] = ''
-                        record_data[f'product_name_{i}'] = ''  # Changed from title to match email sender
-
-                    # Add school page and logo (same for all products of same school)
-                    record_data['school_page'] = ''
-                    record_data['school_logo'] = ''
-
-                    # Fill in product data (up to 4 products)
-                    for i, product in enumerate(products[:max_products], start=1):
-                        record_data[f'product_link_{i}'] = f"{PRODUCT_BASE_URL}{product['handle']}"
-                        record_data[f'product_image_{i}'] = product['image']  # Changed from image_link
-                        record_data[f'product_price_{i}'] = product['price']
-                        record_data[f'product_name_{i}'] = product['title']  # Changed from title
-                    
-                    # Add school page and logo from first product
-                    if products:
-                        record_data['school_page'] = products[0]['school_page']
-                        record_data['school_logo'] = products[0]['school_logo']
-                    
-                    # Convert all data to DynamoDB-safe types
-                    safe_record_data = convert_to_dynamodb_safe(record_data)
-                    batch_records.append(safe_record_data)
-                    
-                    # If batch is full, save it
-                    if len(batch_records) >= EMAILS_PER_BATCH:
-                        # Save batch records
-                        with campaign_data_table.batch_writer() as batch:
-                            for record in batch_records:
-                                batch.put_item(Item=record)
-                        
-                        # Create batch entry
-                        batches_table.put_item(Item={
-                            'campaign_id': campaign_id,
-                            'batch_number': batch_number,
-                            'status': 'ready',
-                            'total_emails': len(batch_records),
-                            'emails_sent': 0,
-                            'created_at': datetime.now().isoformat()
-                        })
-                        
-                        batch_number += 1
-                        batch_records = []
-                        
-            except Exception as e:
-                logger.error(f"Error processing school {school_code}: {e}")
-                continue
+        return cors_response(200, dict(job, campaign_id=campaign_id))
         
-        # Save remaining records
-        total_batches = batch_number - 1
-        if batch_records:
-            with campaign_data_table.batch_writer() as batch:
-                for record in batch_records:
-                    batch.put_item(Item=record)
-            
-            batches_table.put_item(Item={
-                'campaign_id': campaign_id,
-                'batch_number': batch_number,
-                'status': 'ready',
-                'total_emails': len(batch_records),
-                'emails_sent': 0,
-                'created_at': datetime.now().isoformat()
-            })
+    except Exception as e:
+        logger.error(f"Error getting processing status: {e}")
+        return cors_response(500, {'error': str(e)})
+
+def plan_campaign(event):
+    """
+    Dry run of process_campaign: projected recipients, schools and batches, and how long
+    sending would take at EMAILS_PER_SECOND
+
+    Uses the same product extraction, but only counts customers per school instead of
+    loading them, and writes nothing (no campaign_data, batches or catalog artifact).
+    Batches are laid out as on a first run; recipients listed under two schools are
+    counted twice, while processing keeps them once.
+    """
+    try:
+        # Extract campaign_id from path
+        if 'rawPath' in event:
+            path = event['rawPath']
+        else:
+            path = event.get('path', '')
             
-            total_batches = batch_number
+        path_parts = path.split('/')
+        campaign_id = path_parts[3]  # /api/campaigns/{campaign_id}/plan
         
-        # Update campaign status
-        campaigns_table.update_item(
-            Key={'campaign_id': campaign_id},
-            UpdateExpression='SET #status = :status, batch_count = :batches, total_emails = :total, last_updated = :updated, file_processed = :processed',
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':status': 'ready',
-                ':batches': total_batches,
-                ':total': total_records,
-                ':updated': datetime.now().isoformat(),
-                ':processed': True
-            }
-        )
+        campaigns_table = dynamodb.Table('email_campaigns')
+        response = campaigns_table.get_item(Key={'campaign_id': campaign_id})
+        
+        if 'Item' not in response:
+            return cors_response(404, {'error': 'Campaign not found'})
+        
+        s3_key = response['Item'].get('file_s3_key')
+        if not s3_key:
+            return cors_response(400, {'error': 'No file uploaded for this campaign'})
+        
+        started = time.time()
+        products_by_school = extract_campaign_products(s3_key, save_artifact=False)
+        customer_counts = count_customers_by_school(products_by_school.keys())
         
+        # Same order as iter_campaign_records: school by school, EMAILS_PER_BATCH per batch
+        schools = []
+        batches = []
+        for school_code, products in products_by_school.items():
+            recipients = customer_counts.get(school_code, 0)
+            schools.append({'school_code': school_code, 'products': len(products), 'recipients': recipients})
+            while recipients:
+                if not batches or batches[-1]['total_emails'] == EMAILS_PER_BATCH:
+                    batches.append({'batch_number': len(batches) + 1, 'total_emails': 0, 'school_codes': []})
+                batch = batches[-1]
+                added = min(recipients, EMAILS_PER_BATCH - batch['total_emails'])
+                batch['total_emails'] += added
+                batch['school_codes'].append(school_code)
+                recipients -= added
+        
+        for batch in batches:
+            batch['estimated_send_seconds'] = round(batch['total_emails'] / EMAILS_PER_SECOND)
+        
+        total_records = sum(school['recipients'] for school in schools)
         return cors_response(200, {
-            'message': 'Campaign processed successfully',
-            'total_batches': total_batches,
+            'campaign_id': campaign_id,
             'total_records': total_records,
+            'total_batches': len(batches),
             'schools_processed': len(products_by_school),
-            'products_found': sum(len(products) for products in products_by_school.values())
+            'schools_with_recipients': sum(1 for school in schools if school['recipients']),
+            'products_found': sum(len(products) for products in products_by_school.values()),
+            'emails_per_batch': EMAILS_PER_BATCH,
+            'emails_per_second': EMAILS_PER_SECOND,
+            'estimated_send_seconds': round(total_records / EMAILS_PER_SECOND),
+            'batches': batches,
+            'schools': schools,
+            'planning_seconds': round(time.time() - started, 2)
         })
         
     except Exception as e:
-        logger.error(f"Error processing campaign: {e}")
+        logger.error(f"Error planning campaign: {e}")
         return cors_response(500, {'error': str(e)})
 
 def get_campaign_batches(event):
@@ -1669,39 +2599,14 @@ def generate_personalized_email(template_html_raw, template_config, recipient):
         return template_html_raw
 
 def get_school_name_from_code(school_code):
-    """Get school name from school code using college-db-email table
+    """Get school name from school code using the cached college-db-email directory
 
     NOTE: The college-db-email table has partition key 'school_name' (the full name),
-    and 'school_code' (e.g., 'AKN') is just an attribute. We must scan the table
-    to find the school by code. This is efficient since table has <200 records.
+    and 'school_code' (e.g., 'AKN') is just an attribute. The shared SchoolDirectory
+    scans the table once and indexes it by code, instead of one scan per lookup.
     """
     try:
-        if not school_code:
-            logger.warning("get_school_name_from_code called with empty school_code")
-            return school_code
-
-        college_db_table = dynamodb.Table('college-db-email')
-        logger.info(f"Scanning college-db-email table for school_code='{school_code}'")
-
-        # Must use scan() since school_code is an attribute, not the partition key
-        response = college_db_table.scan(
-            FilterExpression=Attr('school_code').eq(school_code)
-        )
-
-        items = response.get('Items', [])
-        if items:
-            school_name = items[0].get('school_name', '')
-            logger.info(f"Found school entry: school_code='{school_code}', school_name='{school_name}'")
-
-            # If school_name is empty or same as code, log warning
-            if not school_name or school_name == school_code:
-                logger.warning(f"School entry exists but school_name is empty or equals code: school_code='{school_code}', school_name='{school_name}'")
-                return school_code
-
-            return school_name
-        else:
-            logger.warning(f"No entry found in college-db-email for school_code='{school_code}'")
-            return school_code
+        return get_school_directory(dynamodb, 'college-db-email').get_school_name(school_code)
 
     except Exception as e:
         logger.error(f"Error getting school name for code '{school_code}': {e}")
@@ -1772,9 +2677,7 @@ def get_colleges(event):
     """Get all colleges"""
     try:
         colleges_table = dynamodb.Table(COLLEGE_TABLE)
-        response = colleges_table.scan()
-        
-        colleges = response.get('Items', [])
+        colleges = list(scan_items(colleges_table))
         colleges.sort(key=lambda x: x.get('school_name', ''))
         
         return cors_response(200, {'colleges': colleges})
@@ -1874,9 +2777,7 @@ def get_test_users(event):
     """Get all test users"""
     try:
         test_users_table = dynamodb.Table('test_users')
-        response = test_users_table.scan()
-        
-        users = response.get('Items', [])
+        users = list(scan_items(test_users_table))
         users.sort(key=lambda x: x.get('name', ''))
         
         return cors_response(200, {'users': users})
@@ -2037,7 +2938,7 @@ def delete_campaign(event):
         s3_key = campaign.get('file_s3_key')
         if s3_key:
             try:
-                s3.delete_object(Bucket=S3_BUCKET, Key=s3_key)
+                get_client('s3').delete_object(Bucket=S3_BUCKET, Key=s3_key)
                 logger.info(f"Deleted S3 file: {s3_key}")
             except Exception as e:
                 logger.warning(f"Error deleting S3 file: {e}")
@@ -2077,19 +2978,21 @@ def ai_generate_content(event):
         if not s3_key:
             return cors_response(400, {'error': 'No product file uploaded yet'})
 
-        # Download and parse product file
-        response = s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
-        csv_content = response['Body'].read().decode('utf-8')
-        products_df = pd.read_csv(StringIO(csv_content))
+        # First 5 products, from the catalog artifact or the start of the product file
+        sample_table = load_product_catalog(s3_key, head=5)
+
+        def sample_column(name):
+            return sample_table.columns.get(name, [''] * len(sample_table))
 
         # Extract sample product info for AI (first 5 products)
         sample_products = []
-        for _, row in products_df.head(5).iterrows():
+        for title, price, sku, option in zip(sample_column('Title'), sample_column('Variant Price'),
+                                             sample_column('Variant SKU'), sample_column('Option1 Value')):
             sample_products.append({
-                'title': row.get('Title', ''),
-                'price': row.get('Variant Price', ''),
-                'sku': row.get('Variant SKU', ''),
-                'option': row.get('Option1 Value', '')
+                'title': title,
+                'price': price,
+                'sku': sku,
+                'option': option
             })
 
         # Create AI prompt - ONLY for metadata generation
@@ -2477,26 +3380,20 @@ def preview_test_user_email(event):
         # Get test users from test_users table
         test_users_table = dynamodb.Table('test_users')
 
+        # Limit=1 would stop after evaluating one item, so scan until the first match instead
         if requested_email:
             # Get specific test user
-            response = test_users_table.scan(
-                FilterExpression=Attr('email').eq(requested_email) & Attr('active').eq(True),
-                Limit=1
-            )
+            condition = Attr('email').eq(requested_email) & Attr('active').eq(True)
         else:
             # Get first active test user
-            response = test_users_table.scan(
-                FilterExpression=Attr('active').eq(True),
-                Limit=1
-            )
+            condition = Attr('active').eq(True)
 
-        test_users = response.get('Items', [])
-        if not test_users:
+        test_user = next(scan_items(test_users_table, condition=condition), None)
+        if test_user is None:
             # Fallback to generic preview
             logger.warning("No test users found, returning generic preview")
             return cors_response(404, {'error': 'No active test users found in test_users table'})
 
-        test_user = test_users[0]
         school_code = test_user.get('school_code', '')
 
         logger.info(f"========== TEST USER PREVIEW ==========")
@@ -2564,7 +3461,6 @@ def get_products_for_test_user_preview(campaign_id, school_code):
     """
     try:
         campaign_data_table = dynamodb.Table('campaign_data')
-        college_db_table = dynamodb.Table('college-db-email')
 
         # Fallback schools in order (same as test email logic)
         FALLBACK_SCHOOLS = [
@@ -2593,16 +3489,10 @@ def get_products_for_test_user_preview(campaign_id, school_code):
                 logger.info(f"✓ SUCCESS: Found products for school {try_school} (preferred was: {school_code})")
                 recipient = items[0]
 
-                # Get school information from college-db-email
-                # IMPORTANT: Must use scan() since school_code is an attribute, not partition key
+                # Get school information from the cached college-db-email directory
                 try:
-                    school_response = college_db_table.scan(
-                        FilterExpression=Attr('school_code').eq(try_school),
-                        Limit=1
-                    )
-                    items = school_response.get('Items', [])
-                    if items:
-                        school_info = items[0]
+                    school_info = get_school_directory(dynamodb, 'college-db-email').get_school(try_school)
+                    if school_info:
                         recipient['school_name'] = school_info.get('school_name', try_school)
                         recipient['school_logo'] = school_info.get('school_logo', '')
                         recipient['school_page'] = school_info.get('school_page', '')
@@ -10,20 +10,48 @@ Environment Variables Required:
 - SES_SENDER: "R and R Imports INC" <hello@rrinconline.com>
 - SES_REPLY_TO: hello@rrinconline.com
 
+Optional Environment Variables:
+- SES_MAX_SEND_RATE: SES account send quota in emails/second (default 14)
+- SES_SEND_WORKERS: concurrent SES send threads (default 10)
+- BATCH_AUTO_RESUME: re-invoke this function asynchronously when a batch times out (default true)
+- MAX_BATCH_RESUMES: maximum automatic re-invocations per batch (default 20)
+- SES_ENDPOINT_URL: send SES calls to a local stand-in instead of AWS (for testing)
+- PRERENDER_STORE: s3://bucket/prefix (or a local directory) for pre-rendered school documents
+- CAMPAIGN_SEND_CONCURRENCY: batches sent in parallel by a campaign-wide send (default 4)
+- SES_RATE_BUDGET_TABLE: DynamoDB table holding the send rate budget shared by all invocations
+
+Delivery modes (email_campaigns.delivery_mode):
+- rendered (default): HTML is rendered here and sent with one SendEmail call per recipient
+- ses_template: the campaign template is registered with SES once and sent with
+  SendBulkTemplatedEmail, up to 50 recipients per call with per-recipient replacement data
+
 Dependencies (add as Lambda layers):
 - boto3
 - jinja2 (for template rendering)
 """
 
 import json
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeDeserializer
+import collections
+import hashlib
+import itertools
 import logging
+import random
+import re
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 import os
 
+from aws_clients import get_client, get_resource, latency_stats
+from document_store import content_hash, get_document, get_document_store, get_manifest, put_document, put_manifest
+from dynamo_scan import scan_items
+from school_directory import get_school_directory
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -34,12 +62,84 @@ SES_SENDER = os.environ.get('SES_SENDER', '"R and R Imports INC" <hello@rrinconl
 SES_REPLY_TO = os.environ.get('SES_REPLY_TO', 'hello@rrinconline.com')
 
 # Email sending configuration
-EMAILS_PER_SECOND = 14  # AWS SES rate limit
+EMAILS_PER_SECOND = float(os.environ.get('SES_MAX_SEND_RATE', '14'))  # AWS SES rate limit (raise for higher quotas)
+SEND_WORKERS = int(os.environ.get('SES_SEND_WORKERS', '10'))  # Concurrent SES requests in flight
 BATCH_TIMEOUT_MINUTES = 10  # Maximum processing time per batch
 
-# Initialize AWS services
-dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-ses = boto3.client('ses', region_name=AWS_REGION)
+# Throttling / transient error handling (AIMD send rate + jittered exponential backoff)
+SES_MAX_SEND_ATTEMPTS = 5  # Attempts per message before a retryable error counts as failed
+SES_RETRY_BASE_SECONDS = 0.5
+SES_RETRY_MAX_SECONDS = 8.0
+SES_MIN_SEND_RATE = 1.0  # Throttling never slows sending below this (emails/second)
+SES_RATE_RECOVERY_PER_SECOND = 0.1  # Additive increase: share of the configured rate regained per second of clean sending
+SES_RATE_DECREASE_FACTOR = 0.75  # Multiplicative decrease applied on throttling
+SES_THROTTLE_COOLDOWN_SECONDS = 1.0  # Throttles within this window of a decrease count once
+SES_THROTTLING_ERROR_CODES = {'Throttling', 'ThrottlingException', 'TooManyRequestsException', 'MaxSendRateExceeded'}
+SES_TRANSIENT_ERROR_CODES = {'ServiceUnavailable', 'InternalFailure', 'RequestTimeout'}
+
+# Delivery modes (selected per campaign with email_campaigns.delivery_mode)
+DELIVERY_MODE_RENDERED = 'rendered'
+DELIVERY_MODE_SES_TEMPLATE = 'ses_template'
+SES_BULK_MAX_DESTINATIONS = 50  # SendBulkTemplatedEmail accepts at most 50 destinations per call
+SES_SUBJECT_PLACEHOLDER = 'EMAIL_SUBJECT'  # Replacement data key carrying the personalized subject
+SES_OPEN_BRACES_PLACEHOLDER = 'OPEN_BRACES'  # Stands in for literal '{{' left in the template
+
+# Delivery status write-behind configuration
+STATUS_FLUSH_MAX_ITEMS = 25  # BatchExecuteStatement accepts at most 25 statements
+STATUS_FLUSH_MAX_SECONDS = 2.0  # Flush buffered statuses at least this often
+STATUS_FLUSH_MAX_ATTEMPTS = 3
+
+# campaign_data attributes the renderer and status writer need (everything else is left in DynamoDB)
+RECIPIENT_FIELDS = [
+    'campaign_id', 'record_id', 'batch_number', 'customer_email', 'customer_name', 'recipient_name',
+    'school_code', 'school_page', 'school_logo'
+] + [f'product_{field}_{i}' for i in range(1, 5) for field in ('link', 'image', 'name', 'price')]
+RECIPIENT_PAGE_SIZE = 500  # Items evaluated per BatchIndex query page
+
+# Checkpoint / resume configuration
+CHECKPOINT_INTERVAL_SECONDS = 30  # How often the resume point is persisted to campaign_batches
+BATCH_AUTO_RESUME = os.environ.get('BATCH_AUTO_RESUME', 'true').lower() == 'true'
+MAX_BATCH_RESUMES = int(os.environ.get('MAX_BATCH_RESUMES', '20'))
+
+# Template config keys that are personalized per recipient instead of copied from template_config
+PERSONALIZED_CONFIG_KEYS = ['PRODUCTS_HTML', 'GREETING_TEXT', 'PRODUCTS_TITLE', 'PRODUCTS_SUBTITLE', 'DESCRIPTION_TEXT']
+
+# Placeholders filled per recipient at send time (everything else is the same for the whole batch),
+# in the order the original renderer replaced them one after another (see resolve_placeholder_values)
+RECIPIENT_PLACEHOLDERS = [
+    'GREETING_TEXT', 'TEAM_NAME', 'PRODUCTS_TITLE', 'PRODUCTS_SUBTITLE', 'DESCRIPTION_TEXT',
+    'PRODUCTS_HTML', 'HERO_LINK', 'CTA_LINK', 'SCHOOL_PAGE', 'CTA_SECONDARY_LINK', 'HERO_IMAGE_URL'
+]
+RECIPIENT_PLACEHOLDER_PATTERN = re.compile(r'\{\{(' + '|'.join(RECIPIENT_PLACEHOLDERS) + r')\}\}')
+RECIPIENT_PLACEHOLDER_ORDER = {slot: index for index, slot in enumerate(RECIPIENT_PLACEHOLDERS)}
+
+# Recipient fields every placeholder except GREETING_TEXT depends on. Recipients that share
+# them (same school and products) share one pre-rendered document.
+SCHOOL_FRAGMENT_FIELDS = ['school_code', 'school_page', 'school_logo'] + [
+    f'product_{field}_{i}' for i in range(1, 5) for field in ('link', 'image', 'name', 'price')
+]
+FRAGMENT_CACHE_SIZE = 1024  # Pre-rendered school documents kept per compiled template
+
+# Optional pre-render stage (POST /api/campaigns/{id}/prerender)
+PRERENDER_STORE = os.environ.get('PRERENDER_STORE', '')
+PRERENDER_IO_WORKERS = 8  # Concurrent document uploads/downloads
+
+# Campaign-wide sends (POST /api/campaigns/{id}/send-all)
+CAMPAIGN_SEND_CONCURRENCY = int(os.environ.get('CAMPAIGN_SEND_CONCURRENCY', '4'))  # Batches sending at once
+SEND_RUN_STALE_SECONDS = 960  # A sending batch with no activity for this long (past the 15 minute Lambda limit) has died
+SES_RATE_BUDGET_TABLE = os.environ.get('SES_RATE_BUDGET_TABLE', '')  # Partition key 'budget_window' (S), TTL on expires_at
+
+# Initialize AWS services (pooled clients, reused across warm invocations)
+dynamodb = get_resource('dynamodb')
+# For calls written with typed attribute values ({'S': ...}); the resource's own
+# client (dynamodb.meta.client) converts plain Python values and would re-wrap them
+dynamodb_client = get_client('dynamodb')
+# One pooled connection per send worker; EmailDispatcher does its own retries with
+# backoff and rate adaptation, so botocore must not retry throttled sends as well
+ses = get_client('ses', max_pool_connections=SEND_WORKERS + 5, max_attempts=1,
+                 endpoint_url=os.environ.get('SES_ENDPOINT_URL') or None)
+lambda_client = get_client('lambda')
+s3 = get_client('s3')
 
 def cors_response(status_code, body):
     """Standard CORS response"""
@@ -58,10 +158,9 @@ def get_template_components():
     """Get template components from database"""
     try:
         table = dynamodb.Table('template_components')
-        response = table.scan()
         
         components = {}
-        for item in response.get('Items', []):
+        for item in scan_items(table):
             components[item['component_id']] = item
         
         return components
@@ -81,27 +180,212 @@ def generate_email_html_from_template_instance(record, campaign_id):
             logger.warning(f"No template instance found for campaign {campaign_id}, using fallback method")
             return generate_email_html_fallback(record, campaign_id)
         
-        template_instance = response['Item']
-
-        # Use raw template with placeholders for personalization
-        template_html_raw = template_instance.get('template_html_raw', '')
-        template_config = template_instance.get('template_config', {})
-
-        # If raw template doesn't exist (old template), use rendered one
-        if not template_html_raw:
-            template_html_raw = template_instance.get('template_html', '')
-            logger.warning("Using old template format without raw template")
-
         # Personalize email using shared logic (same as preview endpoint)
-        personalized_html = generate_personalized_email_for_recipient(template_html_raw, template_config, record)
-
-        return personalized_html
+        return compile_template_instance(response['Item']).render_for_recipient(record)
         
     except Exception as e:
         logger.error(f"Error generating email from template instance: {e}")
         # Fallback to old method
         return generate_email_html_fallback(record, campaign_id)
 
+def compile_template_instance(template_instance):
+    """Compile a campaign_template_instances item for repeated per-recipient rendering"""
+    # Use raw template with placeholders for personalization
+    template_html_raw = template_instance.get('template_html_raw', '')
+    template_config = template_instance.get('template_config', {})
+
+    # If raw template doesn't exist (old template), use rendered one
+    if not template_html_raw:
+        template_html_raw = template_instance.get('template_html', '')
+        logger.warning("Using old template format without raw template")
+
+    return CompiledEmailTemplate(template_html_raw, template_config)
+
+class CompiledEmailTemplate:
+    """
+    Email template parsed once per batch into literal segments and placeholder slots
+
+    Static template_config values are applied at compile time, so rendering a
+    recipient is a single join over the segments instead of a full-document
+    str.replace pass per placeholder.
+
+    Everything but the greeting depends only on SCHOOL_FRAGMENT_FIELDS, so each
+    distinct school/product combination is rendered once into a document split
+    at {{GREETING_TEXT}}, and a recipient only splices in their greeting. Those
+    documents can also be rendered ahead of time (prerender_batch) and loaded
+    with use_prerendered().
+
+    Slot values may contain later placeholders themselves (a config greeting like
+    'Hey {{TEAM_NAME}} fan,'); they are filled once per school document, as the
+    original one-placeholder-at-a-time str.replace renderer did.
+    """
+
+    def __init__(self, template_html_raw, template_config):
+        self.template_html_raw = template_html_raw
+        self.template_config = template_config
+        self.digest = content_hash({'html': template_html_raw, 'config': template_config})
+        self._fragments = collections.OrderedDict()
+        self._prerendered = {}
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+        self.prerendered_hits = 0
+
+        # Step 1: Apply base template config (AI-generated titles, descriptions, etc.)
+        # but SKIP fields that need per-recipient personalization. Config values may
+        # contain {{TEAM_NAME}} etc., so this runs before the template is split.
+        static_html = template_html_raw
+        for key, value in template_config.items():
+            if key not in PERSONALIZED_CONFIG_KEYS:
+                static_html = static_html.replace('{{' + key + '}}', str(value))
+
+        # split() with one capture group alternates literal, slot name, literal, ...
+        parts = RECIPIENT_PLACEHOLDER_PATTERN.split(static_html)
+        self.literals = parts[0::2]
+        self.slots = parts[1::2]
+
+    def render(self, values):
+        """Join literal segments with slot values; slots without a value keep their placeholder"""
+        literals = self.literals
+        output = [literals[0]]
+        for index, slot in enumerate(self.slots, start=1):
+            output.append(values.get(slot, '{{' + slot + '}}'))
+            output.append(literals[index])
+        return ''.join(output)
+
+    @staticmethod
+    def _fragment_key(recipient):
+        return tuple((field, recipient[field]) for field in SCHOOL_FRAGMENT_FIELDS if field in recipient)
+
+    def fragment_digest(self, recipient):
+        """Stable id of the recipient's school document, used in pre-render manifests"""
+        return content_hash(self._fragment_key(recipient))
+
+    def _school_fragment(self, recipient):
+        """
+        Return (school_values, document_parts) for the recipient's school and products
+
+        document_parts is the template with every slot except GREETING_TEXT filled,
+        split at the GREETING_TEXT slots.
+        """
+        key = self._fragment_key(recipient)
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+            self.fragment_hits += 1
+            return fragment
+
+        self.fragment_misses += 1
+        fragment = self._prerendered.get(content_hash(key)) if self._prerendered else None
+        if fragment is not None:
+            self.prerendered_hits += 1
+        else:
+            fragment = self.render_fragment(recipient)
+
+        self._fragments[key] = fragment
+        if len(self._fragments) > FRAGMENT_CACHE_SIZE:
+            self._fragments.popitem(last=False)
+        return fragment
+
+    def render_fragment(self, recipient):
+        """
+        Render the recipient's school document, returning (school_values, document_parts)
+
+        school_values includes the no-name GREETING_TEXT fallback, with its placeholders filled.
+        """
+        values = resolve_placeholder_values(build_school_placeholder_values(self.template_config, recipient))
+        values['GREETING_TEXT'] = fill_later_placeholders(
+            'GREETING_TEXT', build_greeting_text(self.template_config, {}), values
+        )
+
+        parts = []
+        current = [self.literals[0]]
+        for index, slot in enumerate(self.slots, start=1):
+            if slot == 'GREETING_TEXT':
+                parts.append(''.join(current))
+                current = []
+            else:
+                current.append(values.get(slot, '{{' + slot + '}}'))
+            current.append(self.literals[index])
+        parts.append(''.join(current))
+        return values, parts
+
+    def use_prerendered(self, store, documents):
+        """
+        Load pre-rendered school documents so they are used instead of rendering
+
+        Args:
+            store: document store the documents were saved to
+            documents: manifest mapping of fragment digest -> document hash
+        """
+        def load(item):
+            fragment_digest, document_hash = item
+            return fragment_digest, get_document(store, document_hash)
+
+        with ThreadPoolExecutor(max_workers=PRERENDER_IO_WORKERS) as executor:
+            for fragment_digest, document in executor.map(load, documents.items()):
+                if document is None:
+                    logger.warning(f"Pre-rendered document missing for fragment {fragment_digest}, it will be rendered at send time")
+                    continue
+                self._prerendered[fragment_digest] = (document['values'], document['parts'])
+
+        logger.info(f"Loaded {len(self._prerendered)} pre-rendered school documents")
+
+    def fragment_cache_stats(self):
+        """Return school document cache hits/misses for batch stats"""
+        return {
+            'documents': len(self._fragments),
+            'hits': self.fragment_hits,
+            'misses': self.fragment_misses,
+            'prerendered_hits': self.prerendered_hits
+        }
+
+    def values_for_recipient(self, recipient):
+        """Return the placeholder values for a recipient, or None if personalization failed"""
+        try:
+            school_values, _ = self._school_fragment(recipient)
+            values = dict(school_values)
+            values['GREETING_TEXT'] = self.greeting_for_recipient(recipient, school_values)
+            return values
+        except Exception as e:
+            logger.error(f"Error generating personalized email: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return None
+
+    def greeting_for_recipient(self, recipient, school_values):
+        """Return the recipient's GREETING_TEXT, reusing the school document's filled fallback when they have no name"""
+        if not (recipient.get('recipient_name') or recipient.get('customer_name')) and 'GREETING_TEXT' in school_values:
+            return school_values['GREETING_TEXT']
+        return fill_later_placeholders('GREETING_TEXT', build_greeting_text(self.template_config, recipient), school_values)
+
+    def render_for_recipient(self, recipient):
+        """Render personalized HTML for a recipient, falling back to the raw template on error"""
+        try:
+            school_values, parts = self._school_fragment(recipient)
+            return self.greeting_for_recipient(recipient, school_values).join(parts)
+        except Exception as e:
+            logger.error(f"Error generating personalized email: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return self.template_html_raw
+
+    def ses_template_html(self):
+        """
+        Return the template as SES (Handlebars) HTML
+
+        Each slot becomes a triple-stash {{{NAME}}} so values are inserted unescaped,
+        exactly like render(). Any other '{{' left in the literal segments is routed
+        through a placeholder so SES doesn't treat it as a variable.
+        """
+        literals = [
+            literal.replace('{{', '{{{' + SES_OPEN_BRACES_PLACEHOLDER + '}}}') for literal in self.literals
+        ]
+        output = [literals[0]]
+        for index, slot in enumerate(self.slots, start=1):
+            output.append('{{{' + slot + '}}}')
+            output.append(literals[index])
+        return ''.join(output)
+
 def generate_personalized_email_for_recipient(template_html_raw, template_config, recipient):
     """
     Generate personalized HTML email for a recipient
@@ -112,130 +396,145 @@ def generate_personalized_email_for_recipient(template_html_raw, template_config
         recipient: Recipient data with products, school info, etc.
     """
     try:
-        # Start with raw template
-        personalized_html = template_html_raw
+        return CompiledEmailTemplate(template_html_raw, template_config).render_for_recipient(recipient)
 
-        # Step 1: Apply base template config (AI-generated titles, descriptions, etc.)
-        # but SKIP fields that need per-recipient personalization
-        # IMPORTANT: We skip DESCRIPTION_TEXT because it should be personalized per recipient
-        for key, value in template_config.items():
-            if key not in ['PRODUCTS_HTML', 'GREETING_TEXT', 'PRODUCTS_TITLE', 'PRODUCTS_SUBTITLE', 'DESCRIPTION_TEXT']:  # Skip - we'll personalize these
-                placeholder = '{{' + key + '}}'
-                personalized_html = personalized_html.replace(placeholder, str(value))
-
-        # Step 2: Personalize greeting with recipient name
-        recipient_name = recipient.get('recipient_name', '') or recipient.get('customer_name', '')
-        if recipient_name:
-            greeting = f"Hi {recipient_name},"
-        else:
-            # Fallback to AI-generated or default greeting if no name
-            greeting = template_config.get('GREETING_TEXT', 'Hi there,')
-        personalized_html = personalized_html.replace('{{GREETING_TEXT}}', greeting)
+    except Exception as e:
+        logger.error(f"Error generating personalized email: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return template_html_raw
 
-        # Step 3: Get school/team information
-        school_code = recipient.get('school_code', '')
-        team_name = get_school_name_from_code(school_code) if school_code else ''
+def build_recipient_placeholder_values(template_config, recipient):
+    """
+    Build the per-recipient placeholder values for a compiled template
 
-        logger.info(f"Personalizing for school_code={school_code}, team_name={team_name}")
+    Args:
+        template_config: Base config from template instance (AI-generated or default)
+        recipient: Recipient data with products, school info, etc.
 
-        # CRITICAL: Replace {{TEAM_NAME}} placeholder globally in the entire HTML
-        # This handles AI-generated content that uses {{TEAM_NAME}} in MAIN_TITLE, DESCRIPTION_TEXT, etc.
-        if team_name and team_name != school_code:
-            personalized_html = personalized_html.replace('{{TEAM_NAME}}', team_name)
-        elif school_code:
-            personalized_html = personalized_html.replace('{{TEAM_NAME}}', school_code)
-        else:
-            personalized_html = personalized_html.replace('{{TEAM_NAME}}', 'Your Team')
-
-        # Update products title with school name (ALWAYS replace, even if no team_name)
-        if team_name and team_name != school_code:
-            products_title = f"Featured {team_name} Collection"
-        elif school_code:
-            # Fallback: still use school code if lookup failed, but mark it clearly
-            products_title = f"Featured {school_code} Collection"
-        else:
-            products_title = "Featured Collection"
-        personalized_html = personalized_html.replace('{{PRODUCTS_TITLE}}', products_title)
+    Returns:
+        dict: placeholder name -> value. Placeholders left out keep their {{NAME}} text.
+    """
+    values = resolve_placeholder_values(build_school_placeholder_values(template_config, recipient))
+    values['GREETING_TEXT'] = fill_later_placeholders('GREETING_TEXT', build_greeting_text(template_config, recipient), values)
+    return values
 
-        # Also replace PRODUCTS_SUBTITLE with school-specific text
-        if team_name and team_name != school_code:
-            products_subtitle = f"Show your {team_name} pride with these exclusive items!"
-        else:
-            products_subtitle = template_config.get('PRODUCTS_SUBTITLE', 'We\'ve selected these exclusive items just for you!')
-        personalized_html = personalized_html.replace('{{PRODUCTS_SUBTITLE}}', products_subtitle)
-
-        # Step 3b: Personalize DESCRIPTION_TEXT for this recipient's school ONLY
-        # CRITICAL: Each recipient sees ONLY their school, not multiple schools
-        if team_name and team_name != school_code:
-            # Use full school name
-            description = f"Discover exclusive {team_name} gear designed for true fans! Show your school pride with our personalized collection. Get yours today and represent your team!"
-        elif school_code:
-            # Fallback to school code if name lookup failed
-            description = f"Discover exclusive {school_code} gear designed for true fans! Show your school pride with our personalized collection. Get yours today and represent your team!"
-        else:
-            # Generic fallback
-            description = template_config.get('DESCRIPTION_TEXT', 'Discover something special just for you!')
-        personalized_html = personalized_html.replace('{{DESCRIPTION_TEXT}}', description)
+def resolve_placeholder_values(values):
+    """
+    Fill the placeholders that appear inside placeholder values
 
-        # Step 4: Generate recipient-specific products HTML
-        product_count = sum(1 for i in range(1, 5) if recipient.get(f'product_image_{i}'))
-        products_html = generate_products_html(recipient, product_count, team_name or school_code)
-        personalized_html = personalized_html.replace('{{PRODUCTS_HTML}}', products_html)
+    The original renderer replaced one placeholder at a time over the whole HTML, in
+    RECIPIENT_PLACEHOLDERS order, so a value picked up every placeholder replaced
+    after it (but not those replaced before). Resolving from the last slot backwards
+    gives each value the finished values of the slots after it.
+    """
+    resolved = {}
+    for slot in reversed(RECIPIENT_PLACEHOLDERS):
+        if slot in values:
+            resolved[slot] = fill_later_placeholders(slot, values[slot], resolved)
+    return resolved
+
+def fill_later_placeholders(slot, text, values):
+    """Replace placeholders in slot's value text that come after slot in RECIPIENT_PLACEHOLDERS"""
+    if '{{' not in text:
+        return text
+    position = RECIPIENT_PLACEHOLDER_ORDER[slot]
+
+    def replace(match):
+        name = match.group(1)
+        if RECIPIENT_PLACEHOLDER_ORDER[name] > position and name in values:
+            return values[name]
+        return match.group(0)
+
+    return RECIPIENT_PLACEHOLDER_PATTERN.sub(replace, text)
+
+def build_greeting_text(template_config, recipient):
+    """Build the GREETING_TEXT value, the only placeholder that depends on the recipient's name"""
+    # Step 2: Personalize greeting with recipient name
+    recipient_name = recipient.get('recipient_name', '') or recipient.get('customer_name', '')
+    if recipient_name:
+        return f"Hi {recipient_name},"
+    # Fallback to AI-generated or default greeting if no name
+    return template_config.get('GREETING_TEXT', 'Hi there,')
+
+def build_school_placeholder_values(template_config, recipient):
+    """
+    Build the placeholder values that depend only on SCHOOL_FRAGMENT_FIELDS
 
-        # Step 5: School-specific links
-        school_page = recipient.get('school_page', template_config.get('CTA_PRIMARY_LINK', '#'))
-        personalized_html = personalized_html.replace('{{HERO_LINK}}', school_page)
-        personalized_html = personalized_html.replace('{{CTA_LINK}}', school_page)
-        personalized_html = personalized_html.replace('{{SCHOOL_PAGE}}', school_page)
-        personalized_html = personalized_html.replace('{{CTA_SECONDARY_LINK}}', school_page)
+    Everything except GREETING_TEXT: team name, school-specific copy, products HTML,
+    links and hero image.
+    """
+    values = {}
 
-        # Step 6: Replace hero image if school logo is available
-        school_logo = recipient.get('school_logo', '')
-        if school_logo:
-            personalized_html = personalized_html.replace('{{HERO_IMAGE_URL}}', school_logo)
+    # Step 3: Get school/team information
+    school_code = recipient.get('school_code', '')
+    team_name = get_school_name_from_code(school_code) if school_code else ''
 
-        return personalized_html
+    logger.info(f"Personalizing for school_code={school_code}, team_name={team_name}")
 
-    except Exception as e:
-        logger.error(f"Error generating personalized email: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-        return template_html_raw
+    # CRITICAL: {{TEAM_NAME}} is replaced globally in the entire HTML
+    # This handles AI-generated content that uses {{TEAM_NAME}} in MAIN_TITLE, DESCRIPTION_TEXT, etc.
+    if team_name and team_name != school_code:
+        values['TEAM_NAME'] = team_name
+    elif school_code:
+        values['TEAM_NAME'] = school_code
+    else:
+        values['TEAM_NAME'] = 'Your Team'
+
+    # Update products title with school name (ALWAYS replace, even if no team_name)
+    if team_name and team_name != school_code:
+        values['PRODUCTS_TITLE'] = f"Featured {team_name} Collection"
+    elif school_code:
+        # Fallback: still use school code if lookup failed, but mark it clearly
+        values['PRODUCTS_TITLE'] = f"Featured {school_code} Collection"
+    else:
+        values['PRODUCTS_TITLE'] = "Featured Collection"
 
-def get_school_name_from_code(school_code):
-    """Get school name from school code using college-db-email table
+    # Also replace PRODUCTS_SUBTITLE with school-specific text
+    if team_name and team_name != school_code:
+        values['PRODUCTS_SUBTITLE'] = f"Show your {team_name} pride with these exclusive items!"
+    else:
+        values['PRODUCTS_SUBTITLE'] = template_config.get('PRODUCTS_SUBTITLE', 'We\'ve selected these exclusive items just for you!')
+
+    # Step 3b: Personalize DESCRIPTION_TEXT for this recipient's school ONLY
+    # CRITICAL: Each recipient sees ONLY their school, not multiple schools
+    if team_name and team_name != school_code:
+        # Use full school name
+        values['DESCRIPTION_TEXT'] = f"Discover exclusive {team_name} gear designed for true fans! Show your school pride with our personalized collection. Get yours today and represent your team!"
+    elif school_code:
+        # Fallback to school code if name lookup failed
+        values['DESCRIPTION_TEXT'] = f"Discover exclusive {school_code} gear designed for true fans! Show your school pride with our personalized collection. Get yours today and represent your team!"
+    else:
+        # Generic fallback
+        values['DESCRIPTION_TEXT'] = template_config.get('DESCRIPTION_TEXT', 'Discover something special just for you!')
 
-    NOTE: The college-db-email table has partition key 'school_name' (the full name),
-    and 'school_code' (e.g., 'AKN') is just an attribute. We must scan the table
-    to find the school by code. This is efficient since table has <200 records.
-    """
-    try:
-        if not school_code:
-            logger.warning("get_school_name_from_code called with empty school_code")
-            return school_code
+    # Step 4: Generate recipient-specific products HTML
+    product_count = sum(1 for i in range(1, 5) if recipient.get(f'product_image_{i}'))
+    values['PRODUCTS_HTML'] = generate_products_html(recipient, product_count, team_name or school_code)
 
-        college_db_table = dynamodb.Table('college-db-email')
-        logger.info(f"Scanning college-db-email table for school_code='{school_code}'")
+    # Step 5: School-specific links
+    school_page = recipient.get('school_page', template_config.get('CTA_PRIMARY_LINK', '#'))
+    values['HERO_LINK'] = school_page
+    values['CTA_LINK'] = school_page
+    values['SCHOOL_PAGE'] = school_page
+    values['CTA_SECONDARY_LINK'] = school_page
 
-        # Must use scan() since school_code is an attribute, not the partition key
-        response = college_db_table.scan(
-            FilterExpression=Attr('school_code').eq(school_code)
-        )
+    # Step 6: Replace hero image if school logo is available
+    school_logo = recipient.get('school_logo', '')
+    if school_logo:
+        values['HERO_IMAGE_URL'] = school_logo
 
-        items = response.get('Items', [])
-        if items:
-            school_name = items[0].get('school_name', '')
-            logger.info(f"Found school entry: school_code='{school_code}', school_name='{school_name}'")
+    return values
 
-            # If school_name is empty or same as code, log warning
-            if not school_name or school_name == school_code:
-                logger.warning(f"School entry exists but school_name is empty or equals code: school_code='{school_code}', school_name='{school_name}'")
-                return school_code
+def get_school_name_from_code(school_code):
+    """Get school name from school code using the cached college-db-email directory
 
-            return school_name
-        else:
-            logger.warning(f"No entry found in college-db-email for school_code='{school_code}'")
-            return school_code
+    NOTE: The college-db-email table has partition key 'school_name' (the full name),
+    and 'school_code' (e.g., 'AKN') is just an attribute. The shared SchoolDirectory
+    scans the table once and indexes it by code, instead of one scan per lookup.
+    """
+    try:
+        return get_school_directory(dynamodb, 'college-db-email').get_school_name(school_code)
 
     except Exception as e:
         logger.error(f"Error getting school name for code '{school_code}': {e}")
@@ -538,8 +837,32 @@ def generate_email_html(record, template_config, components):
         logger.error(f"Error generating email HTML: {e}")
         return ""
 
+class RetryableSendError(Exception):
+    """An SES send that may succeed if retried (throttling or a transient service error)"""
+
+    def __init__(self, code, message, throttled=False):
+        super().__init__(f"{code} - {message}")
+        self.code = code
+        self.throttled = throttled
+
+def classify_ses_error(error_code, error_message):
+    """Return a RetryableSendError for throttling/transient SES errors, or None if the error is permanent"""
+    # The daily quota is reported as Throttling too, but retrying won't help until tomorrow
+    if 'daily message quota' in (error_message or '').lower():
+        return None
+    if error_code in SES_THROTTLING_ERROR_CODES:
+        return RetryableSendError(error_code, error_message, throttled=True)
+    if error_code in SES_TRANSIENT_ERROR_CODES:
+        return RetryableSendError(error_code, error_message)
+    return None
+
 def send_email_ses(recipient, subject, html_body):
-    """Send email via AWS SES"""
+    """
+    Send email via AWS SES
+
+    Returns True/False, or raises RetryableSendError when SES throttled the request
+    or failed transiently, so the caller can back off and retry.
+    """
     try:
         response = ses.send_email(
             Source=SES_SENDER,
@@ -565,13 +888,806 @@ def send_email_ses(recipient, subject, html_body):
     except ClientError as e:
         error_code = e.response['Error']['Code']
         error_message = e.response['Error']['Message']
+        retryable = classify_ses_error(error_code, error_message)
+        if retryable:
+            raise retryable
         logger.error(f"SES Error sending to {recipient}: {error_code} - {error_message}")
         return False
+
+    except BotoCoreError as e:
+        # Connection errors and timeouts
+        raise RetryableSendError(type(e).__name__, str(e))
         
     except Exception as e:
         logger.error(f"Unexpected error sending to {recipient}: {str(e)}")
         return False
 
+class SesBulkTemplateSender:
+    """
+    Sends a compiled campaign template through SES SendBulkTemplatedEmail
+
+    The template is registered once under a name derived from the campaign id and
+    a hash of its HTML, so an edited template gets a new name and an unchanged one
+    is reused across batches. Per-recipient values travel as ReplacementTemplateData.
+    """
+
+    def __init__(self, campaign_id, compiled_template, client=None):
+        self.client = client or ses
+        self.slots = sorted(set(compiled_template.slots))
+        self.html_part = compiled_template.ses_template_html()
+
+        digest = hashlib.sha256(self.html_part.encode('utf-8')).hexdigest()[:16]
+        prefix = re.sub(r'[^A-Za-z0-9_-]', '-', f'campaign-{campaign_id}')[:47]
+        self.template_name = f'{prefix}-{digest}'
+
+        # Values shared by every destination
+        self.default_data = {}
+        if '{{{' + SES_OPEN_BRACES_PLACEHOLDER + '}}}' in self.html_part:
+            self.default_data[SES_OPEN_BRACES_PLACEHOLDER] = '{{'
+
+    def register(self):
+        """Create the SES template if it doesn't exist yet"""
+        try:
+            self.client.create_template(Template={
+                'TemplateName': self.template_name,
+                'SubjectPart': '{{{' + SES_SUBJECT_PLACEHOLDER + '}}}',
+                'HtmlPart': self.html_part
+            })
+            logger.info(f"Registered SES template {self.template_name}")
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'AlreadyExists':
+                raise
+            logger.info(f"Reusing SES template {self.template_name}")
+
+    def replacement_data(self, values, subject):
+        """Build a destination's replacement data; slots without a value keep their placeholder"""
+        data = {slot: values.get(slot, '{{' + slot + '}}') for slot in self.slots}
+        data[SES_SUBJECT_PLACEHOLDER] = subject
+        return data
+
+    def send(self, messages):
+        """
+        Send up to SES_BULK_MAX_DESTINATIONS messages in one call
+
+        Args:
+            messages: list of (recipient_email, replacement_data)
+
+        Returns:
+            list: per message, in order: True, False, or a RetryableSendError for
+            destinations SES throttled or failed transiently. Raises RetryableSendError
+            when the whole call was throttled.
+        """
+        try:
+            response = self.client.send_bulk_templated_email(
+                Source=SES_SENDER,
+                ReplyToAddresses=[SES_REPLY_TO],
+                Template=self.template_name,
+                DefaultTemplateData=json.dumps(self.default_data),
+                Destinations=[
+                    {
+                        'Destination': {'ToAddresses': [recipient]},
+                        'ReplacementTemplateData': json.dumps(data)
+                    }
+                    for recipient, data in messages
+                ]
+            )
+
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            error_message = e.response['Error']['Message']
+            retryable = classify_ses_error(error_code, error_message)
+            if retryable:
+                raise retryable
+            logger.error(f"SES Error sending bulk email to {len(messages)} recipients: {error_code} - {error_message}")
+            return [False] * len(messages)
+
+        except BotoCoreError as e:
+            raise RetryableSendError(type(e).__name__, str(e))
+
+        results = []
+        statuses = response.get('Status', [])
+        for index, (recipient, _) in enumerate(messages):
+            status = statuses[index] if index < len(statuses) else {}
+            if status.get('Status') == 'Success':
+                logger.info(f"Email sent successfully to {recipient}. MessageId: {status.get('MessageId')}")
+                results.append(True)
+            elif status.get('Status') in ('AccountThrottled', 'TransientFailure'):
+                results.append(RetryableSendError(status['Status'], status.get('Error', ''), throttled=status['Status'] == 'AccountThrottled'))
+            else:
+                logger.error(f"SES Error sending to {recipient}: {status.get('Status')} - {status.get('Error', '')}")
+                results.append(False)
+        return results
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter
+
+    Each acquire() reserves a token immediately (the balance may go negative) and
+    sleeps for exactly the time needed to pay that reservation back, so callers
+    on many threads are spaced at 1/rate seconds without polling.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def set_rate(self, rate):
+        """Change the refill rate; tokens accrued so far are kept"""
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = float(rate)
+
+    def acquire(self, tokens=1):
+        """Take tokens, blocking until they are available. Returns seconds waited."""
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= tokens
+            wait_seconds = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait_seconds > 0:
+            self._sleep(wait_seconds)
+        return wait_seconds
+
+class DynamoRateBudget:
+    """
+    Send rate budget shared by every sender invocation through a DynamoDB counter
+
+    Time is cut into short windows (about a quarter second) that each allow a whole
+    number of tokens at the configured rate. acquire() atomically adds its tokens to
+    the current window's counter on condition that it stays within that allowance,
+    and waits for the next window when the current one is full, so any number of
+    concurrent Lambdas together stay under the SES quota without bursting.
+    """
+
+    def __init__(self, table_name, rate, budget_id='ses', clock=time.time, sleep=time.sleep):
+        self.table = dynamodb.Table(table_name)
+        self.rate = float(rate)
+        self.budget_id = budget_id
+        self._clock = clock
+        self._sleep = sleep
+
+        # Window length is fixed by the configured rate, so invocations that lowered
+        # their own rate with set_rate() still count against the same windows
+        self.window_seconds = max(1, int(self.rate * 0.25)) / self.rate
+
+    def set_rate(self, rate):
+        """Change the tokens this invocation may use per window (never more than configured)"""
+        self.rate = float(rate)
+
+    def acquire(self, tokens=1):
+        """Take tokens from the shared budget, blocking until they fit. Returns seconds waited."""
+        waited = 0.0
+        remaining = tokens
+        while remaining > 0:
+            window_seconds = self.window_seconds
+            per_window = max(1, int(round(self.rate * window_seconds)))
+
+            # A request larger than one window (e.g. a 50-recipient bulk call) spans several
+            take = min(remaining, per_window)
+            now = self._clock()
+            window = int(now / window_seconds)
+
+            try:
+                self.table.update_item(
+                    Key={'budget_window': f"{self.budget_id}#{window}"},
+                    UpdateExpression='ADD used :tokens SET expires_at = if_not_exists(expires_at, :expires)',
+                    ConditionExpression='attribute_not_exists(used) OR used <= :max_used',
+                    ExpressionAttributeValues={
+                        ':tokens': take,
+                        ':max_used': per_window - take,
+                        ':expires': int(now) + 3600
+                    }
+                )
+                remaining -= take
+                continue
+
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    # Don't stop sending because the budget table is unavailable; pace locally instead
+                    logger.error(f"Error reading send rate budget, pacing locally: {e}")
+                    pause = take / self.rate
+                    remaining -= take
+                else:
+                    # Window is full; retry just after it rolls over (jittered so workers don't collide)
+                    pause = (window + 1) * window_seconds - now + random.uniform(0, window_seconds * 0.1)
+
+            self._sleep(pause)
+            waited += pause
+
+        return waited
+
+class AdaptiveSendRate:
+    """
+    AIMD controller for a rate limiter's send rate
+
+    Throttling multiplies the rate by SES_RATE_DECREASE_FACTOR (once per cooldown,
+    since requests already in flight get throttled too). Each successful message
+    adds a little back, so clean sending regains SES_RATE_RECOVERY_PER_SECOND of
+    max_rate every second until it is back at max_rate.
+    """
+
+    def __init__(self, limiter, max_rate, min_rate=SES_MIN_SEND_RATE, clock=time.monotonic):
+        self.limiter = limiter
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.lowest_rate = self.max_rate
+        self.decreases = 0
+        self._clock = clock
+        self._last_decrease = None
+        self._lock = threading.Lock()
+
+    def on_success(self, messages=1):
+        with self._lock:
+            if self.rate >= self.max_rate:
+                return
+            self.rate = min(self.max_rate, self.rate + messages * self.max_rate * SES_RATE_RECOVERY_PER_SECOND / self.rate)
+            rate = self.rate
+        self.limiter.set_rate(rate)
+
+    def on_throttle(self):
+        with self._lock:
+            now = self._clock()
+            if self._last_decrease is not None and now - self._last_decrease < SES_THROTTLE_COOLDOWN_SECONDS:
+                return
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate * SES_RATE_DECREASE_FACTOR)
+            self.lowest_rate = min(self.lowest_rate, self.rate)
+            self.decreases += 1
+            rate = self.rate
+        logger.warning(f"SES throttled sending, lowering send rate to {rate:.1f} emails/second")
+        self.limiter.set_rate(rate)
+
+class SendStats:
+    """Per-call timing stats collected by EmailDispatcher"""
+
+    def __init__(self):
+        self.send_seconds = []
+        self.wait_seconds = []
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record_retry(self, messages, throttled):
+        """Record messages that will be sent again after a retryable error"""
+        with self._lock:
+            self.retries += messages
+            if throttled:
+                self.throttled += messages
+
+    def record(self, send_seconds, wait_seconds, results):
+        """Record one SES call and its per-message results (list of True/False)"""
+        with self._lock:
+            self.send_seconds.append(send_seconds)
+            self.wait_seconds.append(wait_seconds)
+            sent = sum(1 for result in results if result)
+            self.sent += sent
+            self.failed += len(results) - sent
+
+    def summary(self):
+        """Return counts, throughput and SES call latency percentiles (milliseconds)"""
+        with self._lock:
+            latencies = sorted(self.send_seconds)
+            total_wait = sum(self.wait_seconds)
+            sent, failed = self.sent, self.failed
+            retries, throttled = self.retries, self.throttled
+        messages = sent + failed
+
+        elapsed = time.monotonic() - self.started_at
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            'messages': messages,
+            'api_calls': len(latencies),
+            'sent': sent,
+            'failed': failed,
+            'elapsed_seconds': round(elapsed, 2),
+            'messages_per_second': round(messages / elapsed, 2) if elapsed > 0 else 0.0,
+            'latency_ms_avg': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+            'latency_ms_p50': percentile(0.50),
+            'latency_ms_p95': percentile(0.95),
+            'latency_ms_max': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            'rate_limit_wait_seconds': round(total_wait, 2),
+            'retries': retries,
+            'throttled': throttled
+        }
+
+class EmailDispatcher:
+    """
+    Sends emails on a bounded thread pool, paced by a shared token bucket
+
+    Rendering and result handling (DynamoDB updates etc.) stay on the calling
+    thread; only the SES round-trips run on the workers. Messages are handed to
+    the workers in chunks of chunk_size (one per SendEmail call here).
+    """
+
+    chunk_size = 1
+
+    def __init__(self, send_fn=None, rate=None, workers=None, rate_limiter=None, sleep=time.sleep):
+        self.send_fn = send_fn or send_email_ses
+        rate = rate or EMAILS_PER_SECOND
+        self.rate_limiter = rate_limiter or TokenBucket(rate)
+        self.rate_control = AdaptiveSendRate(self.rate_limiter, getattr(self.rate_limiter, 'rate', rate))
+        self.workers = max(1, workers or SEND_WORKERS)
+        self.stats = SendStats()
+        self._sleep = sleep
+
+    def _deliver(self, chunk):
+        """
+        Send a chunk of (record, subject, body) messages
+
+        Returns True, False or a RetryableSendError per message.
+        """
+        results = []
+        for record, subject, html_body in chunk:
+            try:
+                results.append(bool(self.send_fn(record['customer_email'], subject, html_body)))
+            except RetryableSendError as e:
+                results.append(e)
+        return results
+
+    def _send(self, chunk):
+        """Send a chunk, retrying throttled/transient failures with jittered exponential backoff"""
+        results = [False] * len(chunk)
+        pending = list(range(len(chunk)))
+
+        for attempt in range(1, SES_MAX_SEND_ATTEMPTS + 1):
+            # The SES send rate is counted in recipients, not API calls
+            wait_seconds = self.rate_limiter.acquire(len(pending))
+            started = time.monotonic()
+            try:
+                outcomes = self._deliver([chunk[index] for index in pending])
+            except RetryableSendError as e:
+                outcomes = [e] * len(pending)
+            except Exception as e:
+                logger.error(f"Unexpected error sending to {', '.join(chunk[index][0]['customer_email'] for index in pending)}: {str(e)}")
+                outcomes = [False] * len(pending)
+            elapsed = time.monotonic() - started
+
+            retry = []
+            errors = []
+            for index, outcome in zip(pending, outcomes):
+                if not isinstance(outcome, RetryableSendError):
+                    results[index] = outcome
+                elif attempt < SES_MAX_SEND_ATTEMPTS:
+                    retry.append(index)
+                    errors.append(outcome)
+                else:
+                    logger.error(f"SES Error sending to {chunk[index][0]['customer_email']} after {attempt} attempts: {outcome}")
+                    results[index] = False
+
+            self.stats.record(elapsed, wait_seconds, [results[index] for index in pending if index not in retry])
+
+            throttled = any(isinstance(outcome, RetryableSendError) and outcome.throttled for outcome in outcomes)
+            if throttled:
+                self.rate_control.on_throttle()
+            elif not any(isinstance(outcome, RetryableSendError) for outcome in outcomes):
+                self.rate_control.on_success(len(pending))
+
+            if not retry:
+                break
+
+            # Full jitter keeps workers that were throttled together from retrying together
+            backoff = random.uniform(0, min(SES_RETRY_MAX_SECONDS, SES_RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+            logger.warning(f"Retrying {len(retry)} emails in {backoff:.2f}s after {errors[0]} (attempt {attempt})")
+            self.stats.record_retry(len(retry), throttled)
+            self._sleep(backoff)
+            pending = retry
+
+        return results
+
+    def run(self, messages, on_result, should_stop=None):
+        """
+        Send messages until exhausted or should_stop() returns True
+
+        Args:
+            messages: iterable of (record, subject, body), consumed lazily
+            on_result: callback(record, sent) invoked on the calling thread
+            should_stop: optional callable checked before each new message
+
+        Returns:
+            bool: True if every message was dispatched, False if stopped early
+        """
+        max_in_flight = self.workers * 2
+        completed = True
+        in_flight = {}
+        chunk = []
+
+        def collect(futures):
+            for future in futures:
+                records = in_flight.pop(future)
+                for record, sent in zip(records, future.result()):
+                    on_result(record, sent)
+
+        def submit(executor, chunk):
+            # Keep the pool busy without rendering the whole batch up front
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                collect(done)
+
+            future = executor.submit(self._send, chunk)
+            in_flight[future] = [record for record, _, _ in chunk]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            message_iter = iter(messages)
+            while True:
+                if should_stop and should_stop():
+                    completed = False
+                    break
+
+                message = next(message_iter, None)
+                if message is None:
+                    break
+
+                chunk.append(message)
+                if len(chunk) >= self.chunk_size:
+                    submit(executor, chunk)
+                    chunk = []
+
+            # Messages already rendered are sent even when stopping early, so the
+            # checkpoint never has to skip over them
+            if chunk:
+                submit(executor, chunk)
+
+            # Drain everything already handed to SES
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                collect(done)
+
+        return completed
+
+class BulkTemplateDispatcher(EmailDispatcher):
+    """EmailDispatcher that sends up to 50 recipients per SendBulkTemplatedEmail call"""
+
+    chunk_size = SES_BULK_MAX_DESTINATIONS
+
+    def __init__(self, template_sender, rate=None, workers=None, rate_limiter=None, sleep=time.sleep):
+        super().__init__(rate=rate, workers=workers, rate_limiter=rate_limiter, sleep=sleep)
+        self.template_sender = template_sender
+
+    def _deliver(self, chunk):
+        """Send a chunk of (record, subject, replacement_data) messages in one bulk call"""
+        return self.template_sender.send([(record['customer_email'], data) for record, _, data in chunk])
+
+class SentStatusBuffer:
+    """
+    Write-behind buffer for campaign_data delivery status (email_sent / sent_at)
+
+    Sent records are collected and flushed as PartiQL UPDATE statements through
+    BatchExecuteStatement, up to 25 per request, when the buffer is full or its
+    oldest entry is STATUS_FLUSH_MAX_SECONDS old. Statements that keep failing,
+    or a missing PartiQL permission, fall back to one update_item per record.
+    Use it as a context manager so pending statuses are flushed on exceptions too.
+    """
+
+    def __init__(self, table_name='campaign_data', max_items=STATUS_FLUSH_MAX_ITEMS, max_seconds=STATUS_FLUSH_MAX_SECONDS, client=None, sleep=time.sleep):
+        self.table_name = table_name
+        self.max_items = min(max_items, 25)
+        self.max_seconds = max_seconds
+        self.client = client or dynamodb_client
+        self.sleep = sleep
+        self._pending = []
+        self._oldest_at = None
+        self.records_written = 0
+        self.records_failed = 0
+        self.flush_seconds = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.flush()
+        return False
+
+    def mark_sent(self, record):
+        """Queue a record as sent; flushes when a size or time threshold is hit"""
+        if not self._pending:
+            self._oldest_at = time.monotonic()
+        self._pending.append((record['campaign_id'], record['record_id'], datetime.now().isoformat()))
+        if len(self._pending) >= self.max_items:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if self._pending and time.monotonic() - self._oldest_at >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        """Write every pending status"""
+        while self._pending:
+            chunk = self._pending[:self.max_items]
+            del self._pending[:self.max_items]
+            started = time.monotonic()
+            self._write_chunk(chunk)
+            self.flush_seconds.append(time.monotonic() - started)
+        self._oldest_at = None
+
+    def _write_chunk(self, chunk):
+        statement = f'UPDATE "{self.table_name}" SET email_sent=? SET sent_at=? WHERE campaign_id=? AND record_id=?'
+        remaining = chunk
+
+        for attempt in range(STATUS_FLUSH_MAX_ATTEMPTS):
+            try:
+                response = self.client.batch_execute_statement(Statements=[
+                    {
+                        'Statement': statement,
+                        'Parameters': [{'BOOL': True}, {'S': sent_at}, {'S': campaign_id}, {'S': record_id}]
+                    }
+                    for campaign_id, record_id, sent_at in remaining
+                ])
+                results = response.get('Responses', [])
+                failed = [entry for entry, result in zip(remaining, results) if 'Error' in result]
+                self.records_written += len(remaining) - len(failed)
+                remaining = failed
+            except ClientError as e:
+                error_code = e.response['Error']['Code']
+                logger.warning(f"BatchExecuteStatement failed for {len(remaining)} statuses: {error_code}")
+                if error_code == 'AccessDeniedException':
+                    break
+            except Exception as e:
+                logger.warning(f"BatchExecuteStatement failed for {len(remaining)} statuses: {e}")
+
+            if not remaining:
+                return
+            self.sleep(0.05 * (2 ** attempt))
+
+        # Last resort: individual updates so no sent record is lost
+        table = dynamodb.Table(self.table_name)
+        for campaign_id, record_id, sent_at in remaining:
+            try:
+                table.update_item(
+                    Key={'campaign_id': campaign_id, 'record_id': record_id},
+                    UpdateExpression='SET email_sent = :sent, sent_at = :sent_at',
+                    ExpressionAttributeValues={':sent': True, ':sent_at': sent_at}
+                )
+                self.records_written += 1
+            except Exception as e:
+                self.records_failed += 1
+                logger.error(f"Error marking record {record_id} as sent: {e}")
+
+    def summary(self):
+        """Return write counts and flush latency (milliseconds)"""
+        flushes = self.flush_seconds
+        return {
+            'records_written': self.records_written,
+            'records_failed': self.records_failed,
+            'flushes': len(flushes),
+            'flush_ms_avg': round(sum(flushes) / len(flushes) * 1000, 1) if flushes else 0.0,
+            'flush_ms_max': round(max(flushes) * 1000, 1) if flushes else 0.0
+        }
+
+def iter_unsent_recipients(campaign_id, batch_number, page_size=RECIPIENT_PAGE_SIZE, resume_key=None):
+    """
+    Stream unsent campaign_data records for a batch from the BatchIndex GSI
+
+    Follows LastEvaluatedKey until the batch is exhausted (the email_sent filter
+    means a page can hold far fewer matches than it reads, so a single query
+    silently truncates large batches). Only RECIPIENT_FIELDS are projected, and
+    the next page is fetched on a background thread while the current one is
+    being sent, so at most two pages are held in memory.
+
+    Uses the thread-safe low-level client (dynamodb_client) rather than the Table resource.
+
+    Args:
+        resume_key: checkpoint saved by a previous run (see BatchProgress); the
+            stream starts right after that record
+    """
+    client = dynamodb_client
+    deserializer = TypeDeserializer()
+
+    attribute_names = {f'#f{i}': field for i, field in enumerate(RECIPIENT_FIELDS)}
+    attribute_names.update({'#cid': 'campaign_id', '#bn': 'batch_number', '#sent': 'email_sent'})
+    query_kwargs = {
+        'TableName': 'campaign_data',
+        'IndexName': 'BatchIndex',
+        'KeyConditionExpression': '#cid = :cid AND #bn = :bn',
+        'FilterExpression': '#sent = :unsent',
+        'ProjectionExpression': ', '.join(f'#f{i}' for i in range(len(RECIPIENT_FIELDS))),
+        'ExpressionAttributeNames': attribute_names,
+        'ExpressionAttributeValues': {
+            ':cid': {'S': campaign_id},
+            ':bn': {'N': str(int(batch_number))},
+            ':unsent': {'BOOL': False}
+        },
+        'Limit': page_size
+    }
+    if resume_key:
+        query_kwargs['ExclusiveStartKey'] = {
+            'campaign_id': {'S': resume_key['campaign_id']},
+            'record_id': {'S': resume_key['record_id']},
+            'batch_number': {'N': str(int(resume_key['batch_number']))}
+        }
+
+    pages = 0
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        next_page = prefetcher.submit(client.query, **query_kwargs)
+        while next_page:
+            response = next_page.result()
+            pages += 1
+
+            # Start reading the next page before handing this one to the sender
+            last_key = response.get('LastEvaluatedKey')
+            next_page = prefetcher.submit(client.query, **dict(query_kwargs, ExclusiveStartKey=last_key)) if last_key else None
+
+            for item in response.get('Items', []):
+                yield {key: deserializer.deserialize(value) for key, value in item.items()}
+
+    logger.info(f"Read {pages} BatchIndex pages for campaign {campaign_id} batch {batch_number}")
+
+class BatchProgress:
+    """
+    Tracks the resume point of a batch send
+
+    Records finish out of order on the dispatcher, so the checkpoint only moves
+    past a record once it and every record streamed before it have a result
+    (sent, failed or skipped). Resuming after resume_key therefore never skips
+    a record that was not processed. Records without a batch_number (placeholder
+    test-send records) are counted but never become the resume point.
+    """
+
+    def __init__(self, resume_key=None):
+        self.resume_key = resume_key
+        self.processed = 0
+        self._pending = collections.deque()
+        self._finished = set()
+
+    def started(self, record):
+        key = None
+        if record.get('batch_number') is not None:
+            key = {
+                'campaign_id': record['campaign_id'],
+                'record_id': record['record_id'],
+                'batch_number': int(record['batch_number'])
+            }
+        self._pending.append((record['record_id'], key))
+
+    def finished(self, record):
+        self.processed += 1
+        self._finished.add(record['record_id'])
+        while self._pending and self._pending[0][0] in self._finished:
+            record_id, key = self._pending.popleft()
+            self._finished.discard(record_id)
+            if key is not None:
+                self.resume_key = key
+
+def invoke_self_async(payload):
+    """Invoke this function asynchronously with an action payload. Returns True if scheduled."""
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+    if not function_name:
+        return False
+
+    try:
+        lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps(payload).encode('utf-8')
+        )
+        return True
+
+    except Exception as e:
+        logger.error(f"Error invoking {payload.get('action')}: {e}")
+        return False
+
+def invoke_batch_resume(campaign_id, batch_number):
+    """Re-invoke this function asynchronously to continue a batch from its checkpoint"""
+    if not BATCH_AUTO_RESUME:
+        return False
+
+    scheduled = invoke_self_async({
+        'action': 'resume_batch',
+        'campaign_id': campaign_id,
+        'batch_number': int(batch_number)
+    })
+    if scheduled:
+        logger.info(f"Scheduled resume of campaign {campaign_id} batch {batch_number}")
+    return scheduled
+
+def prerender_batch(campaign_id, batch_number):
+    """
+    Render every distinct school document of a batch once and save it to PRERENDER_STORE
+
+    Documents are stored gzipped under their content hash; the batch's manifest maps
+    fragment digests to them and is recorded on the campaign_batches item, where
+    send_batch_emails picks it up.
+    """
+    store = get_document_store(PRERENDER_STORE, s3_client=s3)
+    if store is None:
+        raise Exception("PRERENDER_STORE is not configured")
+
+    template_instances_table = dynamodb.Table('campaign_template_instances')
+    template_response = template_instances_table.get_item(Key={'campaign_id': campaign_id})
+    if 'Item' not in template_response:
+        raise Exception(f"No template instance found for campaign {campaign_id}")
+
+    compiled_template = compile_template_instance(template_response['Item'])
+    started = time.monotonic()
+    recipients = 0
+    uploads = {}
+
+    # Render on this thread, upload on the pool
+    with ThreadPoolExecutor(max_workers=PRERENDER_IO_WORKERS) as executor:
+        for record in iter_unsent_recipients(campaign_id, batch_number):
+            recipients += 1
+            fragment_digest = compiled_template.fragment_digest(record)
+            if fragment_digest in uploads:
+                continue
+
+            values, parts = compiled_template.render_fragment(record)
+            uploads[fragment_digest] = executor.submit(put_document, store, {'values': values, 'parts': parts})
+
+        documents = {fragment_digest: future.result() for fragment_digest, future in uploads.items()}
+
+    manifest_name = put_manifest(store, campaign_id, batch_number, {
+        'campaign_id': campaign_id,
+        'batch_number': int(batch_number),
+        'template_digest': compiled_template.digest,
+        'created_at': datetime.now().isoformat(),
+        'documents': documents
+    })
+
+    batches_table = dynamodb.Table('campaign_batches')
+    batches_table.update_item(
+        Key={'campaign_id': campaign_id, 'batch_number': int(batch_number)},
+        UpdateExpression='SET prerender_manifest = :manifest, prerendered_at = :at, prerender_documents = :documents',
+        ExpressionAttributeValues={
+            ':manifest': manifest_name,
+            ':at': datetime.now().isoformat(),
+            ':documents': len(documents)
+        }
+    )
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Pre-rendered campaign {campaign_id} batch {batch_number}: {len(documents)} documents for {recipients} recipients in {elapsed:.1f}s")
+
+    return {
+        'campaign_id': campaign_id,
+        'batch_number': int(batch_number),
+        'recipients': recipients,
+        'documents': len(documents),
+        'manifest': manifest_name,
+        'elapsed_seconds': round(elapsed, 2)
+    }
+
+def load_prerendered_documents(compiled_template, manifest_name):
+    """Point a compiled template at a batch's pre-rendered documents if they match it"""
+    store = get_document_store(PRERENDER_STORE, s3_client=s3)
+    if store is None:
+        logger.warning(f"Batch has pre-render manifest {manifest_name} but PRERENDER_STORE is not configured")
+        return
+
+    try:
+        manifest = get_manifest(store, manifest_name)
+        if manifest is None:
+            logger.warning(f"Pre-render manifest {manifest_name} not found, rendering at send time")
+            return
+
+        # A template edited after the pre-render would send stale content
+        if manifest.get('template_digest') != compiled_template.digest:
+            logger.warning(f"Pre-render manifest {manifest_name} is for an older template version, rendering at send time")
+            return
+
+        compiled_template.use_prerendered(store, manifest.get('documents', {}))
+
+    except Exception as e:
+        logger.error(f"Error loading pre-rendered documents, rendering at send time: {e}")
+
 def get_products_for_test_user(campaign_id, school_code):
     """
     Get products for test user based on school code with fallback logic
@@ -585,7 +1701,6 @@ def get_products_for_test_user(campaign_id, school_code):
     """
     try:
         campaign_data_table = dynamodb.Table('campaign_data')
-        college_db_table = dynamodb.Table('college-db-email')
 
         # Fallback schools in order
         FALLBACK_SCHOOLS = [
@@ -614,16 +1729,10 @@ def get_products_for_test_user(campaign_id, school_code):
                 logger.info(f"TEST USER: ✓ SUCCESS: Found products for school {try_school} (preferred was: {school_code})")
                 recipient = items[0]
 
-                # Get school information from college-db-email
-                # IMPORTANT: Must use scan() since school_code is an attribute, not partition key
+                # Get school information from the cached college-db-email directory
                 try:
-                    school_response = college_db_table.scan(
-                        FilterExpression=Attr('school_code').eq(try_school),
-                        Limit=1
-                    )
-                    school_items = school_response.get('Items', [])
-                    if school_items:
-                        school_info = school_items[0]
+                    school_info = get_school_directory(dynamodb, 'college-db-email').get_school(try_school)
+                    if school_info:
                         recipient['school_name'] = school_info.get('school_name', try_school)
                         recipient['school_logo'] = school_info.get('school_logo', '')
                         recipient['school_page'] = school_info.get('school_page', '')
@@ -645,8 +1754,47 @@ def get_products_for_test_user(campaign_id, school_code):
         logger.error(f"Error getting products for test user: {e}")
         return None
 
-def send_batch_emails(campaign_id, batch_number, is_test=False):
-    """Send emails for a specific batch with safety checks"""
+def check_safety_checklist(campaign):
+    """Raise if the campaign's safety checklist doesn't allow a real send"""
+    safety_checklist = campaign.get('safety_checklist', {})
+    if safety_checklist:
+        # Check if all required items are completed
+        required_checks = ['test_emails_sent', 'preview_verified']
+        for check in required_checks:
+            if not safety_checklist.get(check, False):
+                raise Exception(f"Safety check failed: {check} must be completed before sending")
+
+    # Check if campaign is locked for editing
+    template_locked = campaign.get('template_locked', False)
+    if not template_locked:
+        logger.warning("Campaign template is not locked - proceeding anyway")
+
+def get_send_rate_limiter(campaign):
+    """
+    Return the rate limiter a batch send should draw from
+
+    With SES_RATE_BUDGET_TABLE every invocation shares one per-second budget. Without
+    it, a running campaign-wide send splits EMAILS_PER_SECOND evenly between its
+    concurrent batches so that together they stay within the SES quota.
+    """
+    if SES_RATE_BUDGET_TABLE:
+        return DynamoRateBudget(SES_RATE_BUDGET_TABLE, EMAILS_PER_SECOND)
+
+    concurrency = 1
+    if campaign.get('send_status') == 'sending':
+        concurrency = max(1, int(campaign.get('send_concurrency', 1)))
+    return TokenBucket(EMAILS_PER_SECOND / concurrency)
+
+def send_batch_emails(campaign_id, batch_number, is_test=False, rate_limiter=None):
+    """
+    Send emails for a specific batch with safety checks
+
+    Args:
+        rate_limiter: optional limiter with acquire(tokens) and set_rate(rate); defaults to get_send_rate_limiter()
+    """
+    # Clients outlive the invocation; count AWS call latency for this batch only
+    latency_stats.reset()
+
     try:
         # Get campaign info
         campaigns_table = dynamodb.Table('email_campaigns')
@@ -659,20 +1807,9 @@ def send_batch_emails(campaign_id, batch_number, is_test=False):
 
         # SAFETY CHECK: Verify safety checklist if not a test
         if not is_test:
-            safety_checklist = campaign.get('safety_checklist', {})
-            if safety_checklist:
-                # Check if all required items are completed
-                required_checks = ['test_emails_sent', 'preview_verified']
-                for check in required_checks:
-                    if not safety_checklist.get(check, False):
-                        raise Exception(f"Safety check failed: {check} must be completed before sending")
-
-            # Check if campaign is locked for editing
-            template_locked = campaign.get('template_locked', False)
-            if not template_locked:
-                logger.warning("Campaign template is not locked - proceeding anyway")
+            check_safety_checklist(campaign)
 
-        template_config = campaign.get('template_config', {})
+        campaign_template_config = campaign.get('template_config', {})
         
         # Get template components
         components = get_template_components()
@@ -687,28 +1824,28 @@ def send_batch_emails(campaign_id, batch_number, is_test=False):
             raise Exception(f"Batch {batch_number} not found for campaign {campaign_id}")
         
         batch = batch_response['Item']
+
+        # A batch that timed out earlier continues right after its checkpoint
+        resume_key = None if is_test else batch.get('resume_key')
+        if resume_key:
+            logger.info(f"Resuming batch {batch_number} after record {resume_key.get('record_id')}")
         
         # Update batch status to sending
+        sending_at = datetime.now().isoformat()
         batches_table.update_item(
             Key={'campaign_id': campaign_id, 'batch_number': int(batch_number)},
-            UpdateExpression='SET #status = :status, started_at = :started',
+            UpdateExpression='SET #status = :status, started_at = if_not_exists(started_at, :started), sending_at = :started',
             ExpressionAttributeNames={'#status': 'status'},
             ExpressionAttributeValues={
                 ':status': 'sending',
-                ':started': datetime.now().isoformat()
+                ':started': sending_at
             }
         )
         
-        # Get campaign data for this batch
-        campaign_data_table = dynamodb.Table('campaign_data')
-        
         if is_test:
             # For test emails, get test users
             test_users_table = dynamodb.Table('test_users')
-            response = test_users_table.scan(
-                FilterExpression=Attr('active').eq(True)
-            )
-            test_users = response.get('Items', [])
+            test_users = list(scan_items(test_users_table, condition=Attr('active').eq(True)))
 
             # Convert test users to campaign data format with actual products
             test_records = []
@@ -742,32 +1879,29 @@ def send_batch_emails(campaign_id, batch_number, is_test=False):
                         'product_name_1': 'Test Product',
                         'product_price_1': '19.99'
                     })
-            records = test_records
+            records = iter(test_records)
         else:
-            # Get actual campaign data for this batch
-            response = campaign_data_table.query(
-                IndexName='BatchIndex',
-                KeyConditionExpression=Key('campaign_id').eq(campaign_id) & Key('batch_number').eq(int(batch_number)),
-                FilterExpression=Attr('email_sent').eq(False)
-            )
-            records = response.get('Items', [])
-        
-        if not records:
+            # Stream actual campaign data for this batch, page by page
+            records = iter_unsent_recipients(campaign_id, batch_number, resume_key=resume_key)
+
+        first_record = next(records, None)
+        if first_record is None:
             logger.info(f"No unsent emails found for batch {batch_number}")
             # Mark batch as completed
             batches_table.update_item(
                 Key={'campaign_id': campaign_id, 'batch_number': int(batch_number)},
-                UpdateExpression='SET #status = :status, completed_at = :completed',
+                UpdateExpression='SET #status = :status, completed_at = :completed REMOVE resume_key',
                 ExpressionAttributeNames={'#status': 'status'},
                 ExpressionAttributeValues={
                     ':status': 'completed',
                     ':completed': datetime.now().isoformat()
                 }
             )
-            return {'emails_sent': 0, 'message': 'No emails to send'}
+            return {'emails_sent': 0, 'status': 'completed', 'message': 'No emails to send'}
+
+        records = itertools.chain([first_record], records)
         
-        emails_sent = 0
-        failed_emails = 0
+        counters = {'emails_sent': 0, 'failed_emails': 0}
         start_time = datetime.now()
 
         # Get template instance for subject line generation
@@ -780,72 +1914,186 @@ def send_batch_emails(campaign_id, batch_number, is_test=False):
         # Base subject line (will be personalized per recipient)
         base_subject = template_config.get('CAMPAIGN_TITLE', 'New Collection Available!')
 
-        for i, record in enumerate(records):
-            # Check timeout
+        # Compile the template once for the whole batch instead of re-fetching and
+        # re-parsing it for every recipient
+        if template_instance:
+            compiled_template = compile_template_instance(template_instance)
+        else:
+            logger.warning(f"No template instance found for campaign {campaign_id}, using fallback method")
+            compiled_template = None
+
+        # SES templated delivery needs a template instance; the fallback renderer always sends rendered HTML
+        delivery_mode = campaign.get('delivery_mode', DELIVERY_MODE_RENDERED)
+        template_sender = None
+        if delivery_mode == DELIVERY_MODE_SES_TEMPLATE:
+            if compiled_template:
+                template_sender = SesBulkTemplateSender(campaign_id, compiled_template)
+                template_sender.register()
+            else:
+                logger.warning(f"Campaign {campaign_id} has no template instance, sending rendered emails instead of SES templates")
+                delivery_mode = DELIVERY_MODE_RENDERED
+
+        # Use school documents rendered ahead of time by prerender_batch, if any
+        if compiled_template and not template_sender and not is_test and batch.get('prerender_manifest'):
+            load_prerendered_documents(compiled_template, batch['prerender_manifest'])
+
+        def batch_timed_out():
             elapsed_minutes = (datetime.now() - start_time).total_seconds() / 60
             if elapsed_minutes >= BATCH_TIMEOUT_MINUTES:
                 logger.warning(f"Batch timeout reached after {elapsed_minutes:.1f} minutes")
-                break
+                return True
+            return False
 
-            # Generate personalized subject line like: "Hi John, Michigan Journals Just Dropped!"
-            subject = generate_personalized_subject(base_subject, record)
+        progress = BatchProgress(resume_key)
+        checkpoint = {'saved_key': resume_key, 'saved_at': time.monotonic()}
 
-            # Generate personalized email using new template instance method
-            html_content = generate_email_html_from_template_instance(record, campaign_id)
+        def save_checkpoint():
+            """Persist the resume point; statuses are flushed first so it never runs ahead of them"""
+            if is_test or progress.resume_key == checkpoint['saved_key']:
+                return
+            status_buffer.flush()
+            batches_table.update_item(
+                Key={'campaign_id': campaign_id, 'batch_number': int(batch_number)},
+                UpdateExpression='SET resume_key = :key, checkpoint_at = :at',
+                ExpressionAttributeValues={
+                    ':key': progress.resume_key,
+                    ':at': datetime.now().isoformat()
+                }
+            )
+            checkpoint['saved_key'] = progress.resume_key
+            checkpoint['saved_at'] = time.monotonic()
+
+        def build_messages():
+            for record in records:
+                progress.started(record)
+
+                # Generate personalized subject line like: "Hi John, Michigan Journals Just Dropped!"
+                subject = generate_personalized_subject(base_subject, record)
+
+                if template_sender:
+                    # SES renders the registered template; only the replacement data is built here
+                    values = compiled_template.values_for_recipient(record)
+                    if values is None:
+                        logger.error(f"Failed to generate email for {record['customer_email']}")
+                        counters['failed_emails'] += 1
+                        progress.finished(record)
+                        continue
+
+                    yield record, subject, template_sender.replacement_data(values, subject)
+                    continue
+
+                # Generate personalized email from the compiled template instance
+                if compiled_template:
+                    html_content = compiled_template.render_for_recipient(record)
+                else:
+                    html_content = generate_email_html(record, campaign_template_config, components)
 
-            if not html_content:
-                logger.error(f"Failed to generate email for {record['customer_email']}")
-                failed_emails += 1
-                continue
+                if not html_content:
+                    logger.error(f"Failed to generate email for {record['customer_email']}")
+                    counters['failed_emails'] += 1
+                    progress.finished(record)
+                    continue
+
+                yield record, subject, html_content
+
+        def on_send_result(record, sent):
+            if sent:
+                counters['emails_sent'] += 1
 
-            # Send email
-            if send_email_ses(record['customer_email'], subject, html_content):
-                emails_sent += 1
-                
                 # Mark as sent in database (only for non-test emails)
                 if not is_test:
-                    campaign_data_table.update_item(
-                        Key={
-                            'campaign_id': record['campaign_id'],
-                            'record_id': record['record_id']
-                        },
-                        UpdateExpression='SET email_sent = :sent, sent_at = :sent_at',
-                        ExpressionAttributeValues={
-                            ':sent': True,
-                            ':sent_at': datetime.now().isoformat()
-                        }
-                    )
+                    status_buffer.mark_sent(record)
             else:
-                failed_emails += 1
-            
-            # Rate limiting
-            if i > 0 and i % EMAILS_PER_SECOND == 0:
-                time.sleep(1)
-        
-        # Update batch completion status
+                counters['failed_emails'] += 1
+                status_buffer.flush_if_due()
+
+            progress.finished(record)
+            if time.monotonic() - checkpoint['saved_at'] >= CHECKPOINT_INTERVAL_SECONDS:
+                save_checkpoint()
+
+        # Send concurrently, paced by the shared rate limiter (EMAILS_PER_SECOND overall).
+        # Sent statuses are written behind in bulk and flushed on exit, even on errors.
+        rate_limiter = rate_limiter or get_send_rate_limiter(campaign)
+        if template_sender:
+            dispatcher = BulkTemplateDispatcher(template_sender, rate_limiter=rate_limiter)
+        else:
+            dispatcher = EmailDispatcher(rate_limiter=rate_limiter)
+        with SentStatusBuffer() as status_buffer:
+            completed = dispatcher.run(build_messages(), on_send_result, should_stop=batch_timed_out)
+            if not completed:
+                save_checkpoint()
+
+        send_stats = dispatcher.stats.summary()
+        send_stats['delivery_mode'] = delivery_mode
+        send_stats['send_rate'] = {
+            'configured': dispatcher.rate_control.max_rate,
+            'final': round(dispatcher.rate_control.rate, 2),
+            'lowest': round(dispatcher.rate_control.lowest_rate, 2),
+            'decreases': dispatcher.rate_control.decreases
+        }
+        if compiled_template:
+            send_stats['fragment_cache'] = compiled_template.fragment_cache_stats()
+        send_stats['status_writes'] = status_buffer.summary()
+        send_stats['aws_latency'] = latency_stats.summary()
+        logger.info(f"Batch {batch_number} send stats: {json.dumps(send_stats)}")
+
+        emails_sent = counters['emails_sent']
+        failed_emails = counters['failed_emails']
+
+        set_parts = ['#status = :status']
+        expression_values = {':sent': emails_sent, ':failed': failed_emails}
+        resuming = False
+
+        if completed:
+            set_parts.append('completed_at = :completed')
+            expression_values[':status'] = 'completed'
+            expression_values[':completed'] = datetime.now().isoformat()
+        else:
+            # Timed out: continue in a fresh invocation, or leave the batch 'partial'
+            # with its resume token so the next send-batch call picks up from there
+            resume_count = int(batch.get('resume_count', 0))
+            resuming = not is_test and resume_count < MAX_BATCH_RESUMES and invoke_batch_resume(campaign_id, batch_number)
+            set_parts.append('resume_count = :resumes')
+            expression_values[':status'] = 'sending' if resuming else 'partial'
+            expression_values[':resumes'] = resume_count + 1 if resuming else resume_count
+
+        # Counts accumulate across resumed invocations of the same batch
+        if resume_key:
+            update_expression = 'SET ' + ', '.join(set_parts) + ' ADD emails_sent :sent, failed_emails :failed'
+        else:
+            update_expression = 'SET ' + ', '.join(set_parts + ['emails_sent = :sent', 'failed_emails = :failed'])
+        if completed:
+            update_expression += ' REMOVE resume_key'
+
+        # Update batch status
         batches_table.update_item(
             Key={'campaign_id': campaign_id, 'batch_number': int(batch_number)},
-            UpdateExpression='SET #status = :status, emails_sent = :sent, completed_at = :completed, failed_emails = :failed',
+            UpdateExpression=update_expression,
             ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':status': 'completed',
-                ':sent': emails_sent,
-                ':completed': datetime.now().isoformat(),
-                ':failed': failed_emails
-            }
+            ExpressionAttributeValues=expression_values
         )
         
-        # Update campaign totals
+        # Update campaign totals (campaign-wide sends report progress from these)
         campaigns_table.update_item(
             Key={'campaign_id': campaign_id},
-            UpdateExpression='ADD emails_sent :sent',
-            ExpressionAttributeValues={':sent': emails_sent}
+            UpdateExpression='ADD emails_sent :sent, emails_failed :failed',
+            ExpressionAttributeValues={':sent': emails_sent, ':failed': failed_emails}
         )
+
+        if completed:
+            message = f'Batch {batch_number} completed successfully'
+        elif resuming:
+            message = f'Batch {batch_number} timed out after {progress.processed} emails; resuming in a new invocation'
+        else:
+            message = f'Batch {batch_number} partially sent ({progress.processed} emails); send it again to resume'
         
         return {
             'emails_sent': emails_sent,
             'failed_emails': failed_emails,
-            'message': f'Batch {batch_number} completed successfully'
+            'status': 'completed' if completed else ('resuming' if resuming else 'partial'),
+            'resume_key': None if completed else progress.resume_key,
+            'send_stats': send_stats,
+            'message': message
         }
         
     except Exception as e:
@@ -868,10 +2116,178 @@ def send_batch_emails(campaign_id, batch_number, is_test=False):
         
         raise
 
+def launch_next_batch(campaign_id, run_id):
+    """
+    Claim the lowest queued batch of a campaign-wide send and start it asynchronously
+
+    A batch that can't be started is marked failed and counted as an incomplete
+    batch of the run, and the next queued one is tried instead, so the run still
+    finishes (as 'partial') instead of waiting for it forever.
+
+    Returns:
+        int or None: the batch number started, or None if nothing is left to start
+    """
+    batches_table = dynamodb.Table('campaign_batches')
+    query_kwargs = {
+        'KeyConditionExpression': Key('campaign_id').eq(campaign_id),
+        'FilterExpression': Attr('status').eq('queued') & Attr('send_run_id').eq(run_id),
+        'ProjectionExpression': 'batch_number'
+    }
+    queued = []
+    while True:
+        response = batches_table.query(**query_kwargs)
+        queued.extend(int(batch['batch_number']) for batch in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    for batch_number in sorted(queued):
+        # Conditional claim so two finishing batches never start the same one
+        try:
+            batches_table.update_item(
+                Key={'campaign_id': campaign_id, 'batch_number': batch_number},
+                UpdateExpression='SET #status = :sending, sending_at = :now',
+                ConditionExpression='#status = :queued AND send_run_id = :run',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':sending': 'sending',
+                    ':queued': 'queued',
+                    ':run': run_id,
+                    ':now': datetime.now().isoformat()
+                }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                continue
+            raise
+
+        if invoke_self_async({'action': 'send_batch', 'campaign_id': campaign_id, 'batch_number': batch_number}):
+            logger.info(f"Started campaign {campaign_id} batch {batch_number} (send run {run_id})")
+            return batch_number
+
+        # Couldn't start it; no invocation will ever finish it, so count it here.
+        # Another send-all (or send-batch) picks it up later.
+        logger.error(f"Could not start campaign {campaign_id} batch {batch_number} (send run {run_id})")
+        batches_table.update_item(
+            Key={'campaign_id': campaign_id, 'batch_number': batch_number},
+            UpdateExpression='SET #status = :failed, error_message = :error',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':failed': 'failed', ':error': 'Could not start the batch'}
+        )
+        count_finished_batch(campaign_id, batch_number, False)
+
+    return None
+
+def advance_campaign_send(campaign_id, batch_number, batch_completed):
+    """Record a finished batch of a campaign-wide send and hand its slot to the next queued batch"""
+    run_id = count_finished_batch(campaign_id, batch_number, batch_completed)
+    if run_id:
+        launch_next_batch(campaign_id, run_id)
+
+def count_finished_batch(campaign_id, batch_number, batch_completed):
+    """
+    Count a batch as done for its campaign-wide send, finishing the run after the last one
+
+    Returns:
+        str or None: the batch's send run id, or None if it was already counted or
+        its run was restarted or has finished
+    """
+    batches_table = dynamodb.Table('campaign_batches')
+    campaigns_table = dynamodb.Table('email_campaigns')
+
+    # Count each batch once per run, even if this is called again for it
+    try:
+        batch = batches_table.update_item(
+            Key={'campaign_id': campaign_id, 'batch_number': int(batch_number)},
+            UpdateExpression='SET send_run_finished = send_run_id',
+            ConditionExpression='attribute_exists(send_run_id) AND (attribute_not_exists(send_run_finished) OR send_run_finished <> send_run_id)',
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+
+    run_id = batch['send_run_id']
+    try:
+        campaign = campaigns_table.update_item(
+            Key={'campaign_id': campaign_id},
+            UpdateExpression='ADD send_batches_done :one, send_batches_incomplete :incomplete',
+            ConditionExpression='send_run_id = :run AND send_status = :sending',
+            ExpressionAttributeValues={
+                ':one': 1,
+                ':incomplete': 0 if batch_completed else 1,
+                ':run': run_id,
+                ':sending': 'sending'
+            },
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            # Batch belongs to a run that was restarted or already finished
+            return None
+        raise
+
+    if int(campaign.get('send_batches_done', 0)) >= int(campaign.get('send_batches_total', 0)):
+        all_completed = int(campaign.get('send_batches_incomplete', 0)) == 0
+        campaigns_table.update_item(
+            Key={'campaign_id': campaign_id},
+            UpdateExpression='SET send_status = :final, #status = :status, send_completed_at = :completed',
+            ConditionExpression='send_run_id = :run',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':final': 'completed' if all_completed else 'partial',
+                # Batches left unsent can still be sent individually or by another send-all
+                ':status': 'completed' if all_completed else 'ready',
+                ':completed': datetime.now().isoformat(),
+                ':run': run_id
+            }
+        )
+        logger.info(f"Campaign {campaign_id} send run {run_id} finished ({'completed' if all_completed else 'partial'})")
+
+    return run_id
+
+def batch_is_sending(batch):
+    """True if a batch is marked sending and has started or checkpointed within SEND_RUN_STALE_SECONDS"""
+    if batch.get('status') != 'sending':
+        return False
+    activity = [batch[field] for field in ('sending_at', 'checkpoint_at', 'started_at') if batch.get(field)]
+    if not activity:
+        return False
+    last_active = max(datetime.fromisoformat(timestamp) for timestamp in activity)
+    return (datetime.now() - last_active).total_seconds() < SEND_RUN_STALE_SECONDS
+
+def send_campaign_batch(campaign_id, batch_number):
+    """Send a batch from an asynchronous invocation, then advance its campaign-wide send if it has one"""
+    try:
+        result = send_batch_emails(campaign_id, batch_number, is_test=False)
+    except Exception as e:
+        # send_batch_emails already marked the batch failed; don't let Lambda retry the whole batch
+        logger.error(f"Error sending campaign {campaign_id} batch {batch_number}: {e}")
+        result = {'emails_sent': 0, 'status': 'failed', 'error': str(e)}
+
+    # A resuming batch keeps its slot until the resumed invocation finishes it
+    if result.get('status') != 'resuming':
+        try:
+            advance_campaign_send(campaign_id, batch_number, result.get('status') == 'completed')
+        except Exception as e:
+            logger.error(f"Error advancing campaign send for {campaign_id}: {e}")
+
+    return result
+
 def lambda_handler(event, context):
     """Main Lambda handler - Updated for Lambda Function URLs"""
     try:
         logger.info(f"Received event: {json.dumps(event)}")
+
+        # Asynchronous self-invocations: a batch started by a campaign-wide send, or
+        # continuing a batch that hit BATCH_TIMEOUT_MINUTES
+        if event.get('action') in ('send_batch', 'resume_batch'):
+            return send_campaign_batch(event['campaign_id'], event['batch_number'])
+
+        # Asynchronous pre-render of one batch, fanned out by handle_prerender
+        if event.get('action') == 'prerender_batch':
+            return prerender_batch(event['campaign_id'], event['batch_number'])
         
         # Handle Lambda Function URL format
         if 'requestContext' in event and 'http' in event.get('requestContext', {}):
@@ -901,6 +2317,10 @@ def lambda_handler(event, context):
             return handle_send_batch(event)
         elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/send-test'):
             return handle_send_test(event)
+        elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/prerender'):
+            return handle_prerender(event)
+        elif method == 'POST' and path.startswith('/api/campaigns/') and path.endswith('/send-all'):
+            return handle_send_campaign(event)
         else:
             return cors_response(404, {'error': 'Endpoint not found'})
             
@@ -939,6 +2359,137 @@ def handle_send_batch(event):
         logger.error(f"Error handling send batch: {e}")
         return cors_response(500, {'error': str(e)})
 
+def handle_send_campaign(event):
+    """
+    Send every unsent batch of a campaign, CAMPAIGN_SEND_CONCURRENCY batches at a time
+
+    Batches are queued under a new send run and started asynchronously; each batch
+    that finishes starts the next queued one. Progress is kept on email_campaigns
+    (send_status, send_batches_done/total, emails_sent, emails_failed).
+    """
+    try:
+        # Extract campaign_id from path
+        if 'rawPath' in event:
+            # Lambda Function URL format
+            path = event['rawPath']
+        else:
+            # API Gateway format
+            path = event.get('path', '')
+
+        path_parts = path.split('/')
+        campaign_id = path_parts[3]  # /api/campaigns/{campaign_id}/send-all
+
+        body = event.get('body', {}) or {}
+        if isinstance(body, str):
+            body = json.loads(body)
+
+        campaigns_table = dynamodb.Table('email_campaigns')
+        campaign_response = campaigns_table.get_item(Key={'campaign_id': campaign_id})
+
+        if 'Item' not in campaign_response:
+            return cors_response(404, {'error': 'Campaign not found'})
+
+        campaign = campaign_response['Item']
+
+        try:
+            check_safety_checklist(campaign)
+        except Exception as e:
+            return cors_response(400, {'error': str(e)})
+
+        batches_table = dynamodb.Table('campaign_batches')
+        query_kwargs = {'KeyConditionExpression': Key('campaign_id').eq(campaign_id)}
+        batches = []
+        while True:
+            response = batches_table.query(**query_kwargs)
+            batches.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        # A run that died without finishing can be replaced with restart=true, but only
+        # once none of its batches is still sending; requeueing a live batch would start
+        # a second sender for the same unsent recipients
+        if campaign.get('send_status') == 'sending':
+            if not body.get('restart'):
+                return cors_response(409, {
+                    'error': 'Campaign is already sending',
+                    'send_run_id': campaign.get('send_run_id')
+                })
+            active = [int(batch['batch_number']) for batch in batches if batch_is_sending(batch)]
+            if active:
+                return cors_response(409, {
+                    'error': f'Campaign is still sending; it can be restarted once its batches have '
+                             f'made no progress for {SEND_RUN_STALE_SECONDS} seconds',
+                    'send_run_id': campaign.get('send_run_id'),
+                    'active_batches': active
+                })
+
+        pending = [int(batch['batch_number']) for batch in batches if batch.get('status') != 'completed']
+
+        if not pending:
+            return cors_response(200, {'message': 'All batches have already been sent', 'batches_total': 0})
+
+        pending.sort()
+        concurrency = max(1, min(int(body.get('concurrency') or CAMPAIGN_SEND_CONCURRENCY), len(pending)))
+        run_id = str(uuid.uuid4())
+
+        # The campaign carries the run first so started batches see its concurrency
+        campaigns_table.update_item(
+            Key={'campaign_id': campaign_id},
+            UpdateExpression='SET #status = :sending, send_status = :sending, send_run_id = :run, '
+                             'send_concurrency = :concurrency, send_batches_total = :total, '
+                             'send_batches_done = :zero, send_batches_incomplete = :zero, send_started_at = :started '
+                             'REMOVE send_completed_at',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':sending': 'sending',
+                ':run': run_id,
+                ':concurrency': concurrency,
+                ':total': len(pending),
+                ':zero': 0,
+                ':started': datetime.now().isoformat()
+            }
+        )
+
+        for batch_number in pending:
+            batches_table.update_item(
+                Key={'campaign_id': campaign_id, 'batch_number': batch_number},
+                UpdateExpression='SET #status = :queued, send_run_id = :run',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':queued': 'queued', ':run': run_id}
+            )
+
+        started = []
+        for _ in range(concurrency):
+            batch_number = launch_next_batch(campaign_id, run_id)
+            if batch_number is None:
+                break
+            started.append(batch_number)
+
+        if not started:
+            campaigns_table.update_item(
+                Key={'campaign_id': campaign_id},
+                UpdateExpression='SET send_status = :failed, #status = :ready',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':failed': 'failed', ':ready': 'ready'}
+            )
+            return cors_response(500, {'error': 'Could not start any batch', 'send_run_id': run_id})
+
+        logger.info(f"Campaign {campaign_id} send run {run_id}: {len(pending)} batches, {concurrency} at a time")
+
+        return cors_response(200, {
+            'campaign_id': campaign_id,
+            'send_run_id': run_id,
+            'batches_total': len(pending),
+            'concurrency': concurrency,
+            'started_batches': started,
+            'message': f'Sending {len(pending)} batches, {concurrency} at a time'
+        })
+
+    except Exception as e:
+        logger.error(f"Error handling send campaign: {e}")
+        return cors_response(500, {'error': str(e)})
+
 def handle_send_test(event):
     """Handle sending test emails"""
     try:
@@ -959,4 +2510,61 @@ def handle_send_test(event):
         
     except Exception as e:
         logger.error(f"Error handling send test: {e}")
-        return cors_response(500, {'error': str(e)})
\ No newline at end of file
+        return cors_response(500, {'error': str(e)})
+
+def handle_prerender(event):
+    """Pre-render a campaign's batches ahead of sending, one asynchronous invocation per batch"""
+    try:
+        # Extract campaign_id from path
+        if 'rawPath' in event:
+            # Lambda Function URL format
+            path = event['rawPath']
+        else:
+            # API Gateway format
+            path = event.get('path', '')
+
+        path_parts = path.split('/')
+        campaign_id = path_parts[3]  # /api/campaigns/{campaign_id}/prerender
+
+        body = event.get('body', {}) or {}
+        if isinstance(body, str):
+            body = json.loads(body)
+
+        if not PRERENDER_STORE:
+            return cors_response(400, {'error': 'PRERENDER_STORE is not configured'})
+
+        batch_numbers = body.get('batch_numbers')
+        if not batch_numbers:
+            # Every batch that still has emails to send
+            batches_table = dynamodb.Table('campaign_batches')
+            query_kwargs = {'KeyConditionExpression': Key('campaign_id').eq(campaign_id)}
+            batch_numbers = []
+            while True:
+                response = batches_table.query(**query_kwargs)
+                batch_numbers.extend(
+                    int(batch['batch_number']) for batch in response.get('Items', [])
+                    if batch.get('status') != 'completed'
+                )
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        scheduled = []
+        failed = []
+        for batch_number in batch_numbers:
+            payload = {'action': 'prerender_batch', 'campaign_id': campaign_id, 'batch_number': int(batch_number)}
+            if invoke_self_async(payload):
+                scheduled.append(int(batch_number))
+            else:
+                failed.append(int(batch_number))
+
+        return cors_response(200 if not failed else 500, {
+            'campaign_id': campaign_id,
+            'scheduled_batches': scheduled,
+            'failed_batches': failed,
+            'message': f'Pre-rendering {len(scheduled)} batches'
+        })
+
+    except Exception as e:
+        logger.error(f"Error handling prerender: {e}")
+        return cors_response(500, {'error': str(e)})
@@ -0,0 +1,393 @@
+"""
+Shared Module: Product Catalog
+Pandas-free, column-oriented processing of Shopify product exports
+
+Used by lambda_campaign_manager. Package this file in the same deployment zip as the
+Lambda that imports it.
+
+process_campaign turns a product export into up to a few products per school. This
+module does it without pandas or per-row Series objects:
+- only the columns the campaign needs are read, as plain lists (one per column),
+  typed the way pandas.read_csv would type them so titles and prices come out the same
+- school codes are pulled from SKUs with one compiled regex, memoized per SKU
+- variants are grouped by Handle in a single pass and reduced per group
+- college data is joined with a dict lookup per kept row
+
+The result matches the previous pandas implementation: same products, same order,
+same title and price strings.
+
+A parsed table can be saved as a catalog artifact (dump_catalog/load_catalog): the
+kept columns, typed, plus the SKU school codes, as gzipped JSON. Loading it skips the
+CSV parse and the regex pass entirely.
+"""
+
+import codecs
+import csv
+import functools
+import gzip
+import io
+import itertools
+import json
+import math
+import re
+
+# Columns process_campaign reads; the rest of the export is never materialized
+PRODUCT_COLUMNS = ['Handle', 'Title', 'Option1 Value', 'Option2 Value', 'Variant SKU', 'Variant Price', 'Image Src']
+
+# Strings pandas.read_csv treats as missing by default
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+TRUE_VALUES = frozenset(['True', 'TRUE', 'true'])
+FALSE_VALUES = frozenset(['False', 'FALSE', 'false'])
+
+CATALOG_FORMAT_VERSION = 1  # Bump when the artifact layout or column typing changes
+
+_INT_PATTERN = re.compile(r'\s*[+-]?\d+\s*')
+_FLOAT_PATTERN = re.compile(r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*')
+
+# SKU school-code patterns, in priority order (the first that matches anywhere wins):
+#   1. C-CUST-{CODE}{NUMBER}
+#   2. -C-{CODE}{NUMBER}
+#   3. -C-{CODE} (no number follows)
+# As one alternation on their shared 'C-' prefix, so the regex engine jumps straight to
+# candidates. Each match consumes only 'C-' (the rest is lookahead), so candidates never
+# hide one another. Groups: 1 = code of pattern 1, 2 = code of pattern 2 or 3, 3 = the
+# digit that makes it pattern 2.
+SKU_SCHOOL_CODE_PATTERN = re.compile(
+    r'C-(?:(?=CUST-([A-Za-z]+)\d)'
+    r'|(?<=-C-)(?=([A-Za-z]+)(\d)?))'
+)
+SKU_SCHOOL_CODE_CACHE_SIZE = 65536  # SKUs remembered across requests in a warm container
+
+
+def isna(value):
+    """True for missing cells (NaN, as pandas stores them, or None)"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _infer_column(values):
+    """Type a column of raw strings like pandas.read_csv: int, float, bool or text, with NaN for missing cells"""
+    present = [value for value in values if value not in NA_VALUES]
+    if not present:
+        return [math.nan] * len(values)
+    has_missing = len(present) < len(values)
+
+    if all(_INT_PATTERN.fullmatch(value) for value in present):
+        if not has_missing:
+            return [int(value) for value in values]
+        return [math.nan if value in NA_VALUES else float(value) for value in values]
+
+    if all(_FLOAT_PATTERN.fullmatch(value) for value in present):
+        return [math.nan if value in NA_VALUES else float(value) for value in values]
+
+    if all(value in TRUE_VALUES or value in FALSE_VALUES for value in present):
+        return [math.nan if value in NA_VALUES else value in TRUE_VALUES for value in values]
+
+    return [math.nan if value in NA_VALUES else value for value in values]
+
+
+class ProductTable:
+    """A product export as {column name: list of typed values}"""
+
+    def __init__(self, header, columns, row_count, school_codes=None):
+        self.header = header
+        self.columns = columns
+        self.row_count = row_count
+        self.school_codes = school_codes  # Per row, when already extracted (see extract_school_codes)
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def has_columns(self, *names):
+        return all(name in self.header for name in names)
+
+    def head(self, count):
+        """The first `count` rows as a new table"""
+        school_codes = self.school_codes[:count] if self.school_codes is not None else None
+        columns = {name: values[:count] for name, values in self.columns.items()}
+        return ProductTable(self.header, columns, min(count, self.row_count), school_codes)
+
+
+def iter_text_lines(chunks, encoding='utf-8'):
+    """
+    Decode an iterable of byte chunks (e.g. an S3 body's iter_chunks()) as it arrives and
+    yield lines with their line endings, as csv.reader expects
+
+    Only '\n' ends a line here; '\r' stays on the line for csv to handle. Invalid
+    bytes raise UnicodeDecodeError.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()  # Incomplete last line, finished by the next chunk
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def read_product_csv(csv_content, columns=PRODUCT_COLUMNS, limit=None):
+    """
+    Parse a product export, keeping only `columns` (those missing from the file are skipped)
+
+    Args:
+        csv_content: the file as a string, or any iterable of lines (e.g. iter_text_lines
+            over an S3 body) so only the kept columns are ever held in memory
+        limit: stop after this many rows without reading the rest (a head sample;
+            columns are then typed from those rows alone)
+    """
+    lines = io.StringIO(csv_content) if isinstance(csv_content, str) else csv_content
+    reader = csv.reader(lines)
+    header = read_csv_header(reader)
+
+    # Duplicate headers: pandas renames later copies ('Title.1'), so the first one wins
+    positions = {}
+    for index, name in enumerate(header):
+        positions.setdefault(name, index)
+    wanted = [(name, positions[name]) for name in columns if name in positions]
+
+    raw = {name: [] for name, _ in wanted}
+    row_count = 0
+    rows = (row for row in reader if row)  # Blank lines are skipped
+    if limit is not None:
+        rows = itertools.islice(rows, limit)
+    for row in rows:
+        row_count += 1
+        width = len(row)
+        for name, index in wanted:
+            raw[name].append(row[index] if index < width else '')
+
+    typed = {name: _infer_column(values) for name, values in raw.items()}
+    return ProductTable(header, typed, row_count)
+
+
+def read_csv_header(reader):
+    """Column names from the next row of a csv.reader (BOM removed)"""
+    header = next(reader, [])
+    if header and header[0].startswith('\ufeff'):
+        header[0] = header[0][1:]
+    return header
+
+
+@functools.lru_cache(maxsize=SKU_SCHOOL_CODE_CACHE_SIZE)
+def _school_code_from_sku(sku):
+    match = SKU_SCHOOL_CODE_PATTERN.search(sku)
+    if match is None:
+        return ''
+    custom_code, code, number = match.groups()
+    if custom_code or sku.find('C-', match.end()) == -1:
+        return custom_code or code  # The usual case: the first candidate is the answer
+
+    # Several candidates: a later pattern 1 beats everything, a later pattern 2 beats pattern 3
+    with_number = code if number else None
+    without_number = None if number else code
+    for match in SKU_SCHOOL_CODE_PATTERN.finditer(sku, match.end()):
+        custom_code, code, number = match.groups()
+        if custom_code:
+            return custom_code
+        if number and with_number is None:
+            with_number = code
+        elif not number and without_number is None:
+            without_number = code
+    return with_number or without_number
+
+
+def extract_school_code(sku):
+    """School code from a SKU (e.g. 'STCRT2-C-WY25 2-Inch' -> 'WY'), or '' if there isn't one"""
+    if isna(sku) or not sku:
+        return ''
+    return _school_code_from_sku(str(sku))
+
+
+def extract_school_codes_from_skus(skus):
+    """School code of every SKU in a column, each distinct SKU looked up once"""
+    codes = {}
+    result = []
+    for sku in skus:
+        code = codes.get(sku)
+        if code is None:
+            code = codes[sku] = extract_school_code(sku)
+        result.append(code)
+    return result
+
+
+def extract_school_codes(table):
+    """School code of every row (from the table itself when already extracted)"""
+    if table.school_codes is not None:
+        return table.school_codes
+    return extract_school_codes_from_skus(table['Variant SKU'])
+
+
+def dump_catalog(table):
+    """
+    Serialize a ProductTable as a catalog artifact: gzipped JSON with one list per kept
+    column (types and NaN cells preserved) and the SKU school codes already extracted
+    """
+    payload = {
+        'version': CATALOG_FORMAT_VERSION,
+        'header': table.header,
+        'row_count': table.row_count,
+        'columns': table.columns,
+        'school_codes': extract_school_codes(table)
+    }
+    return gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), compresslevel=6)
+
+
+def load_catalog(data):
+    """ProductTable from dump_catalog output; ValueError if it was written by another format version"""
+    payload = json.loads(gzip.decompress(data))
+    if payload.get('version') != CATALOG_FORMAT_VERSION:
+        raise ValueError(f"Unsupported catalog artifact version {payload.get('version')}")
+    return ProductTable(payload['header'], payload['columns'], payload['row_count'], payload['school_codes'])
+
+
+def _to_number(value):
+    """pandas.to_numeric(errors='coerce') for a single cell"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and _FLOAT_PATTERN.fullmatch(value):
+        return float(value)
+    return math.nan
+
+
+def _variant_title(base_title, option1, option2):
+    title_parts = [base_title]
+    if not isna(option1) and str(option1):
+        title_parts.append(str(option1))
+    if not isna(option2) and str(option2):
+        title_parts.append(str(option2))
+    return ' '.join(title_parts)
+
+
+def _inch_flags(values):
+    """Per row: does the option value mention 'inch' (each distinct value is checked once)"""
+    checked = {}
+    flags = []
+    for value in values:
+        flag = checked.get(value)
+        if flag is None:
+            flag = checked[value] = not isna(value) and 'inch' in str(value).lower()
+        flags.append(flag)
+    return flags
+
+
+def reduce_handle_groups(table):
+    """
+    Group variants by Handle (single pass) and pick the rows to keep, in Handle order
+
+    Groups whose Option1/Option2 values mention 'inch' keep only their lowest-priced
+    variant, titled '<title> <option1> <option2>'. Other groups keep every variant, and
+    untitled variants get the same kind of title. Groups with no title at all are kept
+    as they are; rows without a Handle are dropped.
+
+    Returns:
+        list of (row index, title)
+    """
+    handles = table['Handle']
+    titles = table['Title']
+    option1_values = table['Option1 Value']
+    option2_values = table['Option2 Value'] if table.has_columns('Option2 Name', 'Option2 Value') else None
+    prices = table['Variant Price']
+
+    inch_rows = _inch_flags(option1_values)
+    if option2_values is not None:
+        inch_rows = [option1 or option2 for option1, option2 in zip(inch_rows, _inch_flags(option2_values))]
+
+    groups = {}
+    for index, handle in enumerate(handles):
+        if not isna(handle):
+            groups.setdefault(handle, []).append(index)
+
+    kept = []
+    for handle in sorted(groups):
+        indices = groups[handle]
+
+        base_title = None
+        for index in indices:
+            if not isna(titles[index]) and titles[index] != '':
+                base_title = titles[index]
+                break
+        if base_title is None:
+            kept.extend((index, titles[index]) for index in indices)
+            continue
+
+        if any(inch_rows[index] for index in indices):
+            # Lowest price wins (first one on ties); unpriced variants are skipped
+            cheapest = None
+            cheapest_price = math.inf
+            for index in indices:
+                price = _to_number(prices[index])
+                if not math.isnan(price) and (cheapest is None or price < cheapest_price):
+                    cheapest, cheapest_price = index, price
+            if cheapest is None:
+                cheapest = indices[0]
+            option2 = option2_values[cheapest] if option2_values is not None else None
+            kept.append((cheapest, _variant_title(base_title, option1_values[cheapest], option2)))
+        else:
+            for index in indices:
+                title = titles[index]
+                if isna(title) or title == '':
+                    option2 = option2_values[index] if option2_values is not None else None
+                    title = _variant_title(base_title, option1_values[index], option2)
+                kept.append((index, title))
+
+    return kept
+
+
+def group_products_by_school(table, colleges_by_code):
+    """
+    Reduce a product table to {school_code: [product info, ...]} for schools in colleges_by_code
+
+    Only variants with a matched school code and an image are included. Schools appear in
+    the order their first product does.
+
+    Returns:
+        (products_by_school, stats) where stats counts rows at each stage for logging
+    """
+    school_codes = extract_school_codes(table)
+
+    kept = reduce_handle_groups(table)
+
+    handles = table['Handle']
+    prices = table['Variant Price']
+    images = table['Image Src']
+
+    products_by_school = {}
+    matched = 0
+    for index, title in kept:
+        college_info = colleges_by_code.get(school_codes[index]) if school_codes[index] else None
+        if college_info is None:
+            continue
+        image = images[index]
+        if isna(image) or image == '':
+            continue
+        matched += 1
+
+        # Prices are sent as strings to avoid DynamoDB Decimal issues
+        price = prices[index]
+        if isinstance(price, (int, float)):
+            price = str(price)
+
+        products_by_school.setdefault(school_codes[index], []).append({
+            'handle': handles[index],
+            'title': title,
+            'price': price,
+            'image': image,
+            'school_page': college_info.get('school_page', ''),
+            'school_logo': college_info.get('school_logo', '')
+        })
+
+    stats = {
+        'rows': len(table),
+        'school_codes_extracted': sum(1 for code in school_codes if code),
+        'rows_after_handle_groups': len(kept),
+        'products_matched': matched
+    }
+    return products_by_school, stats
@@ -0,0 +1,120 @@
+"""
+Shared Module: School Directory
+In-memory index of the college-db-email table keyed by school_code
+
+Used by lambda_email_sender and lambda_campaign_manager. Package this file in the
+same deployment zip as the Lambda that imports it.
+
+The college-db-email table has partition key 'school_name' (the full name), and
+'school_code' (e.g., 'AKN') is just an attribute, so a lookup by code needs a scan.
+Instead of scanning once per lookup, the directory scans the whole table once (with
+full pagination), indexes it by school_code and keeps it in module state so warm
+Lambda invocations reuse it until the TTL expires.
+
+Environment Variables (optional):
+- SCHOOL_DIRECTORY_TTL_SECONDS: seconds before the table is re-read (default 300)
+"""
+
+import logging
+import os
+import threading
+import time
+
+from dynamo_scan import scan_items
+
+logger = logging.getLogger()
+
+SCHOOL_DIRECTORY_TTL_SECONDS = int(os.environ.get('SCHOOL_DIRECTORY_TTL_SECONDS', '300'))
+
+# One directory per table name, shared across warm invocations
+_directories = {}
+_directories_lock = threading.Lock()
+
+
+class SchoolDirectory:
+    """Lazily loaded school_code -> college-db-email item index with a TTL"""
+
+    def __init__(self, table, ttl_seconds=SCHOOL_DIRECTORY_TTL_SECONDS):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self._schools = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _scan_table(self):
+        """Read every item in the table, following LastEvaluatedKey"""
+        return list(scan_items(self.table))
+
+    def _load(self):
+        """(Re)load the index. Keeps serving the stale index if a refresh fails."""
+        try:
+            schools = {}
+            for item in self._scan_table():
+                school_code = str(item.get('school_code', '') or '').strip()
+                if school_code and school_code not in schools:
+                    schools[school_code] = item
+
+            self._schools = schools
+            self._loaded_at = time.monotonic()
+            logger.info(f"Loaded school directory from {self.table.name}: {len(schools)} schools")
+
+        except Exception as e:
+            if self._schools is None:
+                raise
+            logger.error(f"Error refreshing school directory, serving cached copy: {e}")
+            self._loaded_at = time.monotonic()
+
+    def _index(self):
+        """Return the current index, loading it on first use or after the TTL"""
+        with self._lock:
+            if self._schools is None or time.monotonic() - self._loaded_at >= self.ttl_seconds:
+                self._load()
+            return self._schools
+
+    def invalidate(self):
+        """Force the next lookup to re-read the table"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def get_school(self, school_code):
+        """Return the college-db-email item for a school code, or None"""
+        if not school_code:
+            return None
+        return self._index().get(str(school_code).strip())
+
+    def schools_by_code(self):
+        """Return a copy of the full school_code -> item index"""
+        return dict(self._index())
+
+    def get_school_name(self, school_code):
+        """
+        Get school name from school code
+
+        Returns the school code itself when the school is unknown or has no name,
+        matching what the email templates expect as a fallback.
+        """
+        if not school_code:
+            logger.warning("get_school_name called with empty school_code")
+            return school_code
+
+        school = self.get_school(school_code)
+        if not school:
+            logger.warning(f"No entry found in college-db-email for school_code='{school_code}'")
+            return school_code
+
+        school_name = school.get('school_name', '')
+        if not school_name or school_name == school_code:
+            logger.warning(f"School entry exists but school_name is empty or equals code: school_code='{school_code}', school_name='{school_name}'")
+            return school_code
+
+        return school_name
+
+
+def get_school_directory(dynamodb, table_name='college-db-email'):
+    """Return the shared SchoolDirectory for a table, creating it on first use"""
+    with _directories_lock:
+        directory = _directories.get(table_name)
+        if directory is None:
+            directory = SchoolDirectory(dynamodb.Table(table_name))
+            _directories[table_name] = directory
+        return directory
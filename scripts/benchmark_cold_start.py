@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark lambda_campaign_manager cold starts per route
+
+Each run starts a fresh Python interpreter (like a new Lambda container), imports
+lambda_campaign_manager and sends it one request. It reports the module import time,
+the first request's latency and whether pandas ended up loaded. The lightweight
+routes should stay under the target without loading pandas.
+
+Requests are read-only and go to the AWS account configured in your environment
+(set AWS_ENDPOINT_URL to use DynamoDB Local instead).
+
+Usage:
+    python benchmark_cold_start.py [runs] [campaign_id]
+    python benchmark_cold_start.py 5 my-campaign-id
+"""
+
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions')
+
+TARGET_MS = 200  # Cold start target (import + first request) for the lightweight routes
+
+# (method, path) pairs; {campaign_id} is filled in from the command line
+ROUTES = [
+    ('GET', '/api/campaigns'),
+    ('GET', '/api/campaigns/{campaign_id}'),
+    ('GET', '/api/campaigns/{campaign_id}/batches'),
+    ('GET', '/api/colleges'),
+    ('GET', '/api/test-users'),
+]
+
+
+def run_child(method, path):
+    """Runs inside the fresh interpreter: import the Lambda, handle one request, print timings"""
+    sys.path.insert(0, LAMBDA_DIR)
+
+    started = time.perf_counter()
+    import lambda_campaign_manager
+    imported = time.perf_counter()
+
+    event = {
+        'requestContext': {'http': {'method': method}},
+        'rawPath': path,
+        'queryStringParameters': {}
+    }
+    response = lambda_campaign_manager.lambda_handler(event, None)
+    finished = time.perf_counter()
+
+    result = {
+        'import_ms': (imported - started) * 1000,
+        'request_ms': (finished - imported) * 1000,
+        'status': response.get('statusCode'),
+        'pandas_loaded': 'pandas' in sys.modules
+    }
+
+    # What the route would have paid if pandas were still imported at module load
+    if not result['pandas_loaded']:
+        pandas_started = time.perf_counter()
+        try:
+            importlib.import_module('pandas')
+            result['pandas_import_ms'] = (time.perf_counter() - pandas_started) * 1000
+        except ImportError:
+            result['pandas_import_ms'] = None
+
+    print(json.dumps(result))
+
+
+def measure(method, path, runs):
+    """Cold-start the Lambda `runs` times for one route; returns the parsed child results"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', method, path],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3])
+        return
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    campaign_id = sys.argv[2] if len(sys.argv) > 2 else 'benchmark-campaign'
+
+    print("=" * 60)
+    print(f"lambda_campaign_manager cold starts ({runs} runs per route, medians)")
+    print("=" * 60)
+    print(f"{'route':<48} {'import':>8} {'request':>8} {'total':>8}  pandas  status")
+
+    over_target = []
+    for method, path in ROUTES:
+        path = path.format(campaign_id=campaign_id)
+        results = measure(method, path, runs)
+
+        import_ms = statistics.median(r['import_ms'] for r in results)
+        request_ms = statistics.median(r['request_ms'] for r in results)
+        total_ms = statistics.median(r['import_ms'] + r['request_ms'] for r in results)
+        pandas_loaded = any(r['pandas_loaded'] for r in results)
+        statuses = sorted({r['status'] for r in results})
+
+        print(f"{method + ' ' + path:<48} {import_ms:>6.0f}ms {request_ms:>6.0f}ms {total_ms:>6.0f}ms  "
+              f"{'yes' if pandas_loaded else 'no':<6}  {','.join(str(s) for s in statuses)}")
+        if pandas_loaded or total_ms > TARGET_MS:
+            over_target.append(path)
+
+    pandas_ms = [r.get('pandas_import_ms') for r in results if r.get('pandas_import_ms')]
+    if pandas_ms:
+        print(f"\nDeferred pandas import (paid only by upload/process/ai-generate): {statistics.median(pandas_ms):.0f}ms")
+
+    if over_target:
+        print(f"\n⚠️  Over the {TARGET_MS}ms target or loading pandas: {', '.join(over_target)}")
+    else:
+        print(f"\n✅ All lightweight routes cold start under {TARGET_MS}ms without pandas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Benchmark the process_campaign product pipeline
+
+Compares the pandas implementation process_campaign used to have (kept here as the
+reference) with the column-oriented product_catalog module. It checks that both
+produce the same products per school, then times them on the sample export and on a
+synthetic expansion of it (every product copied under new handles).
+
+Every school code found in the SKUs is treated as a known school, so no DynamoDB
+access is needed. pandas is only needed for the reference timings.
+
+It also compares peak memory of reading the file the old way (whole body as bytes, then
+as a string) with streaming it in 1MB chunks the way process_campaign reads S3 objects,
+and the time to parse the CSV with the time to load its catalog artifact.
+
+Finally it times the handle-group reducer alone (inch variants, cheapest variant,
+synthesized titles) against the pandas groupby version across catalog sizes, checking
+that the kept rows match once normalized: pandas parses numeric columns into floats and
+missing cells into NaN, so both sides are compared with missing cells as '' and numbers
+as repr(float). It is not a byte-for-byte comparison of the raw values.
+
+Usage:
+    python benchmark_product_pipeline.py [csv_path] [expansion]
+    python benchmark_product_pipeline.py "../input_file_sample/products_export_1 (1).csv" 100
+"""
+
+import csv
+import importlib
+import io
+import math
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from product_catalog import (
+    dump_catalog, extract_school_code, group_products_by_school, isna, iter_text_lines, load_catalog,
+    read_product_csv, reduce_handle_groups
+)
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'input_file_sample', 'products_export_1 (1).csv')
+
+REDUCER_SIZES = [1, 5, 20]  # Catalog expansions the reducer is compared at
+REDUCED_FIELDS = ['Handle', 'Title', 'Option1 Value', 'Option2 Value', 'Variant SKU', 'Variant Price']
+
+
+def legacy_process_handle_groups(df):
+    """The pandas handle-group reducer process_campaign used before product_catalog"""
+    import pandas as pd
+
+    has_option2 = 'Option2 Name' in df.columns and 'Option2 Value' in df.columns
+    rows_to_keep = []
+    for handle, group in df.groupby('Handle'):
+        group = group.copy()
+        has_inch_option1 = any('inch' in str(val).lower() for val in group['Option1 Value'].dropna())
+        has_inch_option2 = False
+        if has_option2:
+            has_inch_option2 = any('inch' in str(val).lower() for val in group['Option2 Value'].dropna())
+        title_rows = group[group['Title'].notna() & (group['Title'] != '')]
+        if len(title_rows) == 0:
+            rows_to_keep.extend(group.to_dict('records'))
+            continue
+        base_title = title_rows.iloc[0]['Title']
+        if has_inch_option1 or has_inch_option2:
+            group['price_numeric'] = pd.to_numeric(group['Variant Price'], errors='coerce')
+            min_price_row = group.loc[group['price_numeric'].idxmin()].copy()
+            option1_val = str(min_price_row['Option1 Value']) if pd.notna(min_price_row['Option1 Value']) else ''
+            option2_val = str(min_price_row['Option2 Value']) if pd.notna(min_price_row['Option2 Value']) and has_option2 else ''
+            title_parts = [base_title]
+            if option1_val:
+                title_parts.append(option1_val)
+            if option2_val:
+                title_parts.append(option2_val)
+            min_price_row['Title'] = ' '.join(title_parts)
+            min_price_row = min_price_row.drop('price_numeric')
+            rows_to_keep.append(min_price_row.to_dict())
+        else:
+            for idx, row in group.iterrows():
+                row_dict = row.to_dict()
+                if pd.isna(row_dict['Title']) or row_dict['Title'] == '':
+                    option1_val = str(row['Option1 Value']) if pd.notna(row['Option1 Value']) else ''
+                    option2_val = str(row['Option2 Value']) if pd.notna(row['Option2 Value']) and has_option2 else ''
+                    title_parts = [base_title]
+                    if option1_val:
+                        title_parts.append(option1_val)
+                    if option2_val:
+                        title_parts.append(option2_val)
+                    row_dict['Title'] = ' '.join(title_parts)
+                rows_to_keep.append(row_dict)
+    return pd.DataFrame(rows_to_keep)
+
+
+def legacy_products_by_school(csv_content, colleges_dict):
+    """The pandas pipeline process_campaign used before product_catalog"""
+    import pandas as pd
+
+    products_df = pd.read_csv(io.StringIO(csv_content))
+
+    def extract_school_code(sku):
+        if pd.isna(sku) or not sku:
+            return ''
+        sku = str(sku).strip()
+        match = re.search(r'C-CUST-([A-Za-z]+)(?=\d)', sku)
+        if match:
+            return match.group(1).strip()
+        match = re.search(r'-C-([A-Za-z]+)(?=\d)', sku)
+        if match:
+            return match.group(1).strip()
+        match = re.search(r'-C-([A-Za-z]+)', sku)
+        if match:
+            return match.group(1).strip()
+        return ''
+
+    products_df['school_code'] = products_df['Variant SKU'].apply(extract_school_code)
+    products_df = legacy_process_handle_groups(products_df)
+
+    for idx, row in products_df.iterrows():
+        school_code = str(row['school_code']).strip() if pd.notna(row['school_code']) else ''
+        if school_code and school_code in colleges_dict:
+            college_info = colleges_dict[school_code]
+            products_df.at[idx, 'school_name'] = college_info.get('school_name', '')
+            products_df.at[idx, 'school_page'] = college_info.get('school_page', '')
+            products_df.at[idx, 'school_logo'] = college_info.get('school_logo', '')
+            products_df.at[idx, 'has_match'] = True
+        else:
+            products_df.at[idx, 'has_match'] = False
+
+    products_df = products_df[products_df['has_match']].copy()
+    products_df = products_df[products_df['Image Src'].notna() & (products_df['Image Src'] != '')].copy()
+
+    products_by_school = {}
+    for idx, row in products_df.iterrows():
+        school_code = str(row['school_code']).strip()
+        if school_code:
+            if school_code not in products_by_school:
+                products_by_school[school_code] = []
+            price = row.get('Variant Price', '')
+            if isinstance(price, (int, float)):
+                price = str(price)
+            products_by_school[school_code].append({
+                'handle': row.get('Handle', ''),
+                'title': row.get('Title', ''),
+                'price': price,
+                'image': row.get('Image Src', ''),
+                'school_page': row.get('school_page', ''),
+                'school_logo': row.get('school_logo', '')
+            })
+    return products_by_school
+
+
+def catalog_products_by_school(csv_content, colleges_dict):
+    products_by_school, _ = group_products_by_school(read_product_csv(csv_content), colleges_dict)
+    return products_by_school
+
+
+def expand_csv(csv_content, copies):
+    """Repeat every row `copies` times, giving each copy its own handles"""
+    rows = list(csv.reader(io.StringIO(csv_content)))
+    header, body = rows[0], rows[1:]
+    handle_index = header.index('Handle')
+
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(header)
+    for copy in range(copies):
+        for row in body:
+            if copy and row and row[handle_index]:
+                row = list(row)
+                row[handle_index] = f"{row[handle_index]}-copy{copy}"
+            writer.writerow(row)
+    return output.getvalue()
+
+
+def normalized(products_by_school):
+    """Comparable form: NaN != NaN, so missing cells (stored as '' anyway) compare as ''"""
+    def cell(value):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return ''
+        return value
+    return [
+        (school_code, [{key: cell(value) for key, value in product.items()} for product in products])
+        for school_code, products in products_by_school.items()
+    ]
+
+
+def normalized_reduced(rows):
+    """Kept rows as comparable CSV text; missing cells as '', numbers as repr(float) (numpy or not)"""
+    def cell(value):
+        if isna(value) or (isinstance(value, float) and math.isnan(value)):
+            return ''
+        if isinstance(value, (int, float)) or type(value).__module__ == 'numpy':
+            return repr(float(value))
+        return str(value)
+
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    for row in rows:
+        writer.writerow([cell(value) for value in row])
+    return output.getvalue()
+
+
+def legacy_reduced_rows(products_df):
+    reduced = legacy_process_handle_groups(products_df)
+    return list(reduced[REDUCED_FIELDS].itertuples(index=False))
+
+
+def catalog_reduced_rows(table):
+    columns = [table[field] for field in REDUCED_FIELDS]
+    title_position = REDUCED_FIELDS.index('Title')
+    rows = []
+    for index, title in reduce_handle_groups(table):
+        row = [column[index] for column in columns]
+        row[title_position] = title
+        rows.append(row)
+    return rows
+
+
+def run_reducer_sizes(csv_content, has_pandas):
+    """Time the handle-group reducer alone at each REDUCER_SIZES expansion"""
+    print("\nHandle-group reducer")
+    identical = True
+    for copies in REDUCER_SIZES:
+        expanded = expand_csv(csv_content, copies)
+        table = read_product_csv(expanded)
+        handles = len(set(table['Handle']))
+        catalog_seconds, catalog_rows = timed(catalog_reduced_rows, table)
+        line = f"  {len(table):>8,} rows, {handles:>6,} handles: product_catalog {catalog_seconds * 1000:>8.1f}ms"
+
+        if has_pandas:
+            import pandas as pd
+            products_df = pd.read_csv(io.StringIO(expanded))
+            legacy_seconds, legacy_rows = timed(legacy_reduced_rows, products_df, repeat=1)
+            same = normalized_reduced(legacy_rows) == normalized_reduced(catalog_rows)
+            identical = identical and same
+            line += (f", pandas {legacy_seconds * 1000:>9.1f}ms ({legacy_seconds / catalog_seconds:.0f}x), "
+                     f"{'✅ same normalized rows' if same else '❌ DIFFERENT'}")
+        print(line)
+    return identical
+
+
+def read_whole_body(body_bytes):
+    """The file in memory as bytes and as str, then parsed"""
+    return read_product_csv(bytes(body_bytes).decode('utf-8'))
+
+
+def read_streamed_body(body_bytes, chunk_size=1024 * 1024):
+    """Decoded and parsed chunk by chunk, as from an S3 body's iter_chunks()"""
+    view = memoryview(body_bytes)
+    chunks = (bytes(view[start:start + chunk_size]) for start in range(0, len(view), chunk_size))
+    return read_product_csv(iter_text_lines(chunks))
+
+
+def peak_memory(function, *args):
+    """Peak bytes allocated while function runs"""
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def timed(function, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(label, csv_content, colleges_dict, has_pandas):
+    row_count = len(read_product_csv(csv_content, columns=[]))
+    catalog_seconds, catalog_result = timed(catalog_products_by_school, csv_content, colleges_dict)
+    products = sum(len(items) for items in catalog_result.values())
+    print(f"\n{label}: {row_count:,} rows, {len(catalog_result)} schools, {products:,} products")
+    print(f"  product_catalog: {catalog_seconds * 1000:>9.1f}ms")
+
+    body_bytes = csv_content.encode('utf-8')
+    whole_peak = peak_memory(read_whole_body, body_bytes)
+    streamed_peak = peak_memory(read_streamed_body, body_bytes)
+    print(f"  read peak memory: whole body {whole_peak / 1e6:.1f}MB, streamed {streamed_peak / 1e6:.1f}MB "
+          f"(file {len(body_bytes) / 1e6:.1f}MB)")
+
+    parse_seconds, table = timed(read_product_csv, csv_content)
+    artifact = dump_catalog(table)
+    load_seconds, _ = timed(load_catalog, artifact)
+    print(f"  parse CSV {parse_seconds * 1000:.1f}ms, load catalog artifact {load_seconds * 1000:.1f}ms "
+          f"(artifact {len(artifact) / 1e6:.2f}MB)")
+
+    if has_pandas:
+        legacy_seconds, legacy_result = timed(legacy_products_by_school, csv_content, colleges_dict, repeat=1)
+        identical = normalized(legacy_result) == normalized(catalog_result)
+        print(f"  pandas (before): {legacy_seconds * 1000:>9.1f}ms  ({legacy_seconds / catalog_seconds:.1f}x slower)")
+        print(f"  same output:     {'✅ yes' if identical else '❌ NO'}")
+        return identical
+    return True
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CSV
+    expansion = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    with open(csv_path, encoding='utf-8') as f:
+        csv_content = f.read()
+
+    try:
+        importlib.import_module('pandas')
+        has_pandas = True
+    except ImportError:
+        has_pandas = False
+        print("pandas is not installed; timing product_catalog only")
+
+    # Treat every school code in the export as a known school
+    table = read_product_csv(csv_content)
+    codes = {extract_school_code(sku) for sku in table['Variant SKU']} - {''}
+    colleges_dict = {
+        code: {'school_code': code, 'school_name': code, 'school_page': f"https://example.com/{code}", 'school_logo': f"{code}.png"}
+        for code in codes
+    }
+
+    print("=" * 60)
+    print("process_campaign product pipeline")
+    print("=" * 60)
+
+    ok = run("Sample export", csv_content, colleges_dict, has_pandas)
+    ok = run(f"{expansion}x expansion", expand_csv(csv_content, expansion), colleges_dict, has_pandas) and ok
+    ok = run_reducer_sizes(csv_content, has_pandas) and ok
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
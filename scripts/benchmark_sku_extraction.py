@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark SKU school-code extraction
+
+Compares the extractor process_campaign used to define on every request (up to three
+re.search calls with uncompiled patterns per SKU) with product_catalog's single
+precompiled pattern and its per-SKU memo. It first checks that every SKU in the sample
+export gives the same code both ways (the edge cases are covered by
+tests/test_sku_school_codes.py), then reports the cost per row of:
+- the old three-search extractor
+- the precompiled pattern without the memo (one search per SKU, usually)
+- extract_school_codes_from_skus with a cold memo (first request in a container)
+- extract_school_codes_from_skus with a warm memo (the same catalog again)
+
+Usage:
+    python benchmark_sku_extraction.py [csv_path] [expansion]
+    python benchmark_sku_extraction.py "../input_file_sample/products_export_1 (1).csv" 50
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+import product_catalog
+from product_catalog import extract_school_codes_from_skus, isna, read_product_csv
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'input_file_sample', 'products_export_1 (1).csv')
+
+def legacy_extract_school_code(sku):
+    """The extractor process_campaign defined before product_catalog"""
+    if sku is None or isna(sku) or not sku:
+        return ''
+    sku = str(sku).strip()
+    match = re.search(r'C-CUST-([A-Za-z]+)(?=\d)', sku)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r'-C-([A-Za-z]+)(?=\d)', sku)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r'-C-([A-Za-z]+)', sku)
+    if match:
+        return match.group(1).strip()
+    return ''
+
+
+def compiled_extract_school_code(sku):
+    """The single precompiled pattern, without the memo"""
+    if isna(sku) or not sku:
+        return ''
+    return product_catalog._school_code_from_sku.__wrapped__(str(sku))
+
+
+def legacy_codes(skus):
+    return [legacy_extract_school_code(sku) for sku in skus]
+
+
+def compiled_codes(skus):
+    return [compiled_extract_school_code(sku) for sku in skus]
+
+
+def clear_memo():
+    product_catalog._school_code_from_sku.cache_clear()
+
+
+def expand_skus(skus, copies):
+    """Every SKU repeated `copies` times under new product prefixes, like a larger catalog"""
+    return [f"V{copy}{sku}" if copy and isinstance(sku, str) else sku for copy in range(copies) for sku in skus]
+
+
+def per_row(function, skus, repeat=5, setup=None):
+    """Best time per row in nanoseconds (setup, if given, runs untimed before each repeat)"""
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        function(skus)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(skus) * 1e9
+
+
+def run(label, skus):
+    distinct = len(set(map(str, skus)))
+    print(f"\n{label}: {len(skus):,} SKUs ({distinct:,} distinct, memo holds "
+          f"{product_catalog.SKU_SCHOOL_CODE_CACHE_SIZE:,})")
+    legacy_ns = per_row(legacy_codes, skus)
+    results = [
+        ('3x re.search (before)', legacy_ns),
+        ('compiled pattern', per_row(compiled_codes, skus)),
+        ('memo, cold', per_row(extract_school_codes_from_skus, skus, setup=clear_memo)),
+        ('memo, warm', per_row(extract_school_codes_from_skus, skus)),
+    ]
+    for name, ns in results:
+        print(f"  {name:<22} {ns:>8.0f}ns/row  ({legacy_ns / ns:.1f}x)")
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CSV
+    expansion = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with open(csv_path, encoding='utf-8') as f:
+        skus = read_product_csv(f.read(), columns=['Variant SKU'])['Variant SKU']
+
+    print("=" * 60)
+    print("SKU school-code extraction")
+    print("=" * 60)
+
+    mismatches = [
+        sku for sku in skus
+        if legacy_extract_school_code(sku) != extract_school_codes_from_skus([sku])[0]
+    ]
+    print(f"Same codes as before: {'✅ yes' if not mismatches else '❌ NO'} "
+          f"({len(skus):,} sample SKUs)")
+    for sku in mismatches:
+        print(f"  {sku!r}: before {legacy_extract_school_code(sku)!r}, now {extract_school_codes_from_skus([sku])[0]!r}")
+
+    run("Sample export", skus)
+    run(f"{expansion}x expansion", expand_skus(skus, expansion))
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
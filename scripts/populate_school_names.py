@@ -10,8 +10,13 @@ Usage:
 """
 
 import boto3
-from boto3.dynamodb.conditions import Key
 import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from dynamo_scan import scan_items
 
 # Initialize DynamoDB
 dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
@@ -115,8 +120,7 @@ def check_existing_schools():
     existing = []
 
     try:
-        response = college_db_table.scan()
-        existing = [item.get('school_code') for item in response.get('Items', [])]
+        existing = [item.get('school_code') for item in scan_items(college_db_table, projection=['school_code'])]
         print(f"Found {len(existing)} existing schools: {', '.join(existing[:10])}{'...' if len(existing) > 10 else ''}")
     except Exception as e:
         print(f"Error checking existing schools: {e}")
@@ -178,24 +182,24 @@ def verify_lookups():
     """Verify a few school lookups work
 
     NOTE: Must use scan() since school_code is an attribute, not the partition key.
+    The table is scanned once and the test codes are looked up in memory.
     """
     print("\nVerifying school lookups...")
     test_codes = ['AKN', 'ALA', 'RAD', 'HOUS', 'OSU']
 
+    try:
+        names_by_code = {}
+        for item in scan_items(college_db_table, projection=['school_code', 'school_name']):
+            names_by_code.setdefault(item.get('school_code'), item.get('school_name', 'NOT FOUND'))
+    except Exception as e:
+        print(f"  ❌ ERROR scanning college-db-email: {e}")
+        return
+
     for code in test_codes:
-        try:
-            # Must scan since school_code is not the partition key
-            response = college_db_table.scan(
-                FilterExpression=Attr('school_code').eq(code)
-            )
-            items = response.get('Items', [])
-            if items:
-                name = items[0].get('school_name', 'NOT FOUND')
-                print(f"  ✅ {code:6s} → {name}")
-            else:
-                print(f"  ❌ {code:6s} → NOT FOUND IN TABLE")
-        except Exception as e:
-            print(f"  ❌ {code:6s} → ERROR: {e}")
+        if code in names_by_code:
+            print(f"  ✅ {code:6s} → {names_by_code[code]}")
+        else:
+            print(f"  ❌ {code:6s} → NOT FOUND IN TABLE")
 
 if __name__ == '__main__':
     print("="*60)
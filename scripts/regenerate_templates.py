@@ -11,10 +11,15 @@ Usage:
 """
 
 import boto3
+import os
 import sys
 import requests
 import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from dynamo_scan import scan_items
+
 # Initialize DynamoDB
 dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
 template_instances_table = dynamodb.Table('campaign_template_instances')
@@ -26,8 +31,7 @@ LAMBDA_URL = "https://YOUR-LAMBDA-URL.lambda-url.us-east-1.on.aws"
 def get_all_campaigns():
     """Get all campaign IDs"""
     try:
-        response = campaigns_table.scan(ProjectionExpression='campaign_id')
-        return [item['campaign_id'] for item in response.get('Items', [])]
+        return [item['campaign_id'] for item in scan_items(campaigns_table, projection=['campaign_id'])]
     except Exception as e:
         print(f"Error getting campaigns: {e}")
         return []
@@ -17,6 +17,24 @@ function CampaignBuilder() {
   const [isProcessing, setIsProcessing] = useState(false)
   const [processingStep, setProcessingStep] = useState('')
 
+  // Poll the processing job until it finishes, showing its progress
+  const waitForProcessing = async (campaignId) => {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 2000))
+      const job = await campaignAPI.getProcessingStatus(campaignId)
+
+      if (job.status === 'completed') return job
+      if (job.status === 'failed') throw new Error(job.error || 'Campaign processing failed')
+      if (job.stale) throw new Error('Campaign processing stopped responding')
+
+      if (job.stage === 'writing') {
+        setProcessingStep(`Creating email batches... ${job.records_written || 0} emails (${job.items_per_second || 0}/s)`)
+      } else {
+        setProcessingStep(`Processing campaign data (${(job.stage || 'queued').replace('_', ' ')})...`)
+      }
+    }
+  }
+
   // File upload and processing function
   const uploadAndProcessFile = async (file) => {
     try {
@@ -41,13 +59,9 @@ function CampaignBuilder() {
       setProcessingStep('Uploading product file...')
       toast.info('Uploading product file...')
 
-      // 2. Convert file to base64
-      const base64Content = await fileUtils.fileToBase64(file)
-
-      // 3. Upload file
-      await campaignAPI.uploadFile(campaignId, {
-        file_content: base64Content,
-        file_name: file.name
+      // 2-3. Upload the file straight to S3; the API checks its columns and counts rows
+      await fileUtils.uploadToS3(campaignId, file, (fraction) => {
+        setProcessingStep(`Uploading product file... ${Math.round(fraction * 100)}%`)
       })
 
       setProcessingStep('Analyzing products with AI...')
@@ -82,8 +96,11 @@ function CampaignBuilder() {
       setProcessingStep('Processing campaign data...')
       toast.info('Processing campaign and creating email batches...')
 
-      // 5. Process the campaign (create batches)
-      await campaignAPI.processCampaign(campaignId)
+      // 5. Process the campaign (create batches); large campaigns run as a background job
+      const processResponse = await campaignAPI.processCampaign(campaignId)
+      if (processResponse?.job_id) {
+        await waitForProcessing(campaignId)
+      }
 
       toast.success('Campaign created and processed successfully!')
       setProcessingStep('')
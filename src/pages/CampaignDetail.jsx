@@ -38,6 +38,8 @@ function CampaignDetail() {
     queryKey: ['campaign', id],
     queryFn: () => campaignAPI.getCampaign(id),
     enabled: !!id,
+    // Poll while a campaign-wide send is running so its progress stays current
+    refetchInterval: (query) => (query.state.data?.send_status === 'sending' ? 5000 : false),
   })
 
   // Fetch campaign batches
@@ -65,6 +67,18 @@ function CampaignDetail() {
     }
   })
 
+  // Send all batches mutation
+  const sendAllMutation = useMutation({
+    mutationFn: (campaignId) => emailAPI.sendCampaign(campaignId),
+    onSuccess: () => {
+      queryClient.invalidateQueries({ queryKey: ['campaign-batches', id] })
+      queryClient.invalidateQueries({ queryKey: ['campaign', id] })
+    },
+    onError: (error) => {
+      console.error('Error sending campaign:', error)
+    }
+  })
+
   // Send test emails mutation
   const sendTestMutation = useMutation({
     mutationFn: (campaignId) => emailAPI.sendTest(campaignId),
@@ -93,6 +107,13 @@ function CampaignDetail() {
       icon: Clock,
       label: 'Ready to Send'
     },
+    queued: {
+      color: 'gray',
+      bg: 'bg-gray-100',
+      text: 'text-gray-800',
+      icon: Clock,
+      label: 'Queued'
+    },
     sending: {
       color: 'yellow',
       bg: 'bg-yellow-100',
@@ -107,6 +128,13 @@ function CampaignDetail() {
       icon: CheckCircle,
       label: 'Completed'
     },
+    partial: {
+      color: 'orange',
+      bg: 'bg-orange-100',
+      text: 'text-orange-800',
+      icon: AlertTriangle,
+      label: 'Partially Sent'
+    },
     failed: {
       color: 'red',
       bg: 'bg-red-100',
@@ -128,6 +156,12 @@ function CampaignDetail() {
     )
   }
 
+  const handleSendAll = () => {
+    if (confirm('Send all remaining batches to their recipients? This action cannot be undone.')) {
+      sendAllMutation.mutate(id)
+    }
+  }
+
   const handleSendBatch = (batchNumber) => {
     if (confirm(`Send batch ${batchNumber} to all recipients? This action cannot be undone.`)) {
       sendBatchMutation.mutate({ campaignId: id, batchNumber })
@@ -341,9 +375,23 @@ function CampaignDetail() {
       <div className="card p-6">
         <div className="flex items-center justify-between mb-6">
           <h3 className="text-lg font-semibold text-gray-900">Email Batches</h3>
-          <p className="text-sm text-gray-600">
-            {batches.length} batches • 2,000 emails per batch
-          </p>
+          <div className="flex items-center gap-4">
+            <p className="text-sm text-gray-600">
+              {batches.length} batches • 2,000 emails per batch
+            </p>
+            {batches.some(batch => batch.status === 'ready' || batch.status === 'partial') && (
+              <button
+                onClick={handleSendAll}
+                disabled={sendAllMutation.isPending || campaign.send_status === 'sending'}
+                className="btn-primary flex items-center gap-2"
+              >
+                <Send className="h-4 w-4" />
+                {campaign.send_status === 'sending'
+                  ? `Sending... (${campaign.send_batches_done || 0}/${campaign.send_batches_total || 0} batches)`
+                  : 'Send All Batches'}
+              </button>
+            )}
+          </div>
         </div>
 
         {batchesLoading ? (
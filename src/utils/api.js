@@ -133,6 +133,16 @@ export const campaignAPI = {
   uploadFile: (campaignId, fileData) =>
     campaignApi.post(`/api/campaigns/${campaignId}/upload`, fileData),
 
+  // Direct-to-S3 file upload (presigned multipart; see fileUtils.uploadToS3)
+  createUpload: (campaignId, data) =>
+    campaignApi.post(`/api/campaigns/${campaignId}/upload-url`, data),
+
+  completeUpload: (campaignId, data) =>
+    campaignApi.post(`/api/campaigns/${campaignId}/upload-complete`, data),
+
+  abortUpload: (campaignId, data) =>
+    campaignApi.post(`/api/campaigns/${campaignId}/upload-abort`, data),
+
   // Hero image upload
   uploadHeroImage: (campaignId, imageData) =>
     campaignApi.post(`/api/campaigns/${campaignId}/upload-hero-image`, imageData),
@@ -141,6 +151,13 @@ export const campaignAPI = {
   processCampaign: (campaignId) =>
     campaignApi.post(`/api/campaigns/${campaignId}/process`),
 
+  getProcessingStatus: (campaignId) =>
+    campaignApi.get(`/api/campaigns/${campaignId}/process-status`),
+
+  // Dry run: projected recipients, batches and send time, nothing written
+  planCampaign: (campaignId) =>
+    campaignApi.get(`/api/campaigns/${campaignId}/plan`),
+
   // AI generation
   aiGenerateContent: (campaignId) =>
     campaignApi.post(`/api/campaigns/${campaignId}/ai-generate`),
@@ -198,6 +215,10 @@ export const emailAPI = {
   // Send test emails
   sendTest: (campaignId) => 
     emailApi.post(`/api/campaigns/${campaignId}/send-test`),
+
+  // Send every unsent batch, several at a time
+  sendCampaign: (campaignId, options = {}) =>
+    emailApi.post(`/api/campaigns/${campaignId}/send-all`, options),
 }
 
 // File utilities
@@ -216,6 +237,39 @@ export const fileUtils = {
     })
   },
   
+  // Upload a product file straight to S3 in presigned parts, then let the API validate it
+  uploadToS3: async (campaignId, file, onProgress) => {
+    const upload = await campaignAPI.createUpload(campaignId, {
+      file_name: file.name,
+      file_size: file.size
+    })
+
+    try {
+      const parts = []
+      for (const part of upload.parts) {
+        const start = (part.part_number - 1) * upload.part_size
+        const response = await fetch(part.url, {
+          method: 'PUT',
+          body: file.slice(start, start + upload.part_size)
+        })
+        if (!response.ok) {
+          throw new Error(`Upload of part ${part.part_number} failed with status ${response.status}`)
+        }
+        parts.push({ part_number: part.part_number, etag: response.headers.get('ETag') })
+        onProgress?.(parts.length / upload.parts.length)
+      }
+
+      return await campaignAPI.completeUpload(campaignId, {
+        upload_id: upload.upload_id,
+        s3_key: upload.s3_key,
+        parts
+      })
+    } catch (error) {
+      campaignAPI.abortUpload(campaignId, { upload_id: upload.upload_id, s3_key: upload.s3_key }).catch(() => {})
+      throw error
+    }
+  },
+
   // Validate file
   validateFile: (file) => {
     const errors = []
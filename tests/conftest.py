@@ -0,0 +1,71 @@
+"""
+Shared pytest setup
+
+The Lambda modules are flat files in lambda_functions/ (that is how they are zipped
+and deployed), so that directory goes on sys.path. Nothing here talks to AWS: tests
+use moto or inject stub clients, and dummy credentials keep boto3 from looking for
+real ones. moto is imported before any Lambda module so the clients those modules
+create at import time are mocked too.
+
+Run from the repository root:
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+os.environ['AWS_SESSION_TOKEN'] = 'testing'
+os.environ.pop('AWS_LAMBDA_FUNCTION_NAME', None)  # Background work runs in-process, never via Lambda
+
+import boto3  # noqa: E402
+import moto  # noqa: E402
+import pytest  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+
+@pytest.fixture
+def aws():
+    """Mocked AWS for the duration of a test"""
+    with moto.mock_aws():
+        yield
+
+
+@pytest.fixture
+def create_table(aws):
+    """Factory for moto DynamoDB tables: create_table(name, hash_key, range_key=None, indexes=())
+
+    Key attributes are strings unless named 'batch_number'. indexes are
+    (index_name, hash_key, range_key) tuples, projecting all attributes.
+    """
+    dynamodb = boto3.resource('dynamodb', region_name=os.environ['AWS_DEFAULT_REGION'])
+
+    def attribute(name):
+        return {'AttributeName': name, 'AttributeType': 'N' if name == 'batch_number' else 'S'}
+
+    def key_schema(hash_key, range_key):
+        schema = [{'AttributeName': hash_key, 'KeyType': 'HASH'}]
+        if range_key:
+            schema.append({'AttributeName': range_key, 'KeyType': 'RANGE'})
+        return schema
+
+    def create(name, hash_key, range_key=None, indexes=()):
+        names = {hash_key, range_key} | {key for _, *keys in indexes for key in keys}
+        kwargs = {
+            'TableName': name,
+            'KeySchema': key_schema(hash_key, range_key),
+            'AttributeDefinitions': [attribute(key) for key in sorted(names - {None})],
+            'BillingMode': 'PAY_PER_REQUEST',
+        }
+        if indexes:
+            kwargs['GlobalSecondaryIndexes'] = [
+                {'IndexName': index_name, 'KeySchema': key_schema(index_hash, index_range), 'Projection': {'ProjectionType': 'ALL'}}
+                for index_name, index_hash, index_range in indexes
+            ]
+        return dynamodb.create_table(**kwargs)
+
+    return create
@@ -0,0 +1,50 @@
+"""BatchProgress: the resume point of a batch send (lambda_email_sender)"""
+
+from lambda_email_sender import BatchProgress
+
+
+def record(record_id, batch_number=1):
+    item = {'campaign_id': 'c1', 'record_id': record_id}
+    if batch_number is not None:
+        item['batch_number'] = batch_number
+    return item
+
+
+def test_resume_key_waits_for_earlier_records():
+    progress = BatchProgress()
+    first, second, third = record('r1'), record('r2'), record('r3')
+    for item in (first, second, third):
+        progress.started(item)
+
+    progress.finished(second)
+    assert progress.resume_key is None  # r1 is still in flight
+
+    progress.finished(first)
+    assert progress.resume_key == {'campaign_id': 'c1', 'record_id': 'r2', 'batch_number': 1}
+
+    progress.finished(third)
+    assert progress.resume_key['record_id'] == 'r3'
+    assert progress.processed == 3
+
+
+def test_placeholder_test_records_never_become_the_resume_point():
+    # send-test builds placeholder records without a batch_number for schools with no products
+    progress = BatchProgress()
+    placeholder = record('test_a@example.com', batch_number=None)
+    progress.started(placeholder)
+    progress.finished(placeholder)
+
+    assert progress.resume_key is None
+    assert progress.processed == 1
+
+
+def test_placeholder_does_not_hold_back_later_records():
+    progress = BatchProgress({'campaign_id': 'c1', 'record_id': 'r0', 'batch_number': 1})
+    placeholder, real = record('test_a@example.com', batch_number=None), record('r1')
+    progress.started(placeholder)
+    progress.started(real)
+    progress.finished(placeholder)
+    assert progress.resume_key['record_id'] == 'r0'
+
+    progress.finished(real)
+    assert progress.resume_key['record_id'] == 'r1'
@@ -0,0 +1,99 @@
+"""CampaignRecordDiff: incremental reprocessing of campaign_data (lambda_campaign_manager)"""
+
+from lambda_campaign_manager import CampaignRecordDiff, campaign_record_id, record_fingerprint
+
+
+def generated(email, school_code='ALA'):
+    """A record as iter_campaign_records yields it"""
+    return {
+        'campaign_id': 'c1', 'record_id': campaign_record_id('c1', email), 'customer_email': email,
+        'customer_name': email.split('@')[0], 'school_code': school_code, 'email_sent': False,
+    }
+
+
+def stored(record_id, email, batch_number=1, sent=False, school_code='ALA'):
+    """A load_stored_records entry"""
+    delivery = {'email_sent': sent, 'created_at': '2026-01-01T00:00:00'}
+    if sent:
+        delivery['sent_at'] = '2026-01-02T00:00:00'
+    return record_id, {
+        'batch_number': batch_number,
+        'email': email.lower(),
+        'fingerprint': record_fingerprint(generated(email, school_code)),
+        'delivery': delivery,
+    }
+
+
+def apply(diff, records):
+    written = list(diff.records_to_write(records))
+    removed = list(diff.removed_record_ids())
+    return written, removed
+
+
+def test_legacy_records_are_matched_by_email():
+    diff = CampaignRecordDiff(dict([
+        stored('c1_0', 'Ann@Example.com', sent=True),
+        stored('c1_1', 'bob@example.com', sent=True),
+        stored('c1_2', 'cy@example.com'),
+    ]))
+
+    written, removed = apply(diff, [
+        generated('Ann@Example.com'),  # Unchanged
+        generated('bob@example.com', school_code='MIC'),  # Changed
+        generated('cy@example.com'),
+        generated('dee@example.com'),  # New
+    ])
+
+    assert removed == []
+    assert [record['record_id'] for record in written] == ['c1_1', campaign_record_id('c1', 'dee@example.com')]
+    bob = written[0]
+    assert (bob['batch_number'], bob['email_sent'], bob['sent_at']) == (1, True, '2026-01-02T00:00:00')
+    assert (written[1]['batch_number'], written[1]['email_sent']) == (2, False)
+    assert diff.counts == {'new': 1, 'changed': 1, 'unchanged': 2, 'removed': 0, 'duplicates': 0, 'matched_by_email': 3, 'kept_sent': 0}
+    assert diff.batch_sizes == {1: 3, 2: 1}
+
+
+def test_an_email_listed_twice_matches_one_stored_record():
+    diff = CampaignRecordDiff(dict([stored('c1_0', 'ann@example.com', sent=True)]))
+
+    written, removed = apply(diff, [generated('ann@example.com'), generated('ANN@example.com')])
+
+    assert (written, removed) == ([], [])
+    assert (diff.counts['unchanged'], diff.counts['duplicates']) == (1, 1)
+
+
+def test_dropped_recipients_keep_their_record_once_sent():
+    diff = CampaignRecordDiff(dict([
+        stored(campaign_record_id('c1', 'ann@example.com'), 'ann@example.com', batch_number=1, sent=True),
+        stored(campaign_record_id('c1', 'bob@example.com'), 'bob@example.com', batch_number=1),
+        stored('c1_7', 'cy@example.com', batch_number=2, sent=True),
+    ]))
+
+    written, removed = apply(diff, [])
+
+    assert written == []
+    assert removed == [campaign_record_id('c1', 'bob@example.com')]
+    assert (diff.counts['removed'], diff.counts['kept_sent']) == (1, 2)
+    assert diff.batch_sizes == {1: 1, 2: 1}  # Kept records still count towards their batch
+
+
+def test_delete_sent_removes_sent_records_too():
+    diff = CampaignRecordDiff(dict([stored('c1_0', 'ann@example.com', sent=True), stored('c1_1', 'bob@example.com')]), delete_sent=True)
+
+    assert apply(diff, []) == ([], ['c1_0', 'c1_1'])
+    assert (diff.counts['removed'], diff.counts['kept_sent']) == (2, 0)
+
+
+def test_recipient_who_comes_back_is_not_sent_again():
+    ann_id = campaign_record_id('c1', 'ann@example.com')
+    stored_records = dict([stored(ann_id, 'ann@example.com', sent=True)])
+
+    # Run 1: Ann's school is no longer in the product file
+    assert apply(CampaignRecordDiff(stored_records), []) == ([], [])
+
+    # Run 2: she is back, with different products
+    diff = CampaignRecordDiff(stored_records)
+    written, removed = apply(diff, [generated('ann@example.com', school_code='MIC')])
+
+    assert removed == []
+    assert [(record['record_id'], record['email_sent']) for record in written] == [(ann_id, True)]
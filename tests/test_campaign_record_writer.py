@@ -0,0 +1,23 @@
+"""CampaignRecordWriter: parallel campaign_data writes (lambda_campaign_manager)"""
+
+from lambda_campaign_manager import CampaignRecordWriter
+
+
+def test_writes_records_marks_batches_ready_and_deletes(create_table):
+    data = create_table('campaign_data', 'campaign_id', 'record_id')
+    batches = create_table('campaign_batches', 'campaign_id', 'batch_number')
+    data.put_item(Item={'campaign_id': 'c1', 'record_id': 'gone', 'batch_number': 1})
+
+    records = [
+        {'campaign_id': 'c1', 'record_id': f'r{index:02}', 'batch_number': 1 + index // 30,
+         'customer_email': f'user{index}@example.com', 'email_sent': False}
+        for index in range(40)
+    ]
+    result = CampaignRecordWriter('c1', workers=3).write(iter(records), deleted_record_ids=['gone'])
+
+    assert (result['records'], result['deleted'], result['batches']) == (40, 1, 2)
+    stored = {item['record_id']: item for item in data.scan()['Items']}
+    assert sorted(stored) == [record['record_id'] for record in records]
+    assert stored['r35'] == dict(records[35], batch_number=2)
+    ready = sorted((int(item['batch_number']), item['status'], int(item['total_emails'])) for item in batches.scan()['Items'])
+    assert ready == [(1, 'ready', 30), (2, 'ready', 10)]
@@ -0,0 +1,131 @@
+"""CompiledEmailTemplate against the original sequential str.replace renderer (lambda_email_sender)"""
+
+import pytest
+
+import lambda_email_sender
+from lambda_email_sender import CompiledEmailTemplate, generate_products_html
+
+SCHOOLS = {'ALA': 'University of Alabama', 'MIC': 'University of Michigan'}
+
+TEMPLATE_HTML = (
+    '<title>{{CAMPAIGN_TITLE}}</title><p>{{GREETING_TEXT}}</p><h1>{{MAIN_TITLE}}</h1>'
+    '<h2>{{PRODUCTS_TITLE}}</h2><h3>{{PRODUCTS_SUBTITLE}}</h3><p>{{DESCRIPTION_TEXT}}</p>'
+    '<a href="{{HERO_LINK}}"><img src="{{HERO_IMAGE_URL}}"></a>{{PRODUCTS_HTML}}'
+    '<a href="{{CTA_LINK}}">Shop {{TEAM_NAME}}</a><a href="{{CTA_SECONDARY_LINK}}">{{SCHOOL_PAGE}}</a>'
+)
+
+CONFIGS = {
+    'defaults': {},
+    'static': {'CAMPAIGN_TITLE': 'Spring Drop', 'MAIN_TITLE': 'New {{TEAM_NAME}} gear', 'CTA_PRIMARY_LINK': 'https://example.com'},
+    'placeholders_in_fallbacks': {
+        'GREETING_TEXT': 'Hey {{TEAM_NAME}} fan, see {{PRODUCTS_TITLE}} at {{CTA_LINK}}',
+        'PRODUCTS_SUBTITLE': 'Picked for {{TEAM_NAME}}: {{DESCRIPTION_TEXT}}',
+        'DESCRIPTION_TEXT': 'Made for you ({{HERO_IMAGE_URL}})',
+        'PRODUCTS_TITLE': 'ignored {{TEAM_NAME}}',
+        'MAIN_TITLE': '{{GREETING_TEXT}} {{PRODUCTS_TITLE}}',
+    },
+}
+
+PRODUCT = {
+    'product_name_1': 'Hoodie', 'product_image_1': 'https://example.com/hoodie.png',
+    'product_link_1': 'https://example.com/hoodie', 'product_price_1': '49.99',
+}
+
+RECIPIENTS = {
+    'named': dict(PRODUCT, recipient_name='Ann', school_code='ALA', school_page='https://example.com/ala',
+                  school_logo='https://example.com/ala.png'),
+    'customer_name_only': dict(PRODUCT, customer_name='Bob', school_code='MIC'),
+    'missing_name': dict(PRODUCT, school_code='ALA', school_page='https://example.com/ala'),
+    'blank_name': dict(PRODUCT, recipient_name='', customer_name='', school_code='MIC'),
+    'unknown_school': dict(PRODUCT, school_code='ZZZ'),
+    'empty': {},
+}
+
+
+def sequential_render(template_html_raw, template_config, recipient):
+    """The renderer CompiledEmailTemplate replaced: one str.replace over the whole HTML per placeholder"""
+    html = template_html_raw
+    for key, value in template_config.items():
+        if key not in ['PRODUCTS_HTML', 'GREETING_TEXT', 'PRODUCTS_TITLE', 'PRODUCTS_SUBTITLE', 'DESCRIPTION_TEXT']:
+            html = html.replace('{{' + key + '}}', str(value))
+
+    recipient_name = recipient.get('recipient_name', '') or recipient.get('customer_name', '')
+    html = html.replace('{{GREETING_TEXT}}', f"Hi {recipient_name}," if recipient_name else template_config.get('GREETING_TEXT', 'Hi there,'))
+
+    school_code = recipient.get('school_code', '')
+    team_name = lambda_email_sender.get_school_name_from_code(school_code) if school_code else ''
+    known = team_name and team_name != school_code
+    html = html.replace('{{TEAM_NAME}}', team_name if known else school_code or 'Your Team')
+    html = html.replace('{{PRODUCTS_TITLE}}', f"Featured {team_name if known else school_code} Collection" if school_code else "Featured Collection")
+    html = html.replace('{{PRODUCTS_SUBTITLE}}', f"Show your {team_name} pride with these exclusive items!" if known
+                        else template_config.get('PRODUCTS_SUBTITLE', 'We\'ve selected these exclusive items just for you!'))
+    if school_code:
+        description = f"Discover exclusive {team_name if known else school_code} gear designed for true fans! Show your school pride with our personalized collection. Get yours today and represent your team!"
+    else:
+        description = template_config.get('DESCRIPTION_TEXT', 'Discover something special just for you!')
+    html = html.replace('{{DESCRIPTION_TEXT}}', description)
+
+    product_count = sum(1 for i in range(1, 5) if recipient.get(f'product_image_{i}'))
+    html = html.replace('{{PRODUCTS_HTML}}', generate_products_html(recipient, product_count, team_name or school_code))
+
+    school_page = recipient.get('school_page', template_config.get('CTA_PRIMARY_LINK', '#'))
+    for placeholder in ('HERO_LINK', 'CTA_LINK', 'SCHOOL_PAGE', 'CTA_SECONDARY_LINK'):
+        html = html.replace('{{' + placeholder + '}}', school_page)
+    if recipient.get('school_logo', ''):
+        html = html.replace('{{HERO_IMAGE_URL}}', recipient['school_logo'])
+    return html
+
+
+@pytest.fixture(autouse=True)
+def school_names(monkeypatch):
+    monkeypatch.setattr(lambda_email_sender, 'get_school_name_from_code', lambda school_code: SCHOOLS.get(school_code, school_code))
+
+
+@pytest.mark.parametrize('recipient', RECIPIENTS.values(), ids=RECIPIENTS.keys())
+@pytest.mark.parametrize('config', CONFIGS.values(), ids=CONFIGS.keys())
+def test_compiled_render_matches_sequential_replace(config, recipient):
+    compiled = CompiledEmailTemplate(TEMPLATE_HTML, config)
+
+    expected = sequential_render(TEMPLATE_HTML, config, recipient)
+    assert compiled.render_for_recipient(recipient) == expected
+    # Again from the school document cache
+    assert compiled.render_for_recipient(recipient) == expected
+    assert compiled.render(compiled.values_for_recipient(recipient)) == expected
+
+
+def test_greeting_fallback_gets_the_recipients_team():
+    compiled = CompiledEmailTemplate('<p>{{GREETING_TEXT}}</p>', CONFIGS['placeholders_in_fallbacks'])
+
+    html = compiled.render_for_recipient(RECIPIENTS['missing_name'])
+
+    assert html.startswith('<p>Hey University of Alabama fan, see Featured University of Alabama Collection at https://example.com/ala')
+    assert '{{' not in html
+
+
+def test_recipients_at_one_school_share_a_document():
+    compiled = CompiledEmailTemplate(TEMPLATE_HTML, CONFIGS['placeholders_in_fallbacks'])
+
+    ann = compiled.render_for_recipient(RECIPIENTS['named'])
+    unnamed = dict(RECIPIENTS['named'], recipient_name='')
+    assert compiled.render_for_recipient(dict(RECIPIENTS['named'], recipient_name='Cy')) == ann.replace('Hi Ann,', 'Hi Cy,')
+    assert compiled.render_for_recipient(unnamed) == sequential_render(TEMPLATE_HTML, CONFIGS['placeholders_in_fallbacks'], unnamed)
+    assert compiled.fragment_cache_stats() == {'documents': 1, 'hits': 2, 'misses': 1, 'prerendered_hits': 0}
+
+    # Other products at the same school are another document
+    compiled.render_for_recipient(dict(RECIPIENTS['named'], product_price_1='39.99'))
+    assert (compiled.fragment_cache_stats()['documents'], compiled.fragment_misses) == (2, 2)
+
+
+def test_fragment_cache_evicts_the_least_recently_used_document(monkeypatch):
+    monkeypatch.setattr(lambda_email_sender, 'FRAGMENT_CACHE_SIZE', 2)
+    compiled = CompiledEmailTemplate(TEMPLATE_HTML, {})
+    ala, mic, unknown = RECIPIENTS['named'], RECIPIENTS['customer_name_only'], RECIPIENTS['unknown_school']
+
+    for recipient in (ala, mic, ala, unknown):  # unknown evicts mic, the least recently used
+        compiled.render_for_recipient(recipient)
+    assert (compiled.fragment_hits, compiled.fragment_misses) == (1, 3)
+
+    compiled.render_for_recipient(ala)
+    compiled.render_for_recipient(mic)
+    assert (compiled.fragment_hits, compiled.fragment_misses) == (2, 4)
+    assert compiled.fragment_cache_stats()['documents'] == 2
@@ -0,0 +1,36 @@
+"""Reading a campaign's customers per school (lambda_campaign_manager)"""
+
+import pytest
+
+import lambda_campaign_manager
+from lambda_campaign_manager import count_customers_by_school, load_customers_by_school
+
+CUSTOMERS = [
+    ('ann@example.com', 'ALA'), ('bob@example.com', 'ALA'), ('cy@example.com', 'MIC'), ('dee@example.com', 'OSU'),
+]
+
+
+@pytest.fixture
+def customers(create_table):
+    table = create_table('college_email_campaign', 'customer_email', indexes=[('SchoolIndex', 'school_code', None)])
+    for email, school_code in CUSTOMERS:
+        table.put_item(Item={'customer_email': email, 'customer_name': email.split('@')[0], 'school_code': school_code,
+                             'source': 'shopify', 'notes': 'not projected'})
+    return table
+
+
+def test_query_customers_through_the_school_index(customers, monkeypatch):
+    monkeypatch.setattr(lambda_campaign_manager, 'CUSTOMER_SCHOOL_INDEX', 'SchoolIndex')
+
+    by_school = load_customers_by_school(['ALA', 'MIC', 'NONE'])
+
+    assert sorted(customer['customer_email'] for customer in by_school['ALA']) == ['ann@example.com', 'bob@example.com']
+    assert by_school['MIC'] == [{'customer_email': 'cy@example.com', 'customer_name': 'cy', 'school_code': 'MIC', 'source': 'shopify'}]
+    assert by_school['NONE'] == []
+
+
+@pytest.mark.parametrize('index_name', ['SchoolIndex', ''])
+def test_count_customers_with_and_without_the_index(customers, monkeypatch, index_name):
+    monkeypatch.setattr(lambda_campaign_manager, 'CUSTOMER_SCHOOL_INDEX', index_name)
+
+    assert count_customers_by_school(['ALA', 'MIC', 'NONE']) == {'ALA': 2, 'MIC': 1, 'NONE': 0}
@@ -0,0 +1,31 @@
+"""scan_items: paginated and parallel table scans (dynamo_scan)"""
+
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.conditions import Attr
+
+from dynamo_scan import scan_items
+
+
+@pytest.fixture
+def table(create_table):
+    table = create_table('test_users', 'email')
+    for index in range(25):
+        table.put_item(Item={'email': f'user{index:02}@example.com', 'active': index % 5 != 0, 'rank': index})
+    return table
+
+
+@pytest.mark.parametrize('segments', [1, 4])
+def test_scans_every_page(table, segments):
+    items = list(scan_items(table, segments=segments, page_size=4))
+
+    assert sorted(item['email'] for item in items) == [f'user{index:02}@example.com' for index in range(25)]
+    assert {'email': 'user07@example.com', 'active': True, 'rank': Decimal(7)} in items
+
+
+@pytest.mark.parametrize('segments', [1, 3])
+def test_condition_and_projection(table, segments):
+    items = list(scan_items(table, projection=['email'], condition=Attr('active').eq(False), segments=segments, page_size=4))
+
+    assert sorted(items, key=lambda item: item['email']) == [{'email': f'user{index:02}@example.com'} for index in range(0, 25, 5)]
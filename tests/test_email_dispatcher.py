@@ -0,0 +1,206 @@
+"""EmailDispatcher: concurrent sends, retries and AdaptiveSendRate (lambda_email_sender)"""
+
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+import lambda_email_sender
+from lambda_email_sender import (
+    SES_MAX_SEND_ATTEMPTS, SES_RETRY_BASE_SECONDS, AdaptiveSendRate, EmailDispatcher, RetryableSendError
+)
+
+
+class StubRateLimiter:
+    def __init__(self, rate=10.0):
+        self.rate = rate
+        self.acquired = []
+
+    def acquire(self, tokens=1):
+        self.acquired.append(tokens)
+        return 0.0
+
+    def set_rate(self, rate):
+        self.rate = rate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def scripted_send(*outcomes):
+    """send_fn returning (or raising) the given outcomes in turn, recording each recipient"""
+    outcomes = list(outcomes)
+    calls = []
+
+    def send(recipient, subject, html_body):
+        calls.append(recipient)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    send.calls = calls
+    return send
+
+
+def run_one(dispatcher, email='ann@example.com'):
+    results = []
+    dispatcher.run([({'customer_email': email}, 'subject', '<p>hi</p>')], lambda record, sent: results.append(sent))
+    return results
+
+
+def test_throttling_lowers_the_rate_and_clean_sends_raise_it_again():
+    limiter, clock = StubRateLimiter(), FakeClock()
+    control = AdaptiveSendRate(limiter, 10, clock=clock)
+
+    control.on_throttle()
+    assert limiter.rate == control.rate == 7.5
+    control.on_throttle()  # Requests in flight at the same moment count once
+    assert control.rate == 7.5
+
+    clock.now += 1
+    control.on_throttle()
+    assert (control.rate, control.lowest_rate, control.decreases) == (5.625, 5.625, 2)
+
+    control.on_success()
+    assert limiter.rate == pytest.approx(5.625 + 1 / 5.625)
+    control.on_success(messages=1000)
+    assert limiter.rate == control.rate == 10  # Never above the configured rate
+
+
+def test_throttled_send_is_retried_after_a_backoff_and_lowers_the_rate():
+    limiter, sleeps = StubRateLimiter(), []
+    send = scripted_send(RetryableSendError('Throttling', 'Maximum sending rate exceeded.', throttled=True), True)
+    dispatcher = EmailDispatcher(send_fn=send, workers=1, rate_limiter=limiter, sleep=sleeps.append)
+
+    assert run_one(dispatcher) == [True]
+
+    assert send.calls == ['ann@example.com'] * 2
+    assert limiter.acquired == [1, 1]  # The retry is paced too
+    assert len(sleeps) == 1 and 0 <= sleeps[0] <= SES_RETRY_BASE_SECONDS
+    assert dispatcher.rate_control.decreases == 1
+    assert 7.5 < limiter.rate < 10  # Lowered, then raised a little by the successful retry
+    stats = dispatcher.stats.summary()
+    assert (stats['sent'], stats['failed'], stats['retries'], stats['throttled']) == (1, 0, 1, 1)
+
+
+def test_transient_errors_are_retried_until_the_attempts_run_out():
+    sleeps = []
+    send = scripted_send(*[RetryableSendError('ServiceUnavailable', 'Try again')] * SES_MAX_SEND_ATTEMPTS)
+    dispatcher = EmailDispatcher(send_fn=send, workers=1, rate_limiter=StubRateLimiter(), sleep=sleeps.append)
+
+    assert run_one(dispatcher) == [False]
+
+    assert len(send.calls) == SES_MAX_SEND_ATTEMPTS
+    assert len(sleeps) == SES_MAX_SEND_ATTEMPTS - 1
+    assert all(0 <= pause <= SES_RETRY_BASE_SECONDS * 2 ** attempt for attempt, pause in enumerate(sleeps))
+    assert dispatcher.rate_control.decreases == 0  # Transient errors aren't throttling
+    assert dispatcher.stats.summary()['failed'] == 1
+
+
+class StubSes:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def send_email(self, **kwargs):
+        self.calls += 1
+        raise self.error
+
+
+def test_daily_quota_is_not_retried_and_counts_as_failed(monkeypatch):
+    ses = StubSes(ClientError({'Error': {'Code': 'Throttling', 'Message': 'Daily message quota exceeded.'}}, 'SendEmail'))
+    monkeypatch.setattr(lambda_email_sender, 'ses', ses)
+    sleeps = []
+    dispatcher = EmailDispatcher(workers=1, rate_limiter=StubRateLimiter(), sleep=sleeps.append)
+
+    assert run_one(dispatcher) == [False]
+
+    assert (ses.calls, sleeps) == (1, [])
+    assert dispatcher.rate_control.decreases == 0
+    stats = dispatcher.stats.summary()
+    assert (stats['failed'], stats['retries']) == (1, 0)
+
+
+def test_ses_rate_throttling_is_retried_through_send_email_ses(monkeypatch):
+    ses = StubSes(ClientError({'Error': {'Code': 'Throttling', 'Message': 'Maximum sending rate exceeded.'}}, 'SendEmail'))
+    monkeypatch.setattr(lambda_email_sender, 'ses', ses)
+    dispatcher = EmailDispatcher(workers=1, rate_limiter=StubRateLimiter(), sleep=lambda seconds: None)
+
+    assert run_one(dispatcher) == [False]
+
+    assert ses.calls == SES_MAX_SEND_ATTEMPTS
+    assert dispatcher.stats.summary()['throttled'] == SES_MAX_SEND_ATTEMPTS - 1
+
+
+def messages(count, consumed):
+    """count messages, appending each index to consumed as the dispatcher pulls it"""
+    for index in range(count):
+        consumed.append(index)
+        yield {'customer_email': f'user{index}@example.com', 'index': index}, 'subject', '<p>hi</p>'
+
+
+def test_every_message_is_reported_once_on_the_calling_thread():
+    outcomes = {'user3@example.com': False}
+    errors = {'user5@example.com': RuntimeError('connection reset')}
+
+    def send(recipient, subject, html_body):
+        if recipient in errors:
+            raise errors[recipient]
+        return outcomes.get(recipient, True)
+
+    reported = []
+    caller = threading.current_thread()
+
+    def on_result(record, sent):
+        assert threading.current_thread() is caller
+        reported.append((record['index'], sent))
+
+    dispatcher = EmailDispatcher(send_fn=send, workers=4, rate_limiter=StubRateLimiter())
+    assert dispatcher.run(messages(50, []), on_result) is True
+
+    assert sorted(reported) == [(index, index not in (3, 5)) for index in range(50)]
+    assert dispatcher.stats.summary()['messages'] == 50
+
+
+def test_no_more_than_twice_the_workers_are_in_flight():
+    release = threading.Event()
+    consumed, reported = [], []
+
+    def send(recipient, subject, html_body):
+        assert release.wait(10)
+        return True
+
+    dispatcher = EmailDispatcher(send_fn=send, workers=3, rate_limiter=StubRateLimiter())
+    runner = threading.Thread(target=dispatcher.run, args=(messages(20, consumed), lambda record, sent: reported.append(record['index'])))
+    runner.start()
+
+    try:
+        # With every send blocked, the dispatcher pulls 6 messages into flight and holds the 7th
+        deadline = time.monotonic() + 5
+        while len(consumed) < 7 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        assert len(consumed) == 7
+    finally:
+        release.set()
+        runner.join(10)
+    assert sorted(reported) == list(range(20))
+
+
+def test_should_stop_ends_the_run_after_messages_already_pulled():
+    consumed, reported = [], []
+    dispatcher = EmailDispatcher(send_fn=lambda recipient, subject, html_body: True, workers=2, rate_limiter=StubRateLimiter())
+
+    completed = dispatcher.run(messages(20, consumed), lambda record, sent: reported.append(record['index']),
+                               should_stop=lambda: len(consumed) >= 5)
+
+    assert completed is False
+    assert consumed == [0, 1, 2, 3, 4]
+    assert sorted(reported) == consumed
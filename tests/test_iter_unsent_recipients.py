@@ -0,0 +1,26 @@
+"""iter_unsent_recipients: streaming a batch from the BatchIndex GSI (lambda_email_sender)"""
+
+from lambda_email_sender import iter_unsent_recipients
+
+
+def test_streams_every_page_of_unsent_records(create_table):
+    table = create_table('campaign_data', 'campaign_id', 'record_id', indexes=[('BatchIndex', 'campaign_id', 'batch_number')])
+    for index in range(12):
+        table.put_item(Item={
+            'campaign_id': 'c1', 'record_id': f'r{index:02}', 'batch_number': 1 + index // 10,
+            'email_sent': index % 3 == 0, 'customer_email': f'user{index}@example.com', 'notes': 'not projected',
+        })
+
+    records = list(iter_unsent_recipients('c1', 1, page_size=3))
+
+    assert [record['record_id'] for record in records] == ['r01', 'r02', 'r04', 'r05', 'r07', 'r08']
+    assert records[0] == {'campaign_id': 'c1', 'record_id': 'r01', 'batch_number': 1, 'customer_email': 'user1@example.com'}
+
+
+def test_resumes_after_the_checkpointed_record(create_table):
+    table = create_table('campaign_data', 'campaign_id', 'record_id', indexes=[('BatchIndex', 'campaign_id', 'batch_number')])
+    for index in range(5):
+        table.put_item(Item={'campaign_id': 'c1', 'record_id': f'r{index}', 'batch_number': 1, 'email_sent': False})
+
+    resume_key = {'campaign_id': 'c1', 'record_id': 'r2', 'batch_number': 1}
+    assert [record['record_id'] for record in iter_unsent_recipients('c1', 1, page_size=2, resume_key=resume_key)] == ['r3', 'r4']
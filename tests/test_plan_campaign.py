@@ -0,0 +1,90 @@
+"""Dry-run planning of a campaign through GET /plan (lambda_campaign_manager)"""
+
+import json
+
+import boto3
+import pytest
+
+import lambda_campaign_manager
+from lambda_campaign_manager import lambda_handler
+
+PRODUCTS = {
+    school_code: [{'handle': f'{school_code.lower()}-{kind}', 'image': f'https://example.com/{school_code}-{kind}.png',
+                   'price': '49.99', 'title': f'{school_code} {kind}', 'school_page': '', 'school_logo': ''}
+                  for kind in kinds]
+    for school_code, kinds in (('ALA', ('hoodie', 'cap')), ('MIC', ('hoodie',)), ('OSU', ('mug',)))
+}
+CUSTOMERS = [
+    ('ann@example.com', 'ALA'), ('bob@example.com', 'ALA'), ('cy@example.com', 'ALA'),
+    ('dee@example.com', 'MIC'), ('eve@example.com', 'MIC'), ('fay@example.com', 'TEX'),
+]
+
+
+@pytest.fixture
+def campaign(create_table, monkeypatch):
+    extracted = []
+
+    def extract_campaign_products(s3_key, save_artifact=True):
+        extracted.append((s3_key, save_artifact))
+        return PRODUCTS
+
+    monkeypatch.setattr(lambda_campaign_manager, 'extract_campaign_products', extract_campaign_products)
+    monkeypatch.setattr(lambda_campaign_manager, 'CUSTOMER_SCHOOL_INDEX', '')
+    monkeypatch.setattr(lambda_campaign_manager, 'EMAILS_PER_BATCH', 2)
+    monkeypatch.setattr(lambda_campaign_manager, 'EMAILS_PER_SECOND', 0.5)
+
+    campaigns = create_table('email_campaigns', 'campaign_id')
+    campaigns.put_item(Item={'campaign_id': 'c1', 'status': 'draft', 'file_s3_key': 'uploads/c1/products.csv'})
+    campaigns.put_item(Item={'campaign_id': 'c2', 'status': 'draft'})
+    customers = create_table('college_email_campaign', 'customer_email')
+    for email, school_code in CUSTOMERS:
+        customers.put_item(Item={'customer_email': email, 'customer_name': email.split('@')[0], 'school_code': school_code})
+    create_table('campaign_data', 'campaign_id', 'record_id')
+    create_table('campaign_batches', 'campaign_id', 'batch_number')
+    return campaigns, extracted
+
+
+def plan(campaign_id):
+    event = {'requestContext': {'http': {'method': 'GET'}}, 'rawPath': f'/api/campaigns/{campaign_id}/plan'}
+    response = lambda_handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_plan_projects_recipients_batches_and_send_time(campaign):
+    status_code, planned = plan('c1')
+
+    assert status_code == 200
+    assert (planned['total_records'], planned['total_batches'], planned['estimated_send_seconds']) == (5, 3, 10)
+    assert (planned['schools_processed'], planned['schools_with_recipients'], planned['products_found']) == (3, 2, 4)
+    assert (planned['emails_per_batch'], planned['emails_per_second']) == (2, 0.5)
+    assert planned['schools'] == [
+        {'school_code': 'ALA', 'products': 2, 'recipients': 3},
+        {'school_code': 'MIC', 'products': 1, 'recipients': 2},
+        {'school_code': 'OSU', 'products': 1, 'recipients': 0},
+    ]
+    # Filled school by school, like process_campaign lays out a first run
+    assert planned['batches'] == [
+        {'batch_number': 1, 'total_emails': 2, 'school_codes': ['ALA'], 'estimated_send_seconds': 4},
+        {'batch_number': 2, 'total_emails': 2, 'school_codes': ['ALA', 'MIC'], 'estimated_send_seconds': 4},
+        {'batch_number': 3, 'total_emails': 1, 'school_codes': ['MIC'], 'estimated_send_seconds': 2},
+    ]
+
+
+def test_plan_writes_nothing(campaign):
+    campaigns, extracted = campaign
+    before = campaigns.get_item(Key={'campaign_id': 'c1'})['Item']
+
+    assert plan('c1')[0] == 200
+
+    assert extracted == [('uploads/c1/products.csv', False)]  # No catalog artifact either
+    dynamodb = boto3.resource('dynamodb')
+    assert dynamodb.Table('campaign_data').scan()['Items'] == []
+    assert dynamodb.Table('campaign_batches').scan()['Items'] == []
+    assert campaigns.get_item(Key={'campaign_id': 'c1'})['Item'] == before
+
+
+def test_plan_needs_a_campaign_with_a_file(campaign):
+    assert plan('missing')[0] == 404
+    status_code, refused = plan('c2')
+    assert status_code == 400
+    assert refused['error'] == 'No file uploaded for this campaign'
@@ -0,0 +1,98 @@
+"""Pre-rendered school documents: prerender_batch -> manifest -> send_batch_emails (lambda_email_sender)"""
+
+import boto3
+import pytest
+
+import lambda_email_sender
+from document_store import LocalDocumentStore, get_document, get_manifest
+from lambda_email_sender import compile_template_instance, prerender_batch, send_batch_emails
+
+TEMPLATE = {
+    'campaign_id': 'c1',
+    'template_html_raw': '<h1>{{CAMPAIGN_TITLE}}</h1><p>{{GREETING_TEXT}}</p><h2>{{TEAM_NAME}}</h2>'
+                         '<a href="{{CTA_LINK}}">Shop</a>{{PRODUCTS_HTML}}',
+    'template_config': {'CAMPAIGN_TITLE': 'Spring Drop'},
+}
+
+RECIPIENTS = [
+    ('r1', 'ann@example.com', 'Ann', 'ALA'),
+    ('r2', 'bob@example.com', 'Bob', 'ALA'),
+    ('r3', 'cy@example.com', 'Cy', 'MIC'),
+]
+
+
+@pytest.fixture
+def campaign(create_table, tmp_path, monkeypatch):
+    """One batch of three recipients at two schools, with PRERENDER_STORE in tmp_path"""
+    monkeypatch.setattr(lambda_email_sender, 'PRERENDER_STORE', str(tmp_path))
+    sent = []
+    monkeypatch.setattr(lambda_email_sender, 'send_email_ses', lambda recipient, subject, html: sent.append((recipient, html)) or True)
+
+    create_table('email_campaigns', 'campaign_id').put_item(Item={'campaign_id': 'c1', 'status': 'draft'})
+    create_table('campaign_batches', 'campaign_id', 'batch_number').put_item(
+        Item={'campaign_id': 'c1', 'batch_number': 1, 'status': 'pending'})
+    create_table('campaign_template_instances', 'campaign_id').put_item(Item=TEMPLATE)
+    create_table('template_components', 'component_id')
+    schools = create_table('college-db-email', 'school_name')
+    schools.put_item(Item={'school_name': 'University of Alabama', 'school_code': 'ALA'})
+    schools.put_item(Item={'school_name': 'University of Michigan', 'school_code': 'MIC'})
+
+    data = create_table('campaign_data', 'campaign_id', 'record_id', indexes=[('BatchIndex', 'campaign_id', 'batch_number')])
+    for record_id, email, name, school_code in RECIPIENTS:
+        data.put_item(Item={
+            'campaign_id': 'c1', 'record_id': record_id, 'batch_number': 1, 'email_sent': False,
+            'customer_email': email, 'customer_name': name, 'recipient_name': name,
+            'school_code': school_code, 'school_page': f'https://example.com/{school_code}',
+            'product_name_1': f'{school_code} Hoodie', 'product_image_1': f'https://example.com/{school_code}.png',
+            'product_link_1': f'https://example.com/{school_code}/hoodie', 'product_price_1': '49.99',
+        })
+
+    return LocalDocumentStore(str(tmp_path)), sent
+
+
+def batch_item():
+    table = boto3.resource('dynamodb').Table('campaign_batches')
+    return table.get_item(Key={'campaign_id': 'c1', 'batch_number': 1})['Item']
+
+
+def expected_html(template_instance):
+    compiled = compile_template_instance(template_instance)
+    items = boto3.resource('dynamodb').Table('campaign_data').scan()['Items']
+    return {item['customer_email']: compiled.render_for_recipient(item) for item in items}
+
+
+def test_prerendered_documents_round_trip(campaign):
+    store, sent = campaign
+    result = prerender_batch('c1', 1)
+
+    assert result['recipients'] == 3
+    assert result['documents'] == 2  # One per school
+    assert batch_item()['prerender_manifest'] == result['manifest']
+
+    manifest = get_manifest(store, result['manifest'])
+    assert manifest['template_digest'] == compile_template_instance(TEMPLATE).digest
+    assert len(manifest['documents']) == 2
+    document = get_document(store, next(iter(manifest['documents'].values())))
+    assert len(document['parts']) == 2  # Split at the greeting
+
+    expected = expected_html(TEMPLATE)
+    stats = send_batch_emails('c1', 1)['send_stats']['fragment_cache']
+
+    assert stats['prerendered_hits'] == 2
+    assert dict(sent) == expected
+    assert 'University of Alabama' in expected['ann@example.com'] and 'Hi Ann' in expected['ann@example.com']
+
+
+def test_manifest_for_another_template_version_is_ignored(campaign):
+    store, sent = campaign
+    prerender_batch('c1', 1)
+
+    # Editing the template after the pre-render changes its digest
+    edited = dict(TEMPLATE, template_config={'CAMPAIGN_TITLE': 'Summer Drop'})
+    boto3.resource('dynamodb').Table('campaign_template_instances').put_item(Item=edited)
+
+    stats = send_batch_emails('c1', 1)['send_stats']['fragment_cache']
+
+    assert stats['prerendered_hits'] == 0
+    assert dict(sent) == expected_html(edited)
+    assert all('Summer Drop' in html for _, html in sent)
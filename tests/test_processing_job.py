@@ -0,0 +1,160 @@
+"""Background processing jobs and /process-status, run in-process (lambda_campaign_manager)"""
+
+import json
+import threading
+import time
+from datetime import datetime
+
+import boto3
+import pytest
+
+import lambda_campaign_manager
+from lambda_campaign_manager import PROCESS_JOB_STALE_SECONDS, ProcessingProgress, lambda_handler
+
+PRODUCTS = {
+    school_code: [{'handle': f'{school_code.lower()}-hoodie', 'image': f'https://example.com/{school_code}.png',
+                   'price': '49.99', 'title': f'{school_code} Hoodie', 'school_page': f'https://example.com/{school_code}',
+                   'school_logo': ''}]
+    for school_code in ('ALA', 'MIC')
+}
+CUSTOMERS = [('ann@example.com', 'ALA'), ('bob@example.com', 'ALA'), ('cy@example.com', 'MIC'), ('dee@example.com', 'OSU')]
+
+
+@pytest.fixture
+def campaign(create_table, monkeypatch):
+    """A campaign with an uploaded file; product extraction waits for `release` once it's cleared"""
+    release = threading.Event()
+    release.set()
+
+    def extract_campaign_products(s3_key, save_artifact=True):
+        assert release.wait(10)
+        return PRODUCTS
+
+    monkeypatch.setattr(lambda_campaign_manager, 'extract_campaign_products', extract_campaign_products)
+    monkeypatch.setattr(lambda_campaign_manager, 'CUSTOMER_SCHOOL_INDEX', '')
+
+    campaigns = create_table('email_campaigns', 'campaign_id')
+    campaigns.put_item(Item={'campaign_id': 'c1', 'status': 'draft', 'file_s3_key': 'uploads/c1/products.csv'})
+    customers = create_table('college_email_campaign', 'customer_email')
+    for email, school_code in CUSTOMERS:
+        customers.put_item(Item={'customer_email': email, 'customer_name': email.split('@')[0], 'school_code': school_code})
+    create_table('campaign_data', 'campaign_id', 'record_id')
+    create_table('campaign_batches', 'campaign_id', 'batch_number')
+    yield campaigns, release
+    release.set()
+
+
+def request(method, path, body=None):
+    event = {'requestContext': {'http': {'method': method}}, 'rawPath': path}
+    if body is not None:
+        event['body'] = json.dumps(body)
+    response = lambda_handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def process_status():
+    return request('GET', '/api/campaigns/c1/process-status')[1]
+
+
+def wait_for_job(job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = process_status()
+        if status['job_id'] == job_id and status['status'] in ('completed', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish: {process_status()}")
+
+
+def test_job_runs_in_process_and_reports_its_result(campaign):
+    assert process_status() == {'campaign_id': 'c1', 'status': 'none'}
+
+    status_code, started = request('POST', '/api/campaigns/c1/process')
+    assert status_code == 202
+    assert started['progress_path'] == '/api/campaigns/c1/process-status'
+
+    status = wait_for_job(started['job_id'])
+    assert (status['status'], status['stage'], status['stale']) == ('completed', 'completed', False)
+    assert (status['records_written'], status['batches_ready']) == (3, 1)
+    assert status['result']['changes']['new'] == 3
+
+    campaign_item = campaign[0].get_item(Key={'campaign_id': 'c1'})['Item']
+    assert (campaign_item['status'], int(campaign_item['total_emails'])) == ('ready', 3)
+    stored = boto3.resource('dynamodb').Table('campaign_data').scan()['Items']
+    assert sorted(item['customer_email'] for item in stored) == ['ann@example.com', 'bob@example.com', 'cy@example.com']
+
+
+def test_only_one_job_runs_at_a_time(campaign):
+    _, release = campaign
+    release.clear()
+
+    status_code, first = request('POST', '/api/campaigns/c1/process')
+    assert status_code == 202
+
+    status_code, refused = request('POST', '/api/campaigns/c1/process', {'mode': 'full'})
+    assert status_code == 409
+    assert refused['job']['job_id'] == first['job_id']
+
+    status = process_status()
+    assert (status['job_id'], status['status'], status['stage'], status['stale']) == (first['job_id'], 'running', 'reading_products', False)
+
+    release.set()
+    assert wait_for_job(first['job_id'])['status'] == 'completed'
+
+    # A finished job no longer blocks the next one
+    status_code, second = request('POST', '/api/campaigns/c1/process', {'mode': 'full'})
+    assert status_code == 202
+    assert wait_for_job(second['job_id'])['mode'] == 'full'
+
+
+def set_running_job(campaigns, job_id, seconds_ago):
+    updated_at = datetime.fromtimestamp(time.time() - seconds_ago).isoformat()
+    campaigns.update_item(
+        Key={'campaign_id': 'c1'},
+        UpdateExpression='SET processing_job = :job',
+        ExpressionAttributeValues={':job': {'job_id': job_id, 'status': 'running', 'stage': 'writing', 'updated_at': updated_at}}
+    )
+
+
+def test_job_that_stopped_reporting_is_taken_over(campaign):
+    campaigns, _ = campaign
+
+    set_running_job(campaigns, 'recent', PROCESS_JOB_STALE_SECONDS - 60)
+    assert process_status()['stale'] is False
+    assert request('POST', '/api/campaigns/c1/process')[0] == 409
+
+    set_running_job(campaigns, 'timed-out', PROCESS_JOB_STALE_SECONDS + 60)
+    status = process_status()
+    assert (status['job_id'], status['status'], status['stale']) == ('timed-out', 'running', True)
+
+    status_code, started = request('POST', '/api/campaigns/c1/process')
+    assert status_code == 202
+    assert wait_for_job(started['job_id'])['status'] == 'completed'
+
+    # The replaced job can no longer overwrite its successor's progress
+    ProcessingProgress('c1', 'timed-out').failed('Task timed out')
+    status = process_status()
+    assert (status['job_id'], status['status']) == (started['job_id'], 'completed')
+
+
+def test_reprocessing_keeps_legacy_and_sent_records(campaign):
+    data = boto3.resource('dynamodb').Table('campaign_data')
+    # Written before record ids were derived from the email; Ann was sent the campaign
+    data.put_item(Item={'campaign_id': 'c1', 'record_id': 'c1_0', 'batch_number': 1, 'customer_email': 'ann@example.com',
+                        'school_code': 'ALA', 'email_sent': True, 'sent_at': '2026-01-02T00:00:00'})
+    # A recipient no longer in the campaign who was already sent it
+    data.put_item(Item={'campaign_id': 'c1', 'record_id': 'c1_9', 'batch_number': 1, 'customer_email': 'old@example.com',
+                        'school_code': 'OSU', 'email_sent': True, 'sent_at': '2026-01-02T00:00:00'})
+
+    status = wait_for_job(request('POST', '/api/campaigns/c1/process')[1]['job_id'])
+    changes = status['result']['changes']
+    assert (changes['matched_by_email'], changes['kept_sent'], changes['removed'], changes['new']) == (1, 1, 0, 2)
+
+    stored = {item['customer_email']: item for item in data.scan()['Items']}
+    assert sorted(stored) == ['ann@example.com', 'bob@example.com', 'cy@example.com', 'old@example.com']
+    assert (stored['ann@example.com']['record_id'], stored['ann@example.com']['email_sent']) == ('c1_0', True)
+
+    # Deleting sent records has to be asked for
+    status = wait_for_job(request('POST', '/api/campaigns/c1/process', {'delete_sent': True})[1]['job_id'])
+    assert status['result']['changes']['removed'] == 1
+    assert 'old@example.com' not in {item['customer_email'] for item in data.scan()['Items']}
@@ -0,0 +1,122 @@
+"""Pandas-free product pipeline: column typing, handle groups and school grouping (product_catalog)"""
+
+import math
+
+import pytest
+
+from product_catalog import (
+    _infer_column, group_products_by_school, isna, read_product_csv, reduce_handle_groups
+)
+
+HEADER = 'Handle,Title,Option1 Name,Option1 Value,Option2 Name,Option2 Value,Variant SKU,Variant Price,Image Src'
+
+
+def table(*rows, header=HEADER):
+    return read_product_csv('\n'.join([header, *rows]) + '\n')
+
+
+def same(actual, expected):
+    """Equal, with NaN equal to NaN and int/float/bool told apart"""
+    return len(actual) == len(expected) and all(
+        (isna(a) and isna(e)) or (type(a) is type(e) and a == e) for a, e in zip(actual, expected)
+    )
+
+
+@pytest.mark.parametrize('raw, expected', [
+    (['1', '2', ' 3 '], [1, 2, 3]),
+    (['1', '', '3'], [1.0, math.nan, 3.0]),  # Missing cells make an int column float
+    (['1.5', '2', '-.5', '1e3'], [1.5, 2.0, -0.5, 1000.0]),
+    (['49.99', 'N/A', 'nan'], [49.99, math.nan, math.nan]),
+    (['True', 'false', 'TRUE'], [True, False, True]),
+    (['True', 'NULL'], [True, math.nan]),
+    (['1', 'abc', ''], ['1', 'abc', math.nan]),  # Any text keeps the column as strings
+    (['yes', 'True'], ['yes', 'True']),
+    (['', 'NA', '#N/A'], [math.nan] * 3),
+])
+def test_columns_are_typed_like_read_csv(raw, expected):
+    assert same(_infer_column(raw), expected)
+
+
+def test_only_kept_columns_are_read_and_short_rows_are_padded():
+    products = read_product_csv('Handle,Extra,Variant Price\nhoodie,x,49\n\ncap\n', columns=['Handle', 'Variant Price', 'Title'])
+
+    assert sorted(products.columns) == ['Handle', 'Variant Price']
+    assert len(products) == 2  # The blank line is skipped
+    assert same(products['Variant Price'], [49.0, math.nan])
+
+
+def test_inch_groups_keep_their_cheapest_variant():
+    products = table(
+        'pennant,Pennant,Size,12-Inch,Color,Red,P1,12.50,a.png',
+        'pennant,,,9-Inch,,Blue,P2,9.99,b.png',
+        'pennant,,,6-Inch,,Gold,P3,9.99,c.png',  # Same price: the first one wins
+        'pennant,,,4-Inch,,Gray,P4,,d.png',  # Unpriced variants are skipped
+    )
+
+    assert reduce_handle_groups(products) == [(1, 'Pennant 9-Inch Blue')]
+
+
+def test_inch_in_option2_counts_and_option2_needs_its_name_column():
+    rows = ('flag,Flag,Color,Red,Size,3x5 INCH,F1,20,a.png', 'flag,,,Blue,,2x3 inch,F2,15,b.png')
+
+    assert reduce_handle_groups(table(*rows)) == [(1, 'Flag Blue 2x3 inch')]
+
+    # Without an 'Option2 Name' column, Option2 is ignored like the pandas version did
+    header = HEADER.replace('Option2 Name,', '')
+    no_option2_name = table(*(row.replace(',Size,', ',').replace(',,,Blue,,', ',,,Blue,') for row in rows), header=header)
+    assert reduce_handle_groups(no_option2_name) == [(0, 'Flag'), (1, 'Flag Blue')]
+
+
+def test_other_groups_keep_every_variant_in_handle_order():
+    products = table(
+        'tee,Tee,Size,S,,,T1,20,a.png',
+        'tee,,,M,,,T2,20,b.png',
+        ',Orphan,,,,,O1,5,c.png',  # No Handle: dropped
+        'cap,,,One,,,C1,15,d.png',  # No title anywhere in the group: kept as is
+        'mug,Mug,,,,,M1,10,e.png',
+    )
+
+    kept = reduce_handle_groups(products)
+
+    assert [index for index, _ in kept] == [3, 4, 0, 1]  # cap, mug, tee
+    assert isna(kept[0][1])
+    assert [title for _, title in kept[1:]] == ['Mug', 'Tee', 'Tee M']
+
+
+def test_inch_group_with_no_valid_price_keeps_its_first_variant():
+    # pandas' idxmin raised on an all-NaN group; the first variant is kept instead
+    products = table(
+        'banner,Banner,Size,24-Inch,,,B1,N/A,a.png',
+        'banner,,,36-Inch,,,B2,,b.png',
+        'tee,Tee,,,,,T1,call us,c.png',
+    )
+
+    assert reduce_handle_groups(products)[0] == (0, 'Banner 24-Inch')
+
+
+COLLEGES = {
+    'ALA': {'school_page': 'https://example.com/ala', 'school_logo': 'https://example.com/ala.png'},
+    'MIC': {'school_page': 'https://example.com/mic'},
+}
+
+
+def test_products_are_grouped_by_known_schools_with_images():
+    products = table(
+        'ala-tee,Alabama Tee,,,,,TEE-C-ALA1,25,ala-tee.png',
+        'mic-cap,Michigan Cap,,,,,C-CUST-MIC9,19.99,mic-cap.png',
+        'ala-mug,Alabama Mug,,,,,MUG-C-ALA2,12,',  # No image
+        'osu-tee,Ohio Tee,,,,,TEE-C-OSU1,25,osu.png',  # School not in the college table
+        'plain,Plain Tee,,,,,PLAIN,25,plain.png',  # No school code
+    )
+
+    products_by_school, stats = group_products_by_school(products, COLLEGES)
+
+    assert list(products_by_school) == ['ALA', 'MIC']  # Order of first product, by Handle
+    assert products_by_school['ALA'] == [{
+        'handle': 'ala-tee', 'title': 'Alabama Tee', 'price': '25.0', 'image': 'ala-tee.png',
+        'school_page': 'https://example.com/ala', 'school_logo': 'https://example.com/ala.png',
+    }]
+    assert products_by_school['MIC'][0]['price'] == '19.99'
+    assert products_by_school['MIC'][0]['school_logo'] == ''
+    assert stats == {'rows': 5, 'school_codes_extracted': 4, 'rows_after_handle_groups': 5, 'products_matched': 2}
+
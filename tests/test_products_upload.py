@@ -0,0 +1,117 @@
+"""Direct-to-S3 product uploads: presigned multipart parts, completion and the catalog artifact (lambda_campaign_manager)"""
+
+import json
+
+import boto3
+import pytest
+import requests
+
+import lambda_campaign_manager
+from lambda_campaign_manager import S3_BUCKET, UPLOAD_HEADER_BYTES, catalog_artifact_key, lambda_handler
+from product_catalog import load_catalog
+
+HEADER = 'Handle,Title,Option1 Name,Option1 Value,Variant SKU,Variant Price,Image Src,Body (HTML)\n'
+PART_SIZE = 5 * 1024 * 1024  # The smallest part S3 (and moto) accepts before the last one
+
+
+@pytest.fixture
+def s3(create_table, monkeypatch):
+    monkeypatch.setattr(lambda_campaign_manager, 'UPLOAD_PART_SIZE', PART_SIZE)
+    monkeypatch.setattr(lambda_campaign_manager, 'generate_campaign_content_from_products', lambda titles, campaign_id: {})
+    create_table('email_campaigns', 'campaign_id').put_item(Item={'campaign_id': 'c1', 'status': 'draft'})
+    client = boto3.client('s3')
+    client.create_bucket(Bucket=S3_BUCKET)
+    return client
+
+
+def request(path, body):
+    event = {'requestContext': {'http': {'method': 'POST'}}, 'rawPath': f'/api/campaigns/c1/{path}', 'body': json.dumps(body)}
+    response = lambda_handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def product_csv(min_bytes):
+    rows = [HEADER]
+    size = len(HEADER)
+    index = 0
+    while size < min_bytes:
+        row = f'tee-{index},Tee {index},Size,M,TEE-C-ALA{index},25.00,https://example.com/{index}.png,"<p>{"x" * 200}</p>"\n'
+        rows.append(row)
+        size += len(row)
+        index += 1
+    return ''.join(rows).encode('utf-8'), index
+
+
+def upload(content):
+    """Start an upload, PUT every part to its presigned URL and return (started, parts)"""
+    status_code, started = request('upload-url', {'file_name': 'products.csv', 'file_size': len(content)})
+    assert status_code == 200
+    parts = []
+    for part in started['parts']:
+        offset = (part['part_number'] - 1) * started['part_size']
+        response = requests.put(part['url'], data=content[offset:offset + started['part_size']])
+        assert response.status_code == 200
+        parts.append({'part_number': part['part_number'], 'etag': response.headers['ETag']})
+    return started, parts
+
+
+def test_multipart_upload_is_completed_and_saved_as_a_catalog_artifact(s3):
+    content, row_count = product_csv(PART_SIZE + 1024)
+    started, parts = upload(content)
+    assert (started['s3_key'], len(started['parts'])) == ('campaigns/c1/products.csv', 2)
+
+    status_code, completed = request('upload-complete', {
+        'upload_id': started['upload_id'], 's3_key': started['s3_key'], 'parts': list(reversed(parts)),
+    })
+
+    assert status_code == 200
+    assert completed['records_count'] == row_count
+    etag = s3.head_object(Bucket=S3_BUCKET, Key=started['s3_key'])['ETag']
+    assert s3.get_object(Bucket=S3_BUCKET, Key=started['s3_key'])['Body'].read() == content
+
+    artifact = load_catalog(s3.get_object(Bucket=S3_BUCKET, Key=catalog_artifact_key(started['s3_key'], etag))['Body'].read())
+    assert len(artifact) == row_count
+    assert artifact.school_codes[:2] == ['ALA', 'ALA']
+    assert 'Body (HTML)' not in artifact.columns  # Only the catalog columns are kept
+
+    campaign = boto3.resource('dynamodb').Table('email_campaigns').get_item(Key={'campaign_id': 'c1'})['Item']
+    assert (campaign['file_s3_key'], int(campaign['total_emails'])) == (started['s3_key'], row_count)
+
+
+def test_file_with_a_wrong_header_is_rejected_from_its_first_bytes(s3):
+    content = b'email,first_name,school\n' + b'ann@example.com,Ann,ALA\n' * 5000
+    started, parts = upload(content)
+
+    ranges = []
+
+    def record_range(params, **kwargs):
+        ranges.append(params.get('Range'))
+
+    events = lambda_campaign_manager.get_client('s3').meta.events
+    events.register('provide-client-params.s3.GetObject', record_range)
+    try:
+        status_code, rejected = request('upload-complete', {'upload_id': started['upload_id'], 's3_key': started['s3_key'], 'parts': parts})
+    finally:
+        events.unregister('provide-client-params.s3.GetObject', record_range)
+
+    assert status_code == 400
+    assert 'Missing required columns' in rejected['error']
+    assert ranges == [f'bytes=0-{UPLOAD_HEADER_BYTES - 1}']  # The rest of the file was never read
+    assert 'Contents' not in s3.list_objects_v2(Bucket=S3_BUCKET, Prefix='campaigns/c1/')
+
+
+def test_aborted_upload_discards_its_parts(s3):
+    content, _ = product_csv(1024)
+    started, _ = upload(content)
+    assert len(s3.list_multipart_uploads(Bucket=S3_BUCKET).get('Uploads', [])) == 1
+
+    assert request('upload-abort', {'upload_id': started['upload_id'], 's3_key': started['s3_key']})[0] == 200
+
+    assert s3.list_multipart_uploads(Bucket=S3_BUCKET).get('Uploads', []) == []
+    assert 'Contents' not in s3.list_objects_v2(Bucket=S3_BUCKET, Prefix='campaigns/c1/')
+
+
+def test_keys_outside_the_campaign_are_refused(s3):
+    status_code, _ = request('upload-complete', {'upload_id': 'u1', 's3_key': 'campaigns/c2/products.csv', 'parts': [{'part_number': 1, 'etag': 'x'}]})
+    assert status_code == 400
+    assert request('upload-url', {'file_name': 'products.csv', 'file_size': 0})[0] == 400
@@ -0,0 +1,102 @@
+"""Campaign-wide sends through POST /send-all (lambda_email_sender)"""
+
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+import lambda_email_sender
+from lambda_email_sender import SEND_RUN_STALE_SECONDS, advance_campaign_send, lambda_handler
+
+
+@pytest.fixture
+def campaign(create_table, monkeypatch):
+    """A campaign with three unsent batches; invoke_self_async fails for batch numbers in `unstartable`"""
+    campaigns = create_table('email_campaigns', 'campaign_id')
+    campaigns.put_item(Item={'campaign_id': 'c1', 'status': 'ready'})
+    batches = create_table('campaign_batches', 'campaign_id', 'batch_number')
+    for batch_number in (1, 2, 3):
+        batches.put_item(Item={'campaign_id': 'c1', 'batch_number': batch_number, 'status': 'pending'})
+
+    invoked, unstartable = [], set()
+
+    def invoke_self_async(payload):
+        if payload['batch_number'] in unstartable:
+            return False
+        invoked.append(payload['batch_number'])
+        return True
+
+    monkeypatch.setattr(lambda_email_sender, 'invoke_self_async', invoke_self_async)
+    return campaigns, batches, invoked, unstartable
+
+
+def send_all(body):
+    event = {'requestContext': {'http': {'method': 'POST'}}, 'rawPath': '/api/campaigns/c1/send-all', 'body': json.dumps(body)}
+    response = lambda_handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def campaign_item(campaigns):
+    return campaigns.get_item(Key={'campaign_id': 'c1'})['Item']
+
+
+def statuses(batches):
+    return {int(item['batch_number']): item['status'] for item in batches.scan()['Items']}
+
+
+def test_run_with_a_batch_that_could_not_start_ends_partial(campaign):
+    campaigns, batches, invoked, unstartable = campaign
+    unstartable.add(2)
+
+    status_code, started = send_all({'concurrency': 2})
+    assert status_code == 200
+    assert started['started_batches'] == invoked == [1, 3]
+    assert statuses(batches) == {1: 'sending', 2: 'failed', 3: 'sending'}
+
+    advance_campaign_send('c1', 1, True)
+    assert campaign_item(campaigns)['send_status'] == 'sending'
+    advance_campaign_send('c1', 3, True)
+
+    item = campaign_item(campaigns)
+    assert (item['send_status'], item['status'], item['send_batches_done'], item['send_batches_incomplete']) == ('partial', 'ready', 3, 1)
+
+
+def test_run_where_no_batch_starts_fails(campaign):
+    campaigns, batches, _, unstartable = campaign
+    unstartable.update({1, 2, 3})
+
+    status_code, _ = send_all({})
+
+    assert status_code == 500
+    item = campaign_item(campaigns)
+    assert (item['send_status'], item['status'], item['send_batches_done']) == ('failed', 'ready', 3)
+    assert set(statuses(batches).values()) == {'failed'}
+
+
+def set_batch_activity(batches, batch_number, seconds_ago):
+    timestamp = datetime.fromtimestamp(time.time() - seconds_ago).isoformat()
+    batches.update_item(Key={'campaign_id': 'c1', 'batch_number': batch_number},
+                        UpdateExpression='SET sending_at = :at, checkpoint_at = :at', ExpressionAttributeValues={':at': timestamp})
+
+
+def test_restart_waits_until_no_batch_is_still_sending(campaign):
+    campaigns, batches, invoked, _ = campaign
+    status_code, first = send_all({'concurrency': 1})
+    assert status_code == 200 and invoked == [1]
+
+    assert send_all({})[0] == 409
+    status_code, refused = send_all({'restart': True})
+    assert status_code == 409
+    assert refused['active_batches'] == [1]
+
+    # Batch 1's invocation checkpointed recently, so it is still alive
+    set_batch_activity(batches, 1, SEND_RUN_STALE_SECONDS - 60)
+    assert send_all({'restart': True})[0] == 409
+
+    set_batch_activity(batches, 1, SEND_RUN_STALE_SECONDS + 60)
+    status_code, restarted = send_all({'restart': True, 'concurrency': 3})
+    assert status_code == 200
+    assert restarted['send_run_id'] != first['send_run_id']
+    assert restarted['started_batches'] == [1, 2, 3]
+    assert campaign_item(campaigns)['send_run_id'] == restarted['send_run_id']
@@ -0,0 +1,149 @@
+"""Send pacing and campaign-wide batch claims (lambda_email_sender)"""
+
+import pytest
+
+import lambda_email_sender
+from lambda_email_sender import DynamoRateBudget, TokenBucket, launch_next_batch
+
+
+class FakeTime:
+    """Injected clock whose sleep() advances it"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_spaces_acquires_at_the_rate():
+    fake = FakeTime()
+    bucket = TokenBucket(10, clock=fake.clock, sleep=fake.sleep)
+
+    waits = [bucket.acquire() for _ in range(4)]
+
+    assert waits == pytest.approx([0.0, 0.1, 0.1, 0.1])
+    assert fake.now == pytest.approx(1000.3)
+
+
+def test_token_bucket_refills_up_to_capacity_and_follows_rate_changes():
+    fake = FakeTime()
+    bucket = TokenBucket(10, capacity=2, clock=fake.clock, sleep=fake.sleep)
+    bucket.acquire(2)
+
+    fake.now += 60  # Idle time never banks more than capacity
+    assert bucket.acquire(2) == 0.0
+    assert bucket.acquire(1) == pytest.approx(0.1)
+
+    bucket.set_rate(2)
+    assert bucket.acquire(1) == pytest.approx(0.5)
+    # Bulk calls reserve one token per recipient
+    assert bucket.acquire(4) == pytest.approx(2.0)
+
+
+@pytest.fixture
+def budget_table(create_table):
+    return create_table('ses_rate_budget', 'budget_window')
+
+
+def test_rate_budget_allows_a_window_then_waits_for_the_next(budget_table, monkeypatch):
+    monkeypatch.setattr(lambda_email_sender.random, 'uniform', lambda low, high: 0.0)
+    fake = FakeTime()
+    budget = DynamoRateBudget('ses_rate_budget', 20, clock=fake.clock, sleep=fake.sleep)
+    assert budget.window_seconds == 0.25  # 5 tokens per window
+
+    assert budget.acquire(5) == 0.0
+    assert budget.acquire(1) == pytest.approx(0.25)  # Window 4000 is full; wait for 4001
+
+    used = {item['budget_window']: int(item['used']) for item in budget_table.scan()['Items']}
+    assert used == {'ses#4000': 5, 'ses#4001': 1}
+
+
+def test_rate_budget_is_shared_between_invocations(budget_table, monkeypatch):
+    monkeypatch.setattr(lambda_email_sender.random, 'uniform', lambda low, high: 0.0)
+    fake = FakeTime()
+    first = DynamoRateBudget('ses_rate_budget', 20, clock=fake.clock, sleep=fake.sleep)
+    second = DynamoRateBudget('ses_rate_budget', 20, clock=fake.clock, sleep=fake.sleep)
+
+    first.acquire(3)
+    # Only 2 tokens are left in this window; a 12-recipient bulk call spans the next windows
+    assert second.acquire(12) == pytest.approx(0.75)
+
+    used = {item['budget_window']: int(item['used']) for item in budget_table.scan()['Items']}
+    assert used == {'ses#4000': 3, 'ses#4001': 5, 'ses#4002': 5, 'ses#4003': 2}
+
+
+def test_rate_budget_paces_locally_when_the_table_is_unavailable(aws):
+    fake = FakeTime()
+    budget = DynamoRateBudget('missing_table', 20, clock=fake.clock, sleep=fake.sleep)
+
+    assert budget.acquire(10) == pytest.approx(0.5)
+    assert fake.sleeps == pytest.approx([0.25, 0.25])
+
+
+@pytest.fixture
+def queued_batches(create_table, monkeypatch):
+    table = create_table('campaign_batches', 'campaign_id', 'batch_number')
+    for batch_number, status, run_id in [(1, 'sending', 'run1'), (2, 'queued', 'run1'), (3, 'queued', 'run1'), (4, 'queued', 'old')]:
+        table.put_item(Item={'campaign_id': 'c1', 'batch_number': batch_number, 'status': status, 'send_run_id': run_id})
+
+    invoked = []
+    monkeypatch.setattr(lambda_email_sender, 'invoke_self_async', lambda payload: invoked.append(payload) or True)
+    return table, invoked
+
+
+def statuses(table):
+    return {int(item['batch_number']): item['status'] for item in table.scan()['Items']}
+
+
+def test_launch_claims_queued_batches_of_the_run_in_order(queued_batches):
+    table, invoked = queued_batches
+
+    assert [launch_next_batch('c1', 'run1') for _ in range(3)] == [2, 3, None]
+    assert [payload['batch_number'] for payload in invoked] == [2, 3]
+    assert invoked[0] == {'action': 'send_batch', 'campaign_id': 'c1', 'batch_number': 2}
+    assert statuses(table) == {1: 'sending', 2: 'sending', 3: 'sending', 4: 'queued'}
+
+
+def test_launch_skips_a_batch_claimed_after_it_was_listed(queued_batches):
+    table, invoked = queued_batches
+    events = lambda_email_sender.dynamodb.meta.client.meta.events
+
+    def claim_batch_2_first(**kwargs):
+        # Another finishing batch claims batch 2 between the query and this claim
+        events.unregister('before-call.dynamodb.UpdateItem', claim_batch_2_first)
+        table.update_item(Key={'campaign_id': 'c1', 'batch_number': 2}, UpdateExpression='SET #s = :s',
+                          ExpressionAttributeNames={'#s': 'status'}, ExpressionAttributeValues={':s': 'sending'})
+
+    events.register('before-call.dynamodb.UpdateItem', claim_batch_2_first)
+    try:
+        assert launch_next_batch('c1', 'run1') == 3
+    finally:
+        events.unregister('before-call.dynamodb.UpdateItem', claim_batch_2_first)
+
+    assert [payload['batch_number'] for payload in invoked] == [3]
+
+
+def test_launch_counts_a_batch_it_could_not_start_and_tries_the_next(queued_batches, create_table, monkeypatch):
+    table, invoked = queued_batches
+    campaigns = create_table('email_campaigns', 'campaign_id')
+    campaigns.put_item(Item={'campaign_id': 'c1', 'send_status': 'sending', 'send_run_id': 'run1',
+                             'send_batches_total': 3, 'send_batches_done': 0, 'send_batches_incomplete': 0})
+
+    def invoke_self_async(payload):
+        if payload['batch_number'] == 2:
+            return False
+        invoked.append(payload)
+        return True
+
+    monkeypatch.setattr(lambda_email_sender, 'invoke_self_async', invoke_self_async)
+
+    assert launch_next_batch('c1', 'run1') == 3
+    assert statuses(table) == {1: 'sending', 2: 'failed', 3: 'sending', 4: 'queued'}
+    campaign = campaigns.get_item(Key={'campaign_id': 'c1'})['Item']
+    assert (campaign['send_batches_done'], campaign['send_batches_incomplete'], campaign['send_status']) == (1, 1, 'sending')
@@ -0,0 +1,132 @@
+"""SentStatusBuffer: bulk delivery status writes and their fallbacks (lambda_email_sender)"""
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import ANY, Stubber
+
+from lambda_email_sender import SentStatusBuffer
+
+
+class StubPartiQL:
+    """batch_execute_statement answers from a queue: a list of failed statement indexes, or an exception"""
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.requests = []
+
+    def batch_execute_statement(self, Statements):
+        self.requests.append([statement['Parameters'][3]['S'] for statement in Statements])
+        response = self.responses.pop(0) if self.responses else []
+        if isinstance(response, Exception):
+            raise response
+        return {'Responses': [
+            {'Error': {'Code': 'ConditionalCheckFailed'}} if index in response else {'TableName': 'campaign_data'}
+            for index in range(len(Statements))
+        ]}
+
+
+def record(record_id):
+    return {'campaign_id': 'c1', 'record_id': record_id}
+
+
+@pytest.fixture
+def campaign_data(create_table):
+    return create_table('campaign_data', 'campaign_id', 'record_id')
+
+
+def sent_records(table):
+    return sorted(item['record_id'] for item in table.scan()['Items'] if item.get('email_sent') is True)
+
+
+def test_statements_that_fail_are_retried_on_their_own(campaign_data):
+    client = StubPartiQL([[1], []])
+    sleeps = []
+
+    with SentStatusBuffer(client=client, sleep=sleeps.append) as buffer:
+        for record_id in ('r0', 'r1', 'r2'):
+            buffer.mark_sent(record(record_id))
+
+    assert client.requests == [['r0', 'r1', 'r2'], ['r1']]
+    assert sleeps == [0.05]
+    assert (buffer.records_written, buffer.records_failed) == (3, 0)
+    assert sent_records(campaign_data) == []  # Everything went through PartiQL
+
+
+def test_statements_that_keep_failing_fall_back_to_update_item(campaign_data):
+    client = StubPartiQL([[0], [0], ClientError({'Error': {'Code': 'InternalServerError'}}, 'BatchExecuteStatement')])
+    sleeps = []
+
+    with SentStatusBuffer(client=client, sleep=sleeps.append) as buffer:
+        buffer.mark_sent(record('r0'))
+        buffer.mark_sent(record('r1'))
+
+    assert client.requests == [['r0', 'r1'], ['r0'], ['r0']]
+    assert sleeps == [0.05, 0.1, 0.2]
+    assert (buffer.records_written, buffer.records_failed) == (2, 0)
+    assert sent_records(campaign_data) == ['r0']
+
+
+def test_missing_partiql_permission_falls_back_without_retrying(campaign_data):
+    client = StubPartiQL([ClientError({'Error': {'Code': 'AccessDeniedException'}}, 'BatchExecuteStatement')])
+    sleeps = []
+
+    with SentStatusBuffer(client=client, sleep=sleeps.append) as buffer:
+        buffer.mark_sent(record('r0'))
+        buffer.mark_sent(record('r1'))
+
+    assert len(client.requests) == 1 and sleeps == []
+    assert buffer.summary()['records_written'] == 2
+    assert sent_records(campaign_data) == ['r0', 'r1']
+
+
+def test_records_that_cannot_be_written_are_counted(aws):
+    client = StubPartiQL([ClientError({'Error': {'Code': 'AccessDeniedException'}}, 'BatchExecuteStatement')])
+
+    with SentStatusBuffer(table_name='missing_table', client=client) as buffer:
+        buffer.mark_sent(record('r0'))
+
+    assert (buffer.records_written, buffer.records_failed) == (0, 1)
+
+
+def test_pending_statuses_are_flushed_when_the_send_raises(campaign_data):
+    client = StubPartiQL()
+
+    with pytest.raises(RuntimeError):
+        with SentStatusBuffer(client=client) as buffer:
+            buffer.mark_sent(record('r0'))
+            assert client.requests == []  # Still buffered
+            raise RuntimeError('Lambda is about to time out')
+
+    assert client.requests == [['r0']]
+    assert buffer.records_written == 1
+
+
+def test_buffer_flushes_when_full_or_due(campaign_data):
+    client = StubPartiQL()
+    buffer = SentStatusBuffer(client=client, max_items=2, max_seconds=60)
+
+    buffer.mark_sent(record('r0'))
+    buffer.mark_sent(record('r1'))
+    buffer.mark_sent(record('r2'))
+    assert client.requests == [['r0', 'r1']]
+
+    buffer.max_seconds = 0
+    buffer.flush_if_due()
+    assert client.requests == [['r0', 'r1'], ['r2']]
+
+
+def test_statements_are_typed_for_the_low_level_client(aws):
+    # moto can't run the two-SET statement, so botocore's Stubber checks the request instead
+    client = boto3.client('dynamodb')
+    with Stubber(client) as stubber:
+        stubber.add_response('batch_execute_statement', {'Responses': [{}]}, {'Statements': [{
+            'Statement': 'UPDATE "campaign_data" SET email_sent=? SET sent_at=? WHERE campaign_id=? AND record_id=?',
+            'Parameters': [{'BOOL': True}, {'S': ANY}, {'S': 'c1'}, {'S': 'r0'}],
+        }]})
+
+        with SentStatusBuffer(client=client) as buffer:
+            buffer.mark_sent(record('r0'))
+
+        stubber.assert_no_pending_responses()
+    assert buffer.records_written == 1
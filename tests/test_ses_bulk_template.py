@@ -0,0 +1,152 @@
+"""SesBulkTemplateSender and BulkTemplateDispatcher against a stub SES client (lambda_email_sender)"""
+
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from lambda_email_sender import (
+    BulkTemplateDispatcher, CompiledEmailTemplate, RetryableSendError, SesBulkTemplateSender
+)
+
+TEMPLATE_HTML = '<p>{{GREETING_TEXT}}</p><h1>{{TEAM_NAME}}</h1><a href="{{CTA_LINK}}">{{TITLE}}</a>'
+
+
+def client_error(code, message='', operation='SendBulkTemplatedEmail'):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+class StubSes:
+    """Records SES calls; send_bulk_templated_email answers from a queue of statuses or errors"""
+
+    def __init__(self, responses=(), create_error=None):
+        self.responses = list(responses)
+        self.create_error = create_error
+        self.templates = []
+        self.sends = []
+
+    def create_template(self, Template):
+        self.templates.append(Template)
+        if self.create_error:
+            raise self.create_error
+
+    def send_bulk_templated_email(self, **kwargs):
+        self.sends.append(kwargs)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return {'Status': [{'Status': status, 'Error': status} for status in response]}
+
+
+class StubRateLimiter:
+    rate = 100.0
+
+    def __init__(self):
+        self.acquired = []
+
+    def acquire(self, tokens=1):
+        self.acquired.append(tokens)
+        return 0.0
+
+    def set_rate(self, rate):
+        self.rate = rate
+
+
+def make_sender(html=TEMPLATE_HTML, client=None, campaign_id='camp/1'):
+    return SesBulkTemplateSender(campaign_id, CompiledEmailTemplate(html, {'TITLE': 'Spring Sale'}), client=client)
+
+
+def test_template_is_registered_with_triple_stash_slots():
+    client = StubSes()
+    sender = make_sender(client=client)
+    sender.register()
+
+    template, = client.templates
+    assert template['TemplateName'] == sender.template_name
+    assert sender.template_name.startswith('campaign-camp-1-')
+    assert template['SubjectPart'] == '{{{EMAIL_SUBJECT}}}'
+    # Static config is baked in; recipient slots become unescaped triple-stash variables
+    assert template['HtmlPart'] == '<p>{{{GREETING_TEXT}}}</p><h1>{{{TEAM_NAME}}}</h1><a href="{{{CTA_LINK}}}">Spring Sale</a>'
+    assert sender.default_data == {}
+
+
+def test_existing_template_is_reused_and_other_errors_raise():
+    make_sender(client=StubSes(create_error=client_error('AlreadyExists', operation='CreateTemplate'))).register()
+
+    with pytest.raises(ClientError):
+        make_sender(client=StubSes(create_error=client_error('AccessDenied', operation='CreateTemplate'))).register()
+
+
+def test_template_name_changes_with_the_html():
+    assert make_sender().template_name == make_sender().template_name
+    assert make_sender().template_name != make_sender(TEMPLATE_HTML + '<br>').template_name
+
+
+def test_replacement_data_keeps_placeholders_for_missing_values():
+    sender = make_sender()
+    data = sender.replacement_data({'GREETING_TEXT': 'Hi <b>Ann</b>', 'TEAM_NAME': 'Eagles'}, 'Eagles gear')
+
+    assert data == {
+        'CTA_LINK': '{{CTA_LINK}}',
+        'GREETING_TEXT': 'Hi <b>Ann</b>',
+        'TEAM_NAME': 'Eagles',
+        'EMAIL_SUBJECT': 'Eagles gear',
+    }
+
+
+def test_literal_open_braces_are_escaped_through_default_data():
+    sender = make_sender('<style>{{not-a-slot}}</style>{{TEAM_NAME}}')
+
+    assert sender.html_part == '<style>{{{OPEN_BRACES}}}not-a-slot}}</style>{{{TEAM_NAME}}}'
+    assert sender.default_data == {'OPEN_BRACES': '{{'}
+
+
+def test_send_maps_each_destination_status():
+    client = StubSes([['Success', 'MessageRejected', 'AccountThrottled', 'TransientFailure']])
+    sender = make_sender(client=client)
+    messages = [(f'user{index}@example.com', {'TEAM_NAME': str(index)}) for index in range(4)]
+
+    results = sender.send(messages)
+
+    assert results[:2] == [True, False]
+    assert isinstance(results[2], RetryableSendError) and results[2].throttled
+    assert isinstance(results[3], RetryableSendError) and not results[3].throttled
+
+    request, = client.sends
+    assert request['Template'] == sender.template_name
+    assert json.loads(request['DefaultTemplateData']) == {}
+    assert [d['Destination']['ToAddresses'] for d in request['Destinations']] == [[email] for email, _ in messages]
+    assert json.loads(request['Destinations'][1]['ReplacementTemplateData']) == {'TEAM_NAME': '1'}
+
+
+def test_send_raises_when_the_whole_call_is_throttled_and_fails_permanent_errors():
+    sender = make_sender(client=StubSes([client_error('Throttling', 'Maximum sending rate exceeded.')]))
+    with pytest.raises(RetryableSendError) as raised:
+        sender.send([('a@example.com', {})])
+    assert raised.value.throttled
+
+    # The daily quota is also reported as Throttling, but retrying won't help
+    sender = make_sender(client=StubSes([client_error('Throttling', 'Daily message quota exceeded.')]))
+    assert sender.send([('a@example.com', {}), ('b@example.com', {})]) == [False, False]
+
+
+def test_dispatcher_retries_only_failed_destinations():
+    client = StubSes([['Success', 'TransientFailure', 'MessageRejected'], ['Success']])
+    limiter = StubRateLimiter()
+    sleeps = []
+    dispatcher = BulkTemplateDispatcher(make_sender(client=client), workers=1, rate_limiter=limiter, sleep=sleeps.append)
+
+    records = [{'customer_email': f'user{index}@example.com'} for index in range(3)]
+    results = {}
+    completed = dispatcher.run(
+        [(record, 'subject', {'TEAM_NAME': record['customer_email']}) for record in records],
+        lambda record, sent: results.__setitem__(record['customer_email'], sent)
+    )
+
+    assert completed
+    assert results == {'user0@example.com': True, 'user1@example.com': True, 'user2@example.com': False}
+    # One bulk call for all three, then a retry carrying only the transient failure
+    assert [len(request['Destinations']) for request in client.sends] == [3, 1]
+    assert client.sends[1]['Destinations'][0]['Destination']['ToAddresses'] == ['user1@example.com']
+    assert limiter.acquired == [3, 1]
+    assert len(sleeps) == 1
@@ -0,0 +1,61 @@
+"""SKU school-code extraction against the three-search extractor it replaced (product_catalog)"""
+
+import math
+import re
+
+import pytest
+
+from product_catalog import extract_school_code, extract_school_codes_from_skus, isna
+
+# SKUs that exercise each pattern, their priority and the no-match cases, with the expected code
+EDGE_CASES = [
+    ('STCRT2-C-WY25 2-Inch', 'WY'),
+    ('C-CUST-ALA12', 'ALA'),  # 1. C-CUST-{CODE}{NUMBER}
+    ('X-C-AB-C-CUST-CD3', 'CD'),  # A later pattern 1 beats an earlier pattern 3
+    ('X-C-AB-C-CD3', 'CD'),  # A later pattern 2 beats an earlier pattern 3
+    ('X-C-AB 3-Inch', 'AB'),  # 3. -C-{CODE} with no number after it
+    ('X-C-AB', 'AB'),
+    ('X-C-', ''),
+    ('C-CUST-', ''),
+    ('C-CUSTAB3', ''),
+    ('  -C-ab1  ', 'ab'),
+    ('plain-sku', ''),
+    ('', ''),
+    ('C-', ''),
+    ('-c-AB1', ''),  # The marker is case sensitive
+    ('X-C-AB\n-C-CD3', 'CD'),
+    ('X-C-AbéC1', 'Ab'),  # Codes are ASCII letters only
+    (12345, ''),
+    (1.5, ''),
+    (math.nan, ''),
+    (None, ''),
+]
+
+
+def legacy_extract_school_code(sku):
+    """The extractor process_campaign defined before product_catalog"""
+    if sku is None or isna(sku) or not sku:
+        return ''
+    sku = str(sku).strip()
+    match = re.search(r'C-CUST-([A-Za-z]+)(?=\d)', sku)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r'-C-([A-Za-z]+)(?=\d)', sku)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r'-C-([A-Za-z]+)', sku)
+    if match:
+        return match.group(1).strip()
+    return ''
+
+
+@pytest.mark.parametrize('sku, code', EDGE_CASES, ids=[repr(sku) for sku, _ in EDGE_CASES])
+def test_edge_cases_match_the_previous_extractor(sku, code):
+    assert extract_school_code(sku) == code
+    assert legacy_extract_school_code(sku) == code
+
+
+def test_column_extraction_looks_up_each_distinct_sku():
+    skus = [sku for sku, _ in EDGE_CASES]
+
+    assert extract_school_codes_from_skus(skus + skus) == [code for _, code in EDGE_CASES] * 2